@@ -0,0 +1,7 @@
+"""
+Benchmarks and load tests, run them as modules from the project root, e.g.
+
+    python -m benchmarks.async_reads --workers 4
+
+They create their own database, nothing touches the development database.
+"""
@@ -0,0 +1,70 @@
+"""
+Compare the sync (WSGI) and async (ASGI) read endpoints under the same
+number of gunicorn workers.
+
+    python -m benchmarks.async_reads --workers 4 --concurrency 32 --duration 10
+"""
+import argparse
+
+from .environment import setup_django
+from .load import run_load
+from .server import gunicorn
+
+SERVERS = {
+    "sync": {"app": "core.wsgi:application", "worker_class": "sync"},
+    "async": {
+        "app": "core.asgi:application",
+        "worker_class": "uvicorn.workers.UvicornWorker",
+    },
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file")
+    args = parser.parse_args()
+
+    env = setup_django(args.database_url)
+
+    from taskman.models import Board, Task
+
+    from .dataset import seed
+
+    token = seed()
+    board = Board.objects.filter(public=False).first()
+    endpoints = {
+        "board list": "/api/boards",
+        "board retrieve": f"/api/boards/{board.id}",
+        "task list": "/api/tasks?limit=30",
+        "home summary": "/api/home/summary",
+    }
+    headers = {"Authorization": f"Token {token}"}
+    print(f"dataset: {Board.objects.count()} boards, {Task.objects.count()} tasks")
+
+    results = {}
+    for name, server in SERVERS.items():
+        with gunicorn(env=env, workers=args.workers, **server) as base_url:
+            for endpoint, path in endpoints.items():
+                results[endpoint, name] = run_load(
+                    base_url,
+                    lambda *_: ("GET", path, None, headers),
+                    concurrency=args.concurrency,
+                    duration=args.duration,
+                )
+
+    print(
+        f"{'endpoint':<16}{'path':<7}{'req/s':>9}{'p50 ms':>9}"
+        f"{'p99 ms':>9}{'errors':>8}"
+    )
+    for (endpoint, name), stats in results.items():
+        print(
+            f"{endpoint:<16}{name:<7}{stats['rps']:>9.1f}{stats['p50_ms']:>9.1f}"
+            f"{stats['p99_ms']:>9.1f}{stats['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Measure the latency read endpoints save by running outside of the
+per-request transaction.
+
+Each request is timed as served now (autocommit) and wrapped in an atomic
+block, the way `ATOMIC_REQUESTS` used to run it. Point `--database-url` at
+PostgreSQL to include the BEGIN/COMMIT round trips.
+
+    python -m benchmarks.atomic_requests --iterations 500
+"""
+import argparse
+import statistics
+import time
+
+from .environment import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file")
+    args = parser.parse_args()
+
+    setup_django(args.database_url)
+
+    from django.db import transaction
+    from django.test import Client
+
+    from taskman.models import Board
+
+    from .dataset import seed
+
+    token = seed()
+    board = Board.objects.filter(public=False).first()
+    client = Client(SERVER_NAME="localhost", HTTP_AUTHORIZATION=f"Token {token}")
+    endpoints = {
+        "board list": "/api/boards",
+        "board retrieve": f"/api/boards/{board.id}",
+        "task list": "/api/tasks",
+        "stage list": f"/api/boards/{board.id}/stages",
+    }
+
+    def timed(path, atomic):
+        start = time.perf_counter()
+        if atomic:
+            with transaction.atomic():
+                client.get(path)
+        else:
+            client.get(path)
+        return (time.perf_counter() - start) * 1000
+
+    print(f"{'endpoint':<16}{'atomic ms':>11}{'autocommit ms':>15}{'saved ms':>10}")
+    for name, path in endpoints.items():
+        client.get(path)
+        atomic, autocommit = [], []
+        # alternate so both modes see the same cache and load conditions
+        for _ in range(args.iterations):
+            atomic.append(timed(path, True))
+            autocommit.append(timed(path, False))
+        atomic, autocommit = statistics.median(atomic), statistics.median(autocommit)
+        print(
+            f"{name:<16}{atomic:>11.3f}{autocommit:>15.3f}{atomic - autocommit:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
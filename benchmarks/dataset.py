@@ -0,0 +1,41 @@
+import random
+
+from rest_framework.authtoken.models import Token
+
+from taskman.models import AccessLevel, Board, BoardAccess, Stage, Tag, Task, User
+
+STAGE_NAMES = ("To Do", "In Progress", "Done")
+
+
+def seed(boards=20, tasks_per_stage=30, tags_per_board=5, seed=0):
+    """
+    Create a user owning `boards` boards with the default stages, tagged
+    tasks and one public board, returns the user's API token.
+    """
+    rng = random.Random(seed)
+    user = User.objects.create_user("bench", "bench@example.com", "bench")
+    for i in range(boards):
+        board = Board.objects.create(name=f"Board {i}", public=i == 0)
+        BoardAccess.objects.create(board=board, user=user, level=AccessLevel.OWNER)
+        tags = Tag.objects.bulk_create(
+            Tag(name=f"tag {j}", color="#ff0000", board=board)
+            for j in range(tags_per_board)
+        )
+        for name in STAGE_NAMES:
+            stage = Stage.objects.create(name=name, board=board)
+            tasks = Task.objects.bulk_create(
+                Task(
+                    name=f"Task {k}",
+                    description="lorem ipsum " * 8,
+                    priority=k,
+                    board=board,
+                    stage=stage,
+                )
+                for k in range(tasks_per_stage)
+            )
+            Task.tags.through.objects.bulk_create(
+                Task.tags.through(task_id=task.id, tag_id=tag.id)
+                for task in tasks
+                for tag in rng.sample(tags, min(2, len(tags)))
+            )
+    return Token.objects.create(user=user).key
@@ -0,0 +1,246 @@
+"""
+Measure the latency, SQL query count and memory allocations of every API
+endpoint against a fixed dataset, and fail on regressions from a baseline.
+
+Each endpoint is served in-process through Django's test client: its
+latency is sampled over `--iterations` requests, then one request is run
+capturing its queries and one tracing its allocations. Results are written
+as JSON and compared with the baseline of the database vendor; a query count
+above the baseline, or a median latency or allocation peak above it by more
+than the tolerance, makes the run exit with status 1.
+
+    python -m benchmarks.endpoints --output results.json
+    python -m benchmarks.endpoints --update-baseline
+
+Latency baselines are machine specific, refresh them with
+`--update-baseline` on the machine that runs the gate.
+"""
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from .environment import setup_django
+from .load import percentile
+
+BASELINES_DIR = Path(__file__).resolve().parent / "baselines"
+# absolute slack on top of the relative tolerances, so the small numbers of
+# cheap endpoints don't fail on noise
+LATENCY_SLACK_MS = 1.0
+MEMORY_SLACK_KIB = 64
+
+
+def get_cases(board, stage, task, tag, public_board):
+    """
+    The endpoints to measure as `name: (method, path, body)`. Reads come
+    first so writes don't change the data they see. The board access
+    endpoints are left out, their list and retrieve actions fail.
+    """
+    b, s = board.id, stage.id
+    return {
+        "board list": ("GET", "/api/boards", None),
+        "board retrieve": ("GET", f"/api/boards/{b}", None),
+        "board normalized": ("GET", f"/api/boards/{b}?layout=normalized", None),
+        "board changes": ("GET", f"/api/boards/{b}/changes", None),
+        "public board": ("GET", f"/api/public/boards/{public_board.id}", None),
+        "stage list": ("GET", f"/api/boards/{b}/stages", None),
+        "stage retrieve": ("GET", f"/api/boards/{b}/stages/{s}", None),
+        "tag list": ("GET", f"/api/boards/{b}/tags", None),
+        "tag retrieve": ("GET", f"/api/boards/{b}/tags/{tag.id}", None),
+        "task list": ("GET", "/api/tasks?limit=30", None),
+        "board task list": ("GET", f"/api/boards/{b}/tasks?limit=30", None),
+        "stage task list": ("GET", f"/api/boards/{b}/stages/{s}/tasks", None),
+        "task retrieve": ("GET", f"/api/tasks/{task.id}", None),
+        "user me": ("GET", "/api/users/me", None),
+        "home summary": ("GET", "/api/home/summary", None),
+        "login": (
+            "POST",
+            "/api/auth/login",
+            {"username": "bench", "password": "bench"},
+        ),
+        "task update": ("PATCH", f"/api/tasks/{task.id}", {"name": "Renamed"}),
+        "task create": ("POST", "/api/tasks", {"name": "New", "board": b, "stage": s}),
+        "board create": ("POST", "/api/boards", {"name": "New board"}),
+    }
+
+
+def measure(client, method, path, body, iterations):
+    from django.db import connection
+
+    def request():
+        response = client.generic(
+            method,
+            path,
+            json.dumps(body) if body is not None else "",
+            content_type="application/json",
+        )
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}")
+
+    for _ in range(10):
+        request()
+
+    # keep collections of garbage left by other cases out of the timings
+    gc.collect()
+    gc.disable()
+    latencies = []
+    try:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            request()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+
+    queries = []
+
+    def count_query(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query):
+        request()
+
+    # the smallest of a few peaks, one off allocations like lazy imports
+    # and cache fills would make a single one noisy
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(5):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            request()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "queries": len(queries),
+        "peak_kib": round(min(peaks) / 1024, 1),
+    }
+
+
+def compare(results, baseline, latency_tolerance, memory_tolerance):
+    """
+    Return a description of every regression of `results` from `baseline`.
+    """
+    regressions = []
+    for name, result in results.items():
+        if (base := baseline.get(name)) is None:
+            continue
+        if result["queries"] > base["queries"]:
+            regressions.append(
+                f"{name}: {result['queries']} queries, baseline {base['queries']}"
+            )
+        if (
+            result["p50_ms"]
+            > base["p50_ms"] * (1 + latency_tolerance) + LATENCY_SLACK_MS
+        ):
+            regressions.append(
+                f"{name}: p50 {result['p50_ms']:.2f}ms, baseline {base['p50_ms']:.2f}ms"
+            )
+        if (
+            result["peak_kib"]
+            > base["peak_kib"] * (1 + memory_tolerance) + MEMORY_SLACK_KIB
+        ):
+            regressions.append(
+                f"{name}: peak {result['peak_kib']:.0f}KiB, "
+                f"baseline {base['peak_kib']:.0f}KiB"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="defaults to baselines/<vendor>.json")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument(
+        "--latency-tolerance",
+        type=float,
+        default=0.3,
+        help="allowed relative increase of the median latency",
+    )
+    parser.add_argument(
+        "--memory-tolerance",
+        type=float,
+        default=0.1,
+        help="allowed relative increase of the allocation peak",
+    )
+    args = parser.parse_args()
+
+    setup_django(args.database_url)
+
+    import django
+    from django.db import connection
+    from django.test import Client
+
+    from taskman.models import Board, Stage, Tag, Task
+
+    from .dataset import seed
+
+    token = seed()
+    board = Board.objects.filter(public=False).first()
+    stage = Stage.objects.filter(board=board).first()
+    client = Client(SERVER_NAME="localhost", HTTP_AUTHORIZATION=f"Token {token}")
+    cases = get_cases(
+        board,
+        stage,
+        Task.objects.filter(stage=stage).first(),
+        Tag.objects.filter(board=board).first(),
+        Board.objects.filter(public=True).first(),
+    )
+
+    results = {}
+    print(f"{'endpoint':<18}{'p50 ms':>9}{'p95 ms':>9}{'queries':>9}{'peak KiB':>10}")
+    for name, (method, path, body) in cases.items():
+        result = results[name] = measure(client, method, path, body, args.iterations)
+        print(
+            f"{name:<18}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+            f"{result['queries']:>9}{result['peak_kib']:>10.1f}"
+        )
+
+    report = {
+        "environment": {
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "iterations": args.iterations,
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+
+    baseline_path = Path(args.baseline or BASELINES_DIR / f"{connection.vendor}.json")
+    if args.update_baseline:
+        baseline_path.parent.mkdir(exist_ok=True)
+        baseline_path.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"baseline written to {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print(f"no baseline at {baseline_path}, run with --update-baseline")
+        return
+
+    baseline = json.loads(baseline_path.read_text())["results"]
+    if regressions := compare(
+        results, baseline, args.latency_tolerance, args.memory_tolerance
+    ):
+        print("\nregressions:", *regressions, sep="\n  ")
+        sys.exit(1)
+    print("\nno regressions")
+
+
+if __name__ == "__main__":
+    main()
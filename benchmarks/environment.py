@@ -0,0 +1,26 @@
+import os
+import tempfile
+from pathlib import Path
+
+
+def setup_django(database_url=None):
+    """
+    Configure Django for a benchmark run against `database_url`, a fresh
+    SQLite file when omitted, migrate it and return the environment the
+    benchmarked servers must run with.
+    """
+    if database_url is None:
+        path = Path(tempfile.mkdtemp(prefix="taskman-bench-")) / "db.sqlite3"
+        database_url = f"sqlite:///{path}"
+    env = {
+        "DJANGO_SETTINGS_MODULE": "core.settings.benchmark",
+        "DATABASE_URL": database_url,
+    }
+    os.environ.update(env)
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+    return env
@@ -0,0 +1,124 @@
+"""
+Compare the response formats on a large board: the time to serialize it,
+with and without the compiled serializers, then for each renderer the time
+to render it, its size and the time to decode it back.
+
+    python -m benchmarks.formats --tasks-per-stage 1000
+"""
+import argparse
+import gc
+import io
+import os
+import time
+from unittest import mock
+
+from .environment import setup_django
+
+
+def best_of(func, repeat):
+    """
+    The fastest of `repeat` calls of `func`, in milliseconds.
+    """
+    timings = []
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        gc.enable()
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks-per-stage", type=int, default=1000)
+    parser.add_argument("--tags", type=int, default=20, help="Tags of the board.")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file")
+    args = parser.parse_args()
+
+    # let the board retrieve return every task
+    os.environ["BOARD_MAX_TASKS_PER_STAGE"] = str(args.tasks_per_stage)
+    setup_django(args.database_url)
+
+    import msgpack
+    from rest_framework import serializers
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from taskman.models import Board, Task
+    from taskman.serializers import FullBoardSerializer, NormalizedBoardSerializer
+    from taskman.stage_tasks import prefetch_board_tasks
+    from utils.parsers import ORJSONParser
+    from utils.renderers import MessagePackRenderer, ORJSONRenderer
+    from utils.serializers.compiled import CompiledSerializerMixin
+
+    from .dataset import seed
+
+    seed(boards=1, tasks_per_stage=args.tasks_per_stage, tags_per_board=args.tags)
+    board_id = Board.objects.get().id
+    print(f"board of {Task.objects.count()} tasks, {args.tags} tags\n")
+
+    def parse(parser):
+        return lambda content: parser.parse(io.BytesIO(content))
+
+    formats = {
+        "drf json": (JSONRenderer(), parse(JSONParser())),
+        "orjson": (ORJSONRenderer(), parse(ORJSONParser())),
+        # boards key their maps by integer ids, which MessagePackParser only
+        # takes as strings in request bodies
+        "msgpack": (
+            MessagePackRenderer(),
+            lambda content: msgpack.unpackb(content, strict_map_key=False),
+        ),
+    }
+    layouts = {
+        "nested": FullBoardSerializer,
+        "normalized": NormalizedBoardSerializer,
+    }
+    print(f"{'layout':<12}{'format':<10}{'render ms':>11}{'decode ms':>11}{'KiB':>9}")
+    serialize_rows = []
+    for layout, serializer_class in layouts.items():
+        request = Request(
+            APIRequestFactory().get(
+                "/", {"tasks": args.tasks_per_stage, "layout": layout}
+            )
+        )
+        board = Board.objects.prefetch_related("stages", "tags").get(pk=board_id)
+        prefetch_board_tasks(board, request)
+        context = {"access_levels": {board_id: 0}}
+
+        def serialize():
+            return serializer_class(board, context=context).data
+
+        compiled_ms = best_of(serialize, args.repeat)
+        # DRF's own to_representation in place of the compiled one
+        with mock.patch.object(
+            CompiledSerializerMixin,
+            "to_representation",
+            serializers.Serializer.to_representation,
+        ):
+            drf_ms = best_of(serialize, args.repeat)
+        serialize_rows.append((layout, drf_ms, compiled_ms))
+
+        data = serialize()
+        for name, (renderer, decode) in formats.items():
+            content = renderer.render(data)
+            render_ms = best_of(lambda: renderer.render(data), args.repeat)
+            decode_ms = best_of(lambda: decode(content), args.repeat)
+            print(
+                f"{layout:<12}{name:<10}{render_ms:>11.2f}{decode_ms:>11.2f}"
+                f"{len(content) / 1024:>9.1f}"
+            )
+
+    print(f"\n{'layout':<12}{'serialize ms':>13}{'compiled ms':>14}")
+    for layout, drf_ms, compiled_ms in serialize_rows:
+        print(f"{layout:<12}{drf_ms:>13.2f}{compiled_ms:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import http.client
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def summarize(latencies, errors, elapsed):
+    """
+    `errors` counts failed requests by status code, or by exception name
+    when no response was received.
+    """
+    return {
+        "requests": len(latencies) + sum(errors.values()),
+        "errors": sum(errors.values()),
+        "error_counts": dict(errors),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def run_load(base_url, make_request, concurrency=16, duration=10.0):
+    """
+    Hammer a server from `concurrency` threads for `duration` seconds.
+
+    `make_request(worker, iteration)` returns `(method, path, body, headers)`,
+    every thread keeps its own keep-alive connection. Returns the throughput,
+    latency percentiles and errors.
+    """
+    url = urlsplit(base_url)
+    latencies, errors = [], Counter()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+        iteration, own, failed = 0, [], Counter()
+        while time.perf_counter() < deadline:
+            method, path, body, headers = make_request(index, iteration)
+            iteration += 1
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException) as exc:
+                failed[type(exc).__name__] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+                continue
+            if response.status >= 400:
+                failed[str(response.status)] += 1
+            else:
+                own.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(own)
+            errors.update(failed)
+
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=worker, args=(i,), daemon=True)
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors, time.perf_counter() - started)
@@ -0,0 +1,143 @@
+"""
+Load test a local gunicorn with mixed read and write scenarios, to size
+deployments and catch contention that single requests don't show.
+
+Every scenario runs for `--duration` seconds from `--concurrency` client
+threads against `gunicorn core.wsgi:application` with the chosen worker
+model. SQLite serializes writes, point `--database-url` at PostgreSQL for
+meaningful write scenarios.
+
+    python -m benchmarks.scenarios --worker-class gthread --workers 4 --threads 4
+    python -m benchmarks.scenarios --scenario drags --concurrency 64 \\
+        --database-url postgres://localhost/taskman_load
+"""
+import argparse
+import json
+import random
+from pathlib import Path
+
+from .environment import setup_django
+from .load import run_load
+from .server import gunicorn
+
+LOGIN_USERS = 20
+
+
+def get_scenarios(token, board, stages, tasks):
+    """
+    Map scenario names to `make_request(worker, iteration)` functions, see
+    `run_load`.
+    """
+    auth = {"Authorization": f"Token {token}", "Content-Type": "application/json"}
+
+    def hot_board_reads(worker, iteration):
+        # clients open the board, then poll it for changes
+        if iteration % 5 == 0:
+            return "GET", f"/api/boards/{board}", None, auth
+        return "GET", f"/api/boards/{board}/changes", None, auth
+
+    def drags(worker, iteration):
+        # move a card of the hot board to another stage and position
+        body = {
+            "stage": random.choice(stages),
+            "priority": random.randint(1, len(tasks)),
+        }
+        return "PATCH", f"/api/tasks/{random.choice(tasks)}", json.dumps(body), auth
+
+    def logins(worker, iteration):
+        username = f"load{random.randrange(LOGIN_USERS)}"
+        body = json.dumps({"username": username, "password": username})
+        return "POST", "/api/auth/login", body, {"Content-Type": "application/json"}
+
+    def mixed(worker, iteration):
+        roll = random.random()
+        if roll < 0.8:
+            return hot_board_reads(worker, iteration)
+        if roll < 0.97:
+            return drags(worker, iteration)
+        return logins(worker, iteration)
+
+    return {
+        "hot-board": hot_board_reads,
+        "drags": drags,
+        "logins": logins,
+        "mixed": mixed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=("hot-board", "drags", "logins", "mixed"),
+        help="run only this scenario, can be repeated",
+    )
+    parser.add_argument(
+        "--worker-class",
+        default="gthread",
+        help="gunicorn worker class, e.g. sync, gthread, gevent",
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--tasks-per-stage", type=int, default=100)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    env = setup_django(args.database_url)
+
+    from taskman.models import Board, Stage, User
+
+    from .dataset import seed
+
+    token = seed(tasks_per_stage=args.tasks_per_stage)
+    for i in range(LOGIN_USERS):
+        User.objects.create_user(f"load{i}", f"load{i}@example.com", f"load{i}")
+    board = Board.objects.filter(public=False).first()
+    stages = list(Stage.objects.filter(board=board).values_list("id", flat=True))
+    tasks = list(board.tasks.values_list("id", flat=True))
+    scenarios = get_scenarios(token, board.id, stages, tasks)
+
+    results = {}
+    server = {
+        "worker_class": args.worker_class,
+        "workers": args.workers,
+        "threads": args.threads,
+    }
+    with gunicorn("core.wsgi:application", env=env, **server) as base_url:
+        for name in args.scenario or scenarios:
+            results[name] = run_load(
+                base_url,
+                scenarios[name],
+                concurrency=args.concurrency,
+                duration=args.duration,
+            )
+
+    print(
+        f"{args.worker_class}, {args.workers} workers x {args.threads} threads, "
+        f"{args.concurrency} clients"
+    )
+    print(
+        f"{'scenario':<17}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'p99 ms':>9}{'errors':>9}"
+    )
+    for name, stats in results.items():
+        error_rate = stats["errors"] / stats["requests"] if stats["requests"] else 0
+        print(
+            f"{name:<17}{stats['rps']:>9.1f}{stats['p50_ms']:>9.1f}"
+            f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{error_rate:>9.1%}"
+        )
+        if stats["error_counts"]:
+            print(f"{'':<17}errors: {stats['error_counts']}")
+    if args.output:
+        report = {"server": server, "concurrency": args.concurrency, "results": results}
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare the time to serialize many rows with DRF's to_representation, the
+fast path of FastRepresentationMixin and the compiled serializers, checking
+that the three produce the same data.
+
+    python -m benchmarks.serializers --tasks 10000
+"""
+import argparse
+from unittest import mock
+
+from .environment import setup_django
+from .formats import best_of
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file")
+    args = parser.parse_args()
+
+    setup_django(args.database_url)
+
+    from rest_framework import serializers
+
+    from taskman.models import Stage, Tag, Task
+    from taskman.serializers import (
+        StageSerializer,
+        TagSerializer,
+        TaskDetailSerializer,
+        TaskSerializer,
+    )
+    from utils.serializers.base import FastRepresentationMixin
+    from utils.serializers.compiled import CompiledSerializerMixin
+
+    from .dataset import STAGE_NAMES, seed
+
+    seed(
+        boards=1, tasks_per_stage=-(-args.tasks // len(STAGE_NAMES)), tags_per_board=20
+    )
+    tasks = list(Task.objects.prefetch_related("tags"))
+    stages = list(Stage.objects.prefetch_related("tasks__tags"))
+    tags = list(Tag.objects.all()) * (len(tasks) // Tag.objects.count())
+    tag_rows = list(Tag.objects.values("id", "name", "color")) * (
+        len(tasks) // Tag.objects.count()
+    )
+    print(f"{len(tasks)} tasks, {len(stages)} stages\n")
+
+    cases = {
+        "TaskSerializer": (TaskSerializer, tasks),
+        "TaskDetailSerializer": (TaskDetailSerializer, tasks),
+        "StageSerializer": (StageSerializer, stages),
+        "TagSerializer": (TagSerializer, tags),
+        "TagSerializer rows": (TagSerializer, tag_rows),
+    }
+    paths = {
+        "drf": serializers.Serializer.to_representation,
+        "fast path": FastRepresentationMixin.to_representation,
+    }
+    print(f"{'serializer':<22}{'drf ms':>10}{'fast path ms':>14}{'compiled ms':>13}")
+    for name, (serializer_class, objects) in cases.items():
+
+        def serialize():
+            return serializer_class(objects, many=True).data
+
+        timings = {}
+        compiled_data = serialize()
+        for path, to_representation in paths.items():
+            with mock.patch.object(
+                CompiledSerializerMixin, "to_representation", to_representation
+            ):
+                assert serialize() == compiled_data, f"{name} differs with {path}"
+                timings[path] = best_of(serialize, args.repeat)
+        timings["compiled"] = best_of(serialize, args.repeat)
+        print(
+            f"{name:<22}{timings['drf']:>10.2f}{timings['fast path']:>14.2f}"
+            f"{timings['compiled']:>13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
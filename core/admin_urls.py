@@ -0,0 +1,19 @@
+"""
+URL configuration of the admin site, included lazily by ``core.urls``.
+
+The admin modules of the apps are imported here rather than at startup, with
+``SimpleAdminConfig``, so workers only load the admin, adminsortable and
+djangoql when the admin is first requested.
+"""
+from django.contrib import admin
+from django.urls import path
+
+from utils.views.profiling import profile_detail, profile_list
+
+admin.autodiscover()
+
+urlpatterns = [
+    path("profiles/", profile_list, name="profile-list"),
+    path("profiles/<str:profile_id>/", profile_detail, name="profile-detail"),
+    path("", admin.site.urls),
+]
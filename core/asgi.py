@@ -0,0 +1,46 @@
+"""
+ASGI config for core project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests are served by Django with ``core.asgi_urls``, which swaps the
+hottest read-only endpoints for async views, websocket connections are routed
+to the channels consumers in ``taskman.ws_router``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
+"""
+
+import os
+
+import django
+from django.core.handlers.asgi import ASGIHandler
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings.local")
+
+
+class AsyncURLConfASGIHandler(ASGIHandler):
+    urlconf = "core.asgi_urls"
+
+    async def get_response_async(self, request):
+        request.urlconf = self.urlconf
+        return await super().get_response_async(request)
+
+
+# initialize django before importing anything that touches the models
+django.setup(set_prefix=False)
+django_asgi_app = AsyncURLConfASGIHandler()
+
+from channels.auth import AuthMiddlewareStack  # noqa E402
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa E402
+
+from taskman.ws_router import websocket_urlpatterns  # noqa E402
+from utils.websocket import TokenAuthMiddleware  # noqa E402
+
+application = ProtocolTypeRouter(
+    {
+        "http": django_asgi_app,
+        "websocket": AuthMiddlewareStack(
+            TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+        ),
+    }
+)
@@ -0,0 +1,13 @@
+"""
+URL configuration of the ASGI app.
+
+The async endpoints serve the reads of their sync counterparts and hand
+them the rest, every other route falls through to ``core.urls``.
+"""
+from django.urls import include, path
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path("api/", include("taskman.async_router")),
+] + sync_urlpatterns
@@ -1,6 +1,7 @@
 import os
 
 from celery import Celery
+from django.db import DatabaseError
 
 # set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings.local")
@@ -15,3 +16,57 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
+
+# Record task durations and serve the worker's metrics, see utils.metrics
+from utils import metrics  # noqa: E402,F401
+
+
+@app.task(
+    ignore_result=True,
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=5,
+)
+def write_activity_events(events):
+    """
+    Write a batch of activity log events, see taskman.activity.
+    """
+    from taskman.activity import write_events
+
+    write_events(events)
+
+
+@app.task(ignore_result=True)
+def rollup_stage_transitions():
+    """
+    Fold the new stage transitions into the daily board analytics, run by
+    beat, see taskman.analytics.
+    """
+    from taskman.analytics import rollup_transitions
+
+    rollup_transitions()
+
+
+@app.task(
+    ignore_result=True,
+    autoretry_for=(OSError,),
+    retry_backoff=True,
+    max_retries=5,
+)
+def purge_surrogate_keys(keys):
+    """
+    Purge the responses a CDN cached under surrogate keys, see utils.cdn.
+    """
+    from utils.cdn import purge_keys
+
+    purge_keys(keys)
+
+
+@app.task(ignore_result=True)
+def warm_caches():
+    """
+    Warm the caches of the most active boards and users, see taskman.warming.
+    """
+    from taskman import warming
+
+    warming.warm_caches()
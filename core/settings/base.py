@@ -2,6 +2,7 @@
 Base settings to build other settings files upon.
 """
 
+from datetime import timedelta
 from pathlib import Path
 
 import environ
@@ -39,6 +40,17 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/dev/ref/settings/#databases
 DATABASES = {"default": env.db("DATABASE_URL", default="sqlite:///db.sqlite3")}
 DATABASES["default"]["ATOMIC_REQUESTS"] = True
+# Read replicas, GET and HEAD requests read from one of them, see
+# utils.middlewares.ReplicaRoutingMiddleware
+for index, url in enumerate(env.list("DATABASE_REPLICA_URLS", default=[])):
+    DATABASES[f"replica_{index}"] = env.db_url_config(url)
+    DATABASES[f"replica_{index}"]["TEST"] = {"MIRROR": "default"}
+READ_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+# How long a client reads from the primary after writing, longer than the
+# replication lag
+REPLICA_PIN_SECONDS = env.int("REPLICA_PIN_SECONDS", default=5)
+# https://docs.djangoproject.com/en/dev/ref/settings/#database-routers
+DATABASE_ROUTERS = ["utils.routers.ReplicaRouter"]
 # https://docs.djangoproject.com/en/stable/ref/settings/#std:setting-DEFAULT_AUTO_FIELD
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -48,6 +60,8 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 ROOT_URLCONF = "core.urls"
 # https://docs.djangoproject.com/en/dev/ref/settings/#wsgi-application
 WSGI_APPLICATION = "core.wsgi.application"
+# https://channels.readthedocs.io/en/stable/deploying.html#configuring-the-asgi-application
+ASGI_APPLICATION = "core.asgi.application"
 
 # APPS
 # ------------------------------------------------------------------------------
@@ -58,7 +72,9 @@ DJANGO_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.humanize",  # Handy template tags
-    "django.contrib.admin",
+    # admin modules are autodiscovered on the first admin request instead of
+    # at startup, see core/admin_urls.py
+    "django.contrib.admin.apps.SimpleAdminConfig",
     "django.forms",
 ]
 THIRD_PARTY_APPS = [
@@ -114,9 +130,13 @@ AUTH_PASSWORD_VALIDATORS = [
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
+    "utils.middlewares.QueryMetricsMiddleware",
+    "utils.middlewares.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "utils.middlewares.ReplicaRoutingMiddleware",
+    "utils.middlewares.CookieFreeMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -126,6 +146,7 @@ MIDDLEWARE = [
     "django.middleware.common.BrokenLinkEmailsMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "utils.middlewares.TimezoneMiddleware",
+    "utils.middlewares.CurrentRequestMiddleware",
 ]
 
 # STATIC
@@ -198,6 +219,8 @@ EMAIL_TIMEOUT = 5
 # ------------------------------------------------------------------------------
 # Django Admin URL.
 ADMIN_URL = "admin/"
+# Route the admin, turn off on web processes that never serve it
+ADMIN_ENABLED = env.bool("DJANGO_ADMIN_ENABLED", default=True)
 # https://docs.djangoproject.com/en/dev/ref/settings/#admins
 
 # LOGGING
@@ -246,6 +269,29 @@ CELERY_TASK_TIME_LIMIT = 5 * 60
 # http://docs.celeryproject.org/en/latest/userguide/configuration.html#task-soft-time-limit
 # TODO: set to whatever value is adequate in your circumstances
 CELERY_TASK_SOFT_TIME_LIMIT = 60
+# Seconds between two rollups of the board analytics, see taskman.analytics
+ANALYTICS_ROLLUP_INTERVAL = env.int("ANALYTICS_ROLLUP_INTERVAL", default=5 * 60)
+# http://docs.celeryproject.org/en/latest/userguide/configuration.html#beat-schedule
+CELERY_BEAT_SCHEDULE = {
+    "rollup-stage-transitions": {
+        "task": "core.celery_app.rollup_stage_transitions",
+        "schedule": ANALYTICS_ROLLUP_INTERVAL,
+        # a run left in the queue is superseded by the next one
+        "options": {"expires": ANALYTICS_ROLLUP_INTERVAL},
+    },
+}
+
+# Channels
+# ------------------------------------------------------------------------------
+# https://channels.readthedocs.io/en/stable/topics/channel_layers.html
+CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": "channels_redis.pubsub.RedisPubSubChannelLayer",
+        "CONFIG": {
+            "hosts": [env("REDIS_URL", default="redis://localhost:6379/0")],
+        },
+    },
+}
 
 # django-rest-framework
 # -------------------------------------------------------------------------------
@@ -253,6 +299,18 @@ CELERY_TASK_SOFT_TIME_LIMIT = 60
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_PAGINATION_CLASS": "utils.pagination.CustomLimitOffsetPagination",
+    # orjson and MessagePack, see utils.renderers
+    "DEFAULT_RENDERER_CLASSES": (
+        "utils.renderers.ORJSONRenderer",
+        "utils.renderers.MessagePackRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "utils.parsers.ORJSONParser",
+        "utils.parsers.MessagePackParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_FILTER_BACKENDS": (
         "django_filters.rest_framework.DjangoFilterBackend",
         "rest_framework.filters.SearchFilter",
@@ -267,6 +325,10 @@ REST_FRAMEWORK = {
     "EXCEPTION_HANDLER": "utils.exceptions.exception_handler",
 }
 
+# Where `manage.py build_schema` writes the OpenAPI schema served on /api/schema
+SCHEMA_DIR = env("SCHEMA_DIR", default=str(ROOT_DIR / "build" / "schema"))
+# Route the schema and its Swagger and Redoc pages
+API_DOCS_ENABLED = env.bool("DJANGO_API_DOCS_ENABLED", default=True)
 SPECTACULAR_SETTINGS = {
     "TITLE": "Taskman API",
     "DESCRIPTION": "Api to manage taskman boards",
@@ -313,3 +375,76 @@ CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_HEADERS = list(default_headers) + [
     "sentry-trace",
 ]
+
+# TASKMAN
+# ------------------------------------------------------------------------------
+# How far the board sync cursor trails the current time, rows modified within
+# this window are sent again on the next sync to cover clock ties and
+# transactions that were still in flight.
+BOARD_SYNC_OVERLAP = timedelta(seconds=env.int("BOARD_SYNC_OVERLAP_SECONDS", default=5))
+# Raise instead of logging a warning when a request runs more queries than
+# its action's budget, see utils.views.mixins.QueryBudgetMixin
+QUERY_BUDGET_RAISE = env.bool("QUERY_BUDGET_RAISE", default=False)
+# Bearer token Prometheus must send to scrape /metrics, required outside DEBUG
+METRICS_TOKEN = env("METRICS_TOKEN", default=None)
+# Let staff users profile single requests, see utils.middlewares.ProfilingMiddleware
+PROFILE_REQUESTS = env.bool("PROFILE_REQUESTS", default=True)
+# Seconds between two stack samples of a profiled request
+PROFILE_INTERVAL = env.float("PROFILE_INTERVAL", default=0.001)
+# Seconds profiles are kept in the cache
+PROFILE_TTL = env.int("PROFILE_TTL", default=24 * 60 * 60)
+# Where task attachments are stored, outside of MEDIA_ROOT as downloads are
+# checked against board access, see taskman.attachments
+ATTACHMENT_ROOT = env("ATTACHMENT_ROOT", default=str(ROOT_DIR / "attachments"))
+# Largest attachment accepted, in bytes
+ATTACHMENT_MAX_SIZE = env.int("ATTACHMENT_MAX_SIZE", default=100 * 1024 * 1024)
+# Let the front-end server send attachment files once access is checked:
+# "X-Accel-Redirect" for nginx, "X-Sendfile" for Apache or lighttpd, unset to
+# send them from Django
+ATTACHMENT_SENDFILE_HEADER = env("ATTACHMENT_SENDFILE_HEADER", default=None)
+# With X-Accel-Redirect, the internal nginx location aliased to ATTACHMENT_ROOT
+ATTACHMENT_ACCEL_PREFIX = env(
+    "ATTACHMENT_ACCEL_PREFIX", default="/internal/attachments/"
+)
+# Write activity log batches from a Celery task, off writes them from the
+# process recording them, see taskman.activity
+ACTIVITY_LOG_ASYNC = env.bool("ACTIVITY_LOG_ASYNC", default=True)
+# Events a process buffers before sending them as one batch
+ACTIVITY_LOG_BATCH_SIZE = env.int("ACTIVITY_LOG_BATCH_SIZE", default=100)
+# Seconds an event waits in the buffer at most
+ACTIVITY_LOG_FLUSH_INTERVAL = env.float("ACTIVITY_LOG_FLUSH_INTERVAL", default=2.0)
+# Stage transitions folded into the analytics rollups per transaction
+ANALYTICS_ROLLUP_BATCH_SIZE = env.int("ANALYTICS_ROLLUP_BATCH_SIZE", default=1000)
+# Most days of board analytics returned at once
+ANALYTICS_MAX_DAYS = env.int("ANALYTICS_MAX_DAYS", default=366)
+# Tasks of each stage returned by board retrieves, see taskman.stage_tasks
+BOARD_TASKS_PER_STAGE = env.int("BOARD_TASKS_PER_STAGE", default=50)
+# Most tasks per stage a board retrieve can ask for with ?tasks=
+BOARD_MAX_TASKS_PER_STAGE = env.int("BOARD_MAX_TASKS_PER_STAGE", default=500)
+# Seconds list responses are cached, 0 disables the cache, see
+# taskman.response_cache
+RESPONSE_CACHE_TTL = env.int("RESPONSE_CACHE_TTL", default=300)
+# Seconds browsers cache public boards
+PUBLIC_BOARD_MAX_AGE = env.int("PUBLIC_BOARD_MAX_AGE", default=60)
+# Seconds CDNs cache public boards, writes purge them sooner, see utils.cdn
+PUBLIC_BOARD_CDN_MAX_AGE = env.int("PUBLIC_BOARD_CDN_MAX_AGE", default=24 * 60 * 60)
+# Class purging CDN responses by surrogate key: utils.cdn.FastlyPurger for
+# Fastly, utils.cdn.NullPurger without a CDN, utils.cdn.LocalPurger in
+# development and tests. Required in production, see utils.cdn
+SURROGATE_PURGER = env("SURROGATE_PURGER", default=None)
+# Purge from a Celery task, off purges from the process writing
+SURROGATE_PURGE_ASYNC = env.bool("SURROGATE_PURGE_ASYNC", default=True)
+# Fastly service and API token purging it, with FastlyPurger
+FASTLY_SERVICE_ID = env("FASTLY_SERVICE_ID", default=None)
+FASTLY_API_TOKEN = env("FASTLY_API_TOKEN", default=None)
+# Seconds `manage.py warm_caches` spends at most, see taskman.warming
+CACHE_WARM_BUDGET = env.float("CACHE_WARM_BUDGET", default=60.0)
+# Most active boards whose snapshots, and users whose access maps, summaries
+# and board lists, are warmed
+CACHE_WARM_BOARDS = env.int("CACHE_WARM_BOARDS", default=200)
+CACHE_WARM_USERS = env.int("CACHE_WARM_USERS", default=1000)
+# How far back activity ranks boards and users, older ones are ranked by
+# modified_at
+CACHE_WARM_ACTIVITY_WINDOW = timedelta(
+    days=env.int("CACHE_WARM_ACTIVITY_DAYS", default=7)
+)
@@ -0,0 +1,41 @@
+"""
+Settings for running the app under a real server for benchmarks and load tests.
+"""
+
+from django.conf import global_settings
+
+from .test import *  # noqa
+from .test import env
+
+# GENERAL
+# ------------------------------------------------------------------------------
+# https://docs.djangoproject.com/en/dev/ref/settings/#allowed-hosts
+ALLOWED_HOSTS = ["localhost", "127.0.0.1"]
+
+# PASSWORDS
+# ------------------------------------------------------------------------------
+# https://docs.djangoproject.com/en/dev/ref/settings/#password-hashers
+# hash like production, the test settings' MD5 would make logins look free
+PASSWORD_HASHERS = global_settings.PASSWORD_HASHERS
+
+# DATABASES
+# ------------------------------------------------------------------------------
+DATABASES["default"] = env.db("DATABASE_URL")  # noqa F405
+DATABASES["default"]["ATOMIC_REQUESTS"] = True  # noqa F405
+DATABASES["default"]["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=60)  # noqa F405
+
+# LOGGING
+# ------------------------------------------------------------------------------
+LOGGING["root"]["level"] = "ERROR"  # noqa F405
+
+# TASKMAN
+# ------------------------------------------------------------------------------
+# report budget overruns instead of failing requests under load
+QUERY_BUDGET_RAISE = False
+# buffer activity events like production does, there is no broker to send
+# them to. They are flushed from the requests filling the batch only, a flush
+# from the timer thread would be a second writer, which SQLite can't take.
+ACTIVITY_LOG_BATCH_SIZE = 100
+ACTIVITY_LOG_FLUSH_INTERVAL = 24 * 60 * 60
+# measure the queries and serialization of lists, not cache hits
+RESPONSE_CACHE_TTL = 0
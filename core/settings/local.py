@@ -18,11 +18,19 @@ ALLOWED_HOSTS = ["localhost", "0.0.0.0", "127.0.0.1"]
 # https://docs.djangoproject.com/en/dev/ref/settings/#caches
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "BACKEND": "utils.cache.backends.LocMemCache",
         "LOCATION": "",
     }
 }
 
+# Channels
+# ------------------------------------------------------------------------------
+# The app only makes runserver serve ASGI, deployed processes run gunicorn and
+# skip importing daphne and twisted.
+INSTALLED_APPS = ["channels"] + INSTALLED_APPS  # noqa F405
+# https://channels.readthedocs.io/en/stable/topics/channel_layers.html#in-memory-channel-layer
+CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
 # EMAIL
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-backend
@@ -64,5 +72,11 @@ INSTALLED_APPS += ["django_extensions"]  # noqa F405
 
 # http://docs.celeryproject.org/en/latest/userguide/configuration.html#task-eager-propagates
 CELERY_TASK_EAGER_PROPAGATES = True
+
+# TASKMAN
+# ------------------------------------------------------------------------------
+# no CDN in development, keep the purged keys in memory
+SURROGATE_PURGER = "utils.cdn.LocalPurger"
+
 # Your stuff...
 # ------------------------------------------------------------------------------
@@ -20,15 +20,43 @@ ALLOWED_HOSTS = env.list("DJANGO_ALLOWED_HOSTS", default=["example.com"])
 # ------------------------------------------------------------------------------
 DATABASES["default"] = env.db("DATABASE_URL")  # noqa F405
 DATABASES["default"]["ATOMIC_REQUESTS"] = True  # noqa F405
-DATABASES["default"]["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=60)  # noqa F405
+for database in DATABASES.values():  # noqa F405
+    database["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=60)
+# Per-process connection pool shared by the threads of a worker, see
+# utils/db/backends/postgresql/base.py
+if env.bool("DATABASE_POOL", default=True):
+    for database in DATABASES.values():  # noqa F405
+        database["ENGINE"] = "utils.db.backends.postgresql"
+        # connections go back to the pool after every request and task
+        database["CONN_MAX_AGE"] = 0
+        database.setdefault("OPTIONS", {})["pool"] = {
+            "min_size": env.int("DATABASE_POOL_MIN_SIZE", default=1),
+            "max_size": env.int(
+                "DATABASE_POOL_MAX_SIZE", default=env.int("GUNICORN_THREADS", default=4)
+            ),
+            "timeout": env.float("DATABASE_POOL_TIMEOUT", default=10.0),
+            "max_idle": env.float("DATABASE_POOL_MAX_IDLE", default=300.0),
+            "max_lifetime": env.float("DATABASE_POOL_MAX_LIFETIME", default=3600.0),
+            "check_interval": env.float("DATABASE_POOL_CHECK_INTERVAL", default=30.0),
+        }
 
 # CACHES
 # ------------------------------------------------------------------------------
+# an in-process LRU in front of Redis, see utils.cache.tiered
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "BACKEND": "utils.cache.tiered.TieredCache",
+        "OPTIONS": {
+            "REMOTE": "redis",
+            "MAX_SIZE": env.int("LOCAL_CACHE_MAX_SIZE", default=64 * 1024 * 1024),
+            "LOCAL_TIMEOUT": env.int("LOCAL_CACHE_TIMEOUT", default=60),
+        },
+    },
+    "redis": {
+        "BACKEND": "utils.cache.backends.RedisCache",
         "LOCATION": env("REDIS_URL"),
-    }
+        "NAME": "redis",
+    },
 }
 
 # SECURITY
@@ -144,5 +172,11 @@ sentry_sdk.init(
     traces_sample_rate=env.float("SENTRY_TRACES_SAMPLE_RATE", default=0.4),
     send_default_pii=True,
 )
+
+# TASKMAN
+# ------------------------------------------------------------------------------
+# public boards cached by a CDN must be purged on writes, see utils.cdn
+SURROGATE_PURGER = env("SURROGATE_PURGER")
+
 # Your stuff...
 # ------------------------------------------------------------------------------
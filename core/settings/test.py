@@ -25,5 +25,35 @@ PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-backend
 EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
 
+# CACHES
+# ------------------------------------------------------------------------------
+# the tiers of production, locmem standing in for Redis, see utils.cache.tiered
+CACHES = {
+    "default": {
+        "BACKEND": "utils.cache.tiered.TieredCache",
+        "OPTIONS": {"REMOTE": "remote"},
+    },
+    "remote": {
+        "BACKEND": "utils.cache.backends.LocMemCache",
+        "NAME": "remote",
+    },
+}
+
+# Channels
+# ------------------------------------------------------------------------------
+# https://channels.readthedocs.io/en/stable/topics/channel_layers.html#in-memory-channel-layer
+CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+# TASKMAN
+# ------------------------------------------------------------------------------
+# fail tests on N+1 regressions
+QUERY_BUDGET_RAISE = True
+# write activity events as soon as their transaction commits
+ACTIVITY_LOG_ASYNC = False
+ACTIVITY_LOG_BATCH_SIZE = 1
+# purge as soon as writes commit, with the local purger
+SURROGATE_PURGER = "utils.cdn.LocalPurger"
+SURROGATE_PURGE_ASYNC = False
+
 # Your stuff...
 # ------------------------------------------------------------------------------
@@ -1,38 +1,44 @@
 from django.conf import settings
 from django.conf.urls.static import static
-from django.contrib import admin
 from django.urls import include, path
 from django.views import defaults as default_views
 from django.views.generic.base import RedirectView
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularRedocView,
-    SpectacularSwaggerView,
-)
+
+from utils.metrics import metrics_view
+from utils.urls import lazy_include, lazy_view
 
 urlpatterns = [
-    path(settings.ADMIN_URL, admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
+if settings.ADMIN_ENABLED:
+    urlpatterns += [path(settings.ADMIN_URL, lazy_include("core.admin_urls"))]
+
 # API URLS
 urlpatterns += [
     # API base url
     path("api/", include("taskman.api_router")),
-    # Schema
-    path("api/schema", SpectacularAPIView.as_view(), name="schema"),
-    path(
-        "api/schema/swagger/",
-        SpectacularSwaggerView.as_view(url_name="schema"),
-        name="swagger-ui",
-    ),
-    path(
-        "api/schema/redoc/",
-        SpectacularRedocView.as_view(url_name="schema"),
-        name="redoc",
-    ),
-    path("", RedirectView.as_view(url="/api/schema/swagger/", permanent=False)),
 ]
 
+if settings.API_DOCS_ENABLED:
+    # drf-spectacular's views are only imported on the first request
+    urlpatterns += [
+        path("api/schema", lazy_view("utils.views.schema.SchemaView"), name="schema"),
+        path(
+            "api/schema/swagger/",
+            lazy_view(
+                "drf_spectacular.views.SpectacularSwaggerView", url_name="schema"
+            ),
+            name="swagger-ui",
+        ),
+        path(
+            "api/schema/redoc/",
+            lazy_view("drf_spectacular.views.SpectacularRedocView", url_name="schema"),
+            name="redoc",
+        ),
+        path("", RedirectView.as_view(url="/api/schema/swagger/", permanent=False)),
+    ]
+
 if settings.DEBUG:
     # This allows the error pages to be debugged during development, just visit
     # these url in browser to see how these error pages look like.
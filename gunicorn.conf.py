@@ -0,0 +1,46 @@
+"""
+Gunicorn configuration, picked up from the working directory by every
+gunicorn process in the Procfile. Command line flags take precedence.
+
+The web process runs threaded workers, the threads of a worker share its
+database connection pool, so keep DATABASE_POOL_MAX_SIZE >= GUNICORN_THREADS.
+
+Workers write their Prometheus metrics to PROMETHEUS_MULTIPROC_DIR so any of
+them can serve the totals of all workers on /metrics, see utils/metrics.py.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# https://docs.gunicorn.org/en/stable/settings.html#workers
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() + 1))
+# https://docs.gunicorn.org/en/stable/settings.html#worker-class
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+# https://docs.gunicorn.org/en/stable/settings.html#threads
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# https://docs.gunicorn.org/en/stable/settings.html#max-requests
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10
+
+# Set before the workers import prometheus_client, one directory per master so
+# the web and asgi processes don't share samples.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(tempfile.gettempdir(), f"prometheus-{os.getpid()}"),
+)
+
+
+# https://docs.gunicorn.org/en/stable/settings.html#on-starting
+def on_starting(server):
+    # drop the samples of a previous run
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+# https://docs.gunicorn.org/en/stable/settings.html#child-exit
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,179 @@
+"""
+Activity log of the changes made to boards and their rows.
+
+Changes are captured by the signal handlers in `taskman.signals` and, once
+their transaction commits, buffered in memory. Each process flushes its
+buffer every `ACTIVITY_LOG_BATCH_SIZE` events or `ACTIVITY_LOG_FLUSH_INTERVAL`
+seconds, whichever comes first, to a Celery task writing the batch with one
+`bulk_create`: requests don't wait for the inserts. When the broker can't be
+reached, or `ACTIVITY_LOG_ASYNC` is off, the batch is written from the
+process itself.
+
+Saves through `bulk_create`, `bulk_update` and `QuerySet.update` send no
+signals and aren't logged. A process killed without shutting down loses
+the events of its last flush interval.
+"""
+import atexit
+import logging
+import threading
+
+from celery import signals as celery_signals
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.celery_app import write_activity_events
+from utils.middlewares import current_request
+
+from .models import ActivityAction, ActivityEvent, Board, Stage, Task
+
+logger = logging.getLogger(__name__)
+
+# fields of a row whose change makes an update a move
+MOVE_FIELDS = {
+    Stage: {"priority"},
+    Task: {"stage_id", "priority"},
+}
+
+
+def get_actor_id():
+    request = current_request.get()
+    user = getattr(request, "user", None)
+    return user.id if user is not None and user.is_authenticated else None
+
+
+def record(instance, action, changes=None):
+    """
+    Log a change to `instance` once the current transaction commits, rolled
+    back changes are never logged.
+    """
+    event = {
+        "board_id": instance.id if isinstance(instance, Board) else instance.board_id,
+        "actor_id": get_actor_id(),
+        "model": instance._meta.model_name,
+        "object_id": instance.pk,
+        "action": action,
+        "changes": changes or {},
+        "created_at": timezone.now().isoformat(),
+    }
+    transaction.on_commit(lambda: buffer.add(event))
+
+
+def record_save(instance, created):
+    """
+    Log a saved row, diffing its fields with the values it was loaded with.
+    """
+    changes = {
+        field: list(values) for field, values in instance.get_changed_fields().items()
+    }
+    if created:
+        action = ActivityAction.CREATED
+        changes = {
+            field: [None, getattr(instance, field)]
+            for field in instance.get_preserved_fields()
+            if field != "deleted"
+        }
+    elif changes.get("deleted") == [False, True]:
+        action = ActivityAction.DELETED
+    elif not changes:
+        return
+    elif MOVE_FIELDS.get(type(instance), set()) & changes.keys():
+        action = ActivityAction.MOVED
+    else:
+        action = ActivityAction.UPDATED
+    # the next save is diffed against this one
+    instance.preserve_field_values()
+    record(instance, action, changes)
+
+
+def write_events(events):
+    """
+    Insert a batch of events, all or none of them.
+    """
+    with transaction.atomic():
+        ActivityEvent.objects.bulk_create(
+            ActivityEvent(
+                board_id=event["board_id"],
+                actor_id=event["actor_id"],
+                model=event["model"],
+                object_id=event["object_id"],
+                action=event["action"],
+                changes=event["changes"],
+                created_at=parse_datetime(event["created_at"]),
+            )
+            for event in events
+        )
+
+
+def send_events(events):
+    if settings.ACTIVITY_LOG_ASYNC:
+        try:
+            write_activity_events.apply_async((events,), retry=False)
+            return
+        except Exception as exc:
+            logger.warning(
+                "Could not queue %d activity events, writing them here: %s",
+                len(events),
+                exc,
+            )
+    try:
+        write_events(events)
+    except Exception:
+        logger.exception("Lost %d activity events", len(events))
+
+
+class ActivityBuffer:
+    """
+    The events of a process waiting to be sent, shared by its threads.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def add(self, event):
+        with self.lock:
+            self.events.append(event)
+            if len(self.events) < settings.ACTIVITY_LOG_BATCH_SIZE:
+                if self.timer is None:
+                    self.timer = threading.Timer(
+                        settings.ACTIVITY_LOG_FLUSH_INTERVAL, self.flush_from_timer
+                    )
+                    self.timer.daemon = True
+                    self.timer.start()
+                return
+            events = self.take()
+        send_events(events)
+
+    def take(self):
+        # call with the lock held
+        events, self.events = self.events, []
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        return events
+
+    def flush(self):
+        with self.lock:
+            events = self.take()
+        if events:
+            send_events(events)
+
+    def flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # the database connections of the timer thread
+            connections.close_all()
+
+
+buffer = ActivityBuffer()
+atexit.register(buffer.flush)
+
+
+@celery_signals.worker_process_shutdown.connect
+def flush_on_worker_shutdown(**kwargs):
+    # pool processes exit without running atexit handlers
+    buffer.flush()
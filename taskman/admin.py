@@ -7,7 +7,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from djangoql.admin import DjangoQLSearchMixin
 
-from .models import Board, BoardAccess, Stage, Tag, Task, User
+from .models import Board, BoardAccess, Stage, Tag, Task, TaskAttachment, User
 
 
 class BaseAdmin(DjangoQLSearchMixin, admin.ModelAdmin):
@@ -42,3 +42,8 @@ class StageAdmin(SortableAdmin, BaseAdmin):
 @admin.register(Task)
 class TaskAdmin(SortableAdmin, BaseAdmin):
     pass
+
+
+@admin.register(TaskAttachment)
+class TaskAttachmentAdmin(BaseAdmin):
+    pass
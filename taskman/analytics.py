@@ -0,0 +1,257 @@
+"""
+Stage transitions of tasks and the daily rollups board analytics read.
+
+A transition is saved whenever a task enters or leaves a stage: created,
+moved, deleted or restored. Every `ANALYTICS_ROLLUP_INTERVAL` the
+`rollup_stage_transitions` Celery beat task folds the transitions saved
+since its last run into daily counters:
+
+- StageDailyStats, the tasks entering and leaving each stage on a day. Their
+  running sum is the cumulative flow diagram.
+- BoardDailyStats, histograms of the lead and cycle times of the tasks
+  completed on a day, merged to estimate percentiles.
+
+A task is completed when it enters the last stage of its board. Its lead
+time runs from its creation, its cycle time from its first move out of the
+stage it was created in. Reading analytics costs the same however many
+tasks a board has, the rows read grow with the days of history only, and
+trails the transitions by up to one rollup interval.
+
+Tasks hard deleted, through querysets or cascades, leave no transition.
+"""
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min, Q, Sum
+from django.utils import timezone
+
+from .models import BoardDailyStats, Stage, StageDailyStats, StageTransition
+
+# Durations are counted in buckets growing by 2^(1/8), about 9%, from a
+# minute up to two years, so percentiles are estimated within 9%.
+BUCKET_BASE = 60
+BUCKET_GROWTH = 2 ** (1 / 8)
+BUCKET_COUNT = 8 * 20
+PERCENTILES = (50, 85, 95)
+
+
+def get_bucket(seconds):
+    if seconds <= BUCKET_BASE:
+        return 0
+    return min(math.ceil(math.log(seconds / BUCKET_BASE, BUCKET_GROWTH)), BUCKET_COUNT)
+
+
+def get_bucket_bound(bucket):
+    """
+    The longest duration counted in a bucket, in seconds.
+    """
+    return BUCKET_BASE * BUCKET_GROWTH**bucket
+
+
+def get_percentiles(histogram):
+    total = sum(histogram.values())
+    percentiles = {"count": total}
+    counts = sorted((int(bucket), count) for bucket, count in histogram.items())
+    for percentile in PERCENTILES:
+        rank = total * percentile / 100
+        seen, value = 0, None
+        for bucket, count in counts:
+            if count and seen + count >= rank:
+                lower = get_bucket_bound(bucket - 1) if bucket else 0
+                upper = get_bucket_bound(bucket)
+                # assume the durations are spread evenly within the bucket
+                value = round(lower + (upper - lower) * (rank - seen) / count)
+                break
+            seen += count
+        percentiles[f"p{percentile}"] = value
+    return percentiles
+
+
+def record_transition(task, created):
+    """
+    Save the transition of a saved task, if it entered or left a stage.
+    """
+    if created:
+        if task.deleted:
+            return
+        from_stage, to_stage = None, task.stage_id
+    else:
+        changes = task.get_changed_fields()
+        was_deleted, deleted = changes.get("deleted", (task.deleted, task.deleted))
+        old_stage, new_stage = changes.get("stage_id", (task.stage_id, task.stage_id))
+        from_stage = None if was_deleted else old_stage
+        to_stage = None if deleted else new_stage
+        if from_stage == to_stage:
+            return
+    StageTransition.objects.create(
+        board_id=task.board_id,
+        task_id=task.id,
+        from_stage_id=from_stage,
+        to_stage_id=to_stage,
+    )
+
+
+def rollup_transitions():
+    """
+    Fold the transitions not rolled up yet into the daily stats, one batch
+    per transaction. Returns how many were rolled up.
+    """
+    size = settings.ANALYTICS_ROLLUP_BATCH_SIZE
+    total = 0
+    while True:
+        with transaction.atomic():
+            # concurrent rollups take different batches
+            transitions = list(
+                StageTransition.objects.filter(rolled_up=False)
+                .select_for_update(skip_locked=True)
+                .order_by("id")[:size]
+            )
+            if transitions:
+                rollup_flow(transitions)
+                rollup_completions(transitions)
+                StageTransition.objects.filter(
+                    id__in=[transition.id for transition in transitions]
+                ).update(rolled_up=True)
+        total += len(transitions)
+        if len(transitions) < size:
+            return total
+
+
+def rollup_flow(transitions):
+    # {(board, stage, day): [entered, exited]}
+    deltas = defaultdict(lambda: [0, 0])
+    for transition in transitions:
+        day = timezone.localdate(transition.created_at)
+        if transition.to_stage_id:
+            deltas[transition.board_id, transition.to_stage_id, day][0] += 1
+        if transition.from_stage_id:
+            deltas[transition.board_id, transition.from_stage_id, day][1] += 1
+
+    StageDailyStats.objects.bulk_create(
+        [
+            StageDailyStats(board_id=board_id, stage_id=stage_id, day=day)
+            for board_id, stage_id, day in deltas
+        ],
+        ignore_conflicts=True,
+    )
+    for (_, stage_id, day), (entered, exited) in deltas.items():
+        StageDailyStats.objects.filter(stage_id=stage_id, day=day).update(
+            entered=F("entered") + entered, exited=F("exited") + exited
+        )
+
+
+def get_last_stages(board_ids):
+    last_stages = {}
+    stages = (
+        Stage.objects.filter(board_id__in=board_ids, archived=False)
+        .order_by("board_id", "priority", "id")
+        .values_list("board_id", "id")
+    )
+    for board_id, stage_id in stages:
+        last_stages[board_id] = stage_id
+    return last_stages
+
+
+def rollup_completions(transitions):
+    last_stages = get_last_stages(
+        {transition.board_id for transition in transitions if transition.to_stage_id}
+    )
+    completed = [
+        transition
+        for transition in transitions
+        if transition.to_stage_id
+        and transition.to_stage_id == last_stages.get(transition.board_id)
+    ]
+    if not completed:
+        return
+
+    # the first transition of a task is its creation
+    starts = {
+        row["task_id"]: row
+        for row in StageTransition.objects.filter(
+            task_id__in={transition.task_id for transition in completed}
+        )
+        .values("task_id")
+        .annotate(
+            first_at=Min("created_at"),
+            started_at=Min("created_at", filter=Q(from_stage__isnull=False)),
+        )
+    }
+    days = defaultdict(lambda: {"completed": 0, "lead": Counter(), "cycle": Counter()})
+    for transition in completed:
+        stats = days[transition.board_id, timezone.localdate(transition.created_at)]
+        stats["completed"] += 1
+        start = starts[transition.task_id]
+        lead_time = transition.created_at - start["first_at"]
+        stats["lead"][str(get_bucket(lead_time.total_seconds()))] += 1
+        # tasks created in the last stage have no cycle time
+        if start["started_at"] and start["started_at"] <= transition.created_at:
+            cycle_time = transition.created_at - start["started_at"]
+            stats["cycle"][str(get_bucket(cycle_time.total_seconds()))] += 1
+
+    BoardDailyStats.objects.bulk_create(
+        [BoardDailyStats(board_id=board_id, day=day) for board_id, day in days],
+        ignore_conflicts=True,
+    )
+    # the histograms are merged in Python, the rows stay locked meanwhile
+    rows = BoardDailyStats.objects.select_for_update().filter(
+        board_id__in={board_id for board_id, _ in days},
+        day__in={day for _, day in days},
+    )
+    for stats in rows.order_by("id"):
+        counts = days.get((stats.board_id, stats.day))
+        if not counts:
+            continue
+        stats.completed += counts["completed"]
+        stats.lead_times = dict(Counter(stats.lead_times) + counts["lead"])
+        stats.cycle_times = dict(Counter(stats.cycle_times) + counts["cycle"])
+        stats.save()
+
+
+def get_board_analytics(board, since, until):
+    """
+    The cumulative flow of the stages of `board` and the lead and cycle time
+    percentiles of its tasks completed from `since` to `until`, included.
+    """
+    days = [since + timedelta(days=n) for n in range((until - since).days + 1)]
+    stages = list(Stage.objects.filter(board=board).values("id", "name", "archived"))
+
+    tasks = dict(
+        StageDailyStats.objects.filter(board=board, day__lt=since)
+        .values("stage_id")
+        .annotate(tasks=Sum(F("entered") - F("exited")))
+        .values_list("stage_id", "tasks")
+    )
+    flow = defaultdict(dict)
+    for stage_id, day, entered, exited in StageDailyStats.objects.filter(
+        board=board, day__gte=since, day__lte=until
+    ).values_list("stage_id", "day", "entered", "exited"):
+        flow[stage_id][day] = entered - exited
+    for stage in stages:
+        count, series = tasks.get(stage["id"], 0), []
+        for day in days:
+            count += flow[stage["id"]].get(day, 0)
+            series.append(count)
+        stage["tasks"] = series
+
+    throughput = dict.fromkeys(days, 0)
+    lead_times, cycle_times = Counter(), Counter()
+    for stats in BoardDailyStats.objects.filter(
+        board=board, day__gte=since, day__lte=until
+    ):
+        throughput[stats.day] = stats.completed
+        lead_times.update(stats.lead_times)
+        cycle_times.update(stats.cycle_times)
+
+    return {
+        "since": since,
+        "until": until,
+        "days": days,
+        "stages": stages,
+        "throughput": list(throughput.values()),
+        "lead_time": get_percentiles(lead_times),
+        "cycle_time": get_percentiles(cycle_times),
+    }
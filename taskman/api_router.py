@@ -2,12 +2,16 @@ from django.conf import settings
 from rest_framework_nested import routers
 
 from .api_views import (
+    ActivityViewSet,
+    AttachmentUploadViewSet,
     AuthViewSet,
     BoardAccessViewSet,
     BoardViewSet,
     HomeViewSet,
+    PublicBoardViewSet,
     StageViewSet,
     TagViewSet,
+    TaskAttachmentViewSet,
     TaskViewSet,
     UserViewSet,
 )
@@ -23,17 +27,23 @@ if settings.DEBUG:
 router.register(r"auth", AuthViewSet, basename="auth")
 router.register(r"users", UserViewSet)
 router.register(r"boards", BoardViewSet)
+router.register(r"public/boards", PublicBoardViewSet, basename="public-board")
 router.register(r"tasks", TaskViewSet)
 router.register(r"home", HomeViewSet, basename="home")
 
 boards_router = NestedRouter(router, r"boards", lookup="board")
 boards_router.register(r"access", BoardAccessViewSet)
+boards_router.register(r"activity", ActivityViewSet, basename="board-activity")
 boards_router.register(r"stages", StageViewSet)
 boards_router.register(r"tags", TagViewSet)
 boards_router.register(r"tasks", TaskViewSet)
 
+tasks_router = NestedRouter(router, r"tasks", lookup="task")
+tasks_router.register(r"attachments", TaskAttachmentViewSet)
+tasks_router.register(r"uploads", AttachmentUploadViewSet)
+
 stages_router = NestedRouter(boards_router, r"stages", lookup="stage")
 stages_router.register(r"tasks", TaskViewSet)
 
 
-urlpatterns = router.urls + boards_router.urls + stages_router.urls
+urlpatterns = router.urls + boards_router.urls + tasks_router.urls + stages_router.urls
@@ -1,38 +1,137 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Count, Q
-from drf_spectacular.utils import extend_schema, extend_schema_view, inline_serializer
-from rest_framework import permissions, serializers, status
+from django.utils import timezone, translation
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import (
+    OpenApiParameter,
+    extend_schema,
+    extend_schema_view,
+    inline_serializer,
+)
+from rest_framework import generics, permissions, serializers, status
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action
 from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.mixins import (
+    CreateModelMixin,
+    DestroyModelMixin,
+    ListModelMixin,
+    RetrieveModelMixin,
+)
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from utils.cdn import cache_publicly
+from utils.metrics import observe_cache
+from utils.pagination import CustomCursorPagination
 from utils.views.base import BaseModelViewSet
+from utils.views.mixins import NonAtomicReadsMixin, PlainReadsMixin, QueryBudgetMixin
 
+from .analytics import get_board_analytics
+from .attachments import abort_upload, receive_chunk, serve_attachment, start_upload
 from .filters import TaskFilters
-from .models import AccessLevel, Board, BoardAccess, Stage, Tag, Task, User
+from .models import (
+    AccessLevel,
+    ActivityEvent,
+    AttachmentUpload,
+    Board,
+    BoardAccess,
+    Stage,
+    Tag,
+    Task,
+    TaskAttachment,
+    User,
+)
 from .permissions import BoardAccessPermission, IsSelfOrReadOnly
+from .response_cache import (
+    get_access_map,
+    get_list_scope,
+    get_snapshot_scope,
+    get_summary_key,
+    get_surrogate_key,
+)
 from .serializers import (
+    ActivityEventSerializer,
+    AttachmentUploadSerializer,
     AuthSerializer,
+    BoardAnalyticsQuerySerializer,
     BoardDetailAccessSerializer,
     BoardDetailSerializer,
     BoardSerializer,
     FullBoardSerializer,
     HomeDetailSerializer,
+    NormalizedBoardSerializer,
+    NormalizedPublicBoardSerializer,
+    PublicBoardSerializer,
     StageDetailSerializer,
     StageSerializer,
     TagDetailSerializer,
     TagSerializer,
+    TaskAttachmentSerializer,
     TaskDetailSerializer,
     TaskSerializer,
     UserDetailSerializer,
 )
+from .stage_tasks import is_normalized, prefetch_board_tasks
+from .sync import decode_cursor, encode_cursor, get_board_changes, next_cursor
+
+
+def get_home_summary(user_id):
+    if not settings.RESPONSE_CACHE_TTL:
+        return count_home_tasks(user_id)
+    key = get_summary_key(user_id)
+    if (summary := cache.get(key)) is not None:
+        observe_cache("home-summary", 1, 0)
+        return summary
+    observe_cache("home-summary", 0, 1)
+    summary = count_home_tasks(user_id)
+    cache.set(key, summary, settings.RESPONSE_CACHE_TTL)
+    return summary
+
+
+def count_home_tasks(user_id):
+    tasks = (
+        Task.objects.filter(board__access__id=user_id)
+        .filter(stage__name__in=["To Do", "In Progress", "Done"])
+        .order_by("stage")
+        .values("stage__name")
+        .annotate(count=Count("stage__name"))
+    )
+    done = list(filter(lambda x: x["stage__name"] == "Done", tasks))
+    in_progress = list(filter(lambda x: x["stage__name"] == "In Progress", tasks))
+    to_do = list(filter(lambda x: x["stage__name"] == "To Do", tasks))
+    return {
+        "done": done[0]["count"] if done else 0,
+        "in_progress": in_progress[0]["count"] if in_progress else 0,
+        "to_do": to_do[0]["count"] if to_do else 0,
+    }
+
+
+BOARD_RETRIEVE_PARAMETERS = [
+    OpenApiParameter(
+        "tasks",
+        int,
+        description="Tasks returned per stage, the following ones are "
+        "listed from the next cursor of their stage.",
+    ),
+    OpenApiParameter(
+        "layout",
+        str,
+        enum=("nested", "normalized"),
+        description="normalized returns stages, tasks and tags as maps "
+        "by id, tasks listing the ids of their tags.",
+    ),
+]
 
 
 class BaseApiViewSet(BaseModelViewSet):
     permission_classes = (BoardAccessPermission,)
 
+    def get_response_cache_scope(self):
+        return get_list_scope(self)
+
 
 class AuthViewSet(GenericViewSet):
     def get_permissions(self):
@@ -85,6 +184,8 @@ class AuthViewSet(GenericViewSet):
 class UserViewSet(BaseModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserDetailSerializer
+    non_atomic_actions = ("retrieve", "me")
+    query_budgets = {"retrieve": 1, "me": 0}
 
     def get_permissions(self):
         if self.action == "create":
@@ -114,6 +215,7 @@ class UserViewSet(BaseModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
+@extend_schema_view(retrieve=extend_schema(parameters=BOARD_RETRIEVE_PARAMETERS))
 class BoardViewSet(BaseModelViewSet):
     queryset = Board.objects.all()
     serializer_class = BoardDetailSerializer
@@ -121,22 +223,188 @@ class BoardViewSet(BaseModelViewSet):
         "retrieve": FullBoardSerializer,
         "list": BoardSerializer,
     }
+    non_atomic_actions = ("list", "retrieve", "changes", "analytics")
+    cached_actions = ("list", "retrieve")
+    query_budgets = {"list": 4, "retrieve": 7, "changes": 8, "analytics": 6}
 
     def get_permissions(self):
         return (BoardAccessPermission(AccessLevel.READ_ONLY, AccessLevel.ADMIN),)
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ("list", "retrieve") and not getattr(
+            self, "swagger_fake_view", False
+        ):
+            # the user's levels at once instead of one query per board, the
+            # scope of the response already read them
+            _, context["access_levels"] = get_access_map(self.request.user.id)
+        return context
+
+    def get_response_cache_scope(self):
+        if self.action == "retrieve":
+            try:
+                return get_snapshot_scope(self.request.user.id, int(self.kwargs["pk"]))
+            except ValueError:
+                return None
+        return get_list_scope(self)
+
     def get_queryset(self):
         qs = super().get_queryset()
         if self.action == "list":
             qs = qs.filter(Q(access__id=self.request.user.id) | Q(public=True))
         elif self.action == "retrieve":
-            qs = qs.prefetch_related(
-                "stages",
-                "stages__tasks",
-                "stages__tasks__tags",
+            qs = qs.prefetch_related("stages")
+            if is_normalized(self.request):
+                qs = qs.prefetch_related("tags")
+        return qs
+
+    def get_serializer_class(self):
+        if self.action == "retrieve" and is_normalized(self.request):
+            return NormalizedBoardSerializer
+        return super().get_serializer_class()
+
+    def get_object(self):
+        board = super().get_object()
+        if self.action == "retrieve":
+            prefetch_board_tasks(board, self.request)
+        return board
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "since",
+                str,
+                description="Cursor returned by the previous sync, "
+                "omit it to fetch the whole board.",
             )
+        ],
+        responses={
+            200: inline_serializer(
+                "BoardChangesSerializer",
+                {
+                    "cursor": serializers.CharField(),
+                    "board": BoardDetailSerializer(allow_null=True),
+                    "stages": serializers.ListField(child=serializers.DictField()),
+                    "tasks": serializers.ListField(child=serializers.DictField()),
+                    "tags": serializers.ListField(child=serializers.DictField()),
+                    "access": serializers.ListField(child=serializers.DictField()),
+                },
+            ),
+        },
+    )
+    @action(detail=True, methods=["get"])
+    def changes(self, request, *args, **kwargs):
+        board = self.get_object()
+        since = request.query_params.get("since")
+        since = decode_cursor(since) if since else None
+        # take the cursor before reading so nothing saved meanwhile is skipped
+        cursor = next_cursor(since)
+        changed = since is None or (board.modified_at and board.modified_at >= since)
+        return Response(
+            {
+                "cursor": encode_cursor(cursor),
+                "board": self.get_serializer(board).data if changed else None,
+                **get_board_changes(
+                    board,
+                    since,
+                    self.get_serializer_context(),
+                    member=board.id in get_access_map(request.user.id)[1],
+                ),
+            }
+        )
+
+    @extend_schema(
+        parameters=[BoardAnalyticsQuerySerializer],
+        responses={
+            200: inline_serializer(
+                "BoardAnalyticsSerializer",
+                {
+                    "since": serializers.DateField(),
+                    "until": serializers.DateField(),
+                    "days": serializers.ListField(child=serializers.DateField()),
+                    "stages": serializers.ListField(
+                        child=serializers.DictField(),
+                        help_text="Stages with their task count at the end of "
+                        "each day, the cumulative flow diagram.",
+                    ),
+                    "throughput": serializers.ListField(
+                        child=serializers.IntegerField(),
+                        help_text="Tasks completed each day.",
+                    ),
+                    "lead_time": serializers.DictField(
+                        help_text="Count and p50, p85 and p95 in seconds."
+                    ),
+                    "cycle_time": serializers.DictField(
+                        help_text="Count and p50, p85 and p95 in seconds."
+                    ),
+                },
+            ),
+        },
+    )
+    @action(detail=True, methods=["get"])
+    def analytics(self, request, *args, **kwargs):
+        board = self.get_object()
+        query = BoardAnalyticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(get_board_analytics(board, **query.validated_data))
+
+
+@extend_schema_view(
+    retrieve=extend_schema(parameters=BOARD_RETRIEVE_PARAMETERS, auth=[])
+)
+class PublicBoardViewSet(
+    QueryBudgetMixin,
+    NonAtomicReadsMixin,
+    PlainReadsMixin,
+    RetrieveModelMixin,
+    GenericViewSet,
+):
+    """
+    Public boards read anonymously, cached by browsers and CDNs. Writes to a
+    board purge it from the CDN, see taskman.response_cache.
+    """
+
+    queryset = Board.objects.filter(public=True)
+    serializer_class = PublicBoardSerializer
+    # no token or session is read, responses are the same for everyone
+    authentication_classes = ()
+    permission_classes = (permissions.AllowAny,)
+    query_budgets = {"retrieve": 5}
+
+    def initial(self, request, *args, **kwargs):
+        # dates and messages as the defaults render them, whoever signed in
+        timezone.deactivate()
+        translation.activate(settings.LANGUAGE_CODE)
+        super().initial(request, *args, **kwargs)
+
+    def get_queryset(self):
+        qs = super().get_queryset().prefetch_related("stages")
+        if is_normalized(self.request):
+            qs = qs.prefetch_related("tags")
         return qs
 
+    def get_serializer_class(self):
+        if is_normalized(self.request):
+            return NormalizedPublicBoardSerializer
+        return super().get_serializer_class()
+
+    def get_object(self):
+        board = super().get_object()
+        prefetch_board_tasks(board, self.request)
+        return board
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # boards not found too, they are purged once made public
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_404_NOT_FOUND):
+            cache_publicly(
+                response,
+                [get_surrogate_key(self.kwargs.get("pk"))],
+                settings.PUBLIC_BOARD_MAX_AGE,
+                settings.PUBLIC_BOARD_CDN_MAX_AGE,
+            )
+        return response
+
 
 class BoardAccessViewSet(BaseModelViewSet):
     queryset = BoardAccess.objects.all()
@@ -160,13 +428,17 @@ class StageViewSet(BaseApiViewSet):
     serializer_action_classes = {
         "list": StageSerializer,
     }
+    query_budgets = {"list": 6, "retrieve": 5}
 
     def get_queryset(self):
         qs = super().get_queryset()
         if board_pk := self.kwargs.get("board_pk"):
             qs = qs.filter(board=board_pk)
         if self.action == "list":
-            qs = qs.filter(board__access__id=self.request.user.id)
+            qs = qs.filter(board__access__id=self.request.user.id).prefetch_related(
+                "tasks",
+                "tasks__tags",
+            )
         elif self.action == "retrieve":
             qs = qs.prefetch_related(
                 "tasks",
@@ -181,11 +453,12 @@ class TagViewSet(BaseApiViewSet):
     serializer_action_classes = {
         "list": TagSerializer,
     }
+    query_budgets = {"list": 4, "retrieve": 3}
 
     def get_queryset(self):
         qs = super().get_queryset()
         if board_pk := self.kwargs.get("board_pk"):
-            qs.filter(board__id=board_pk)
+            qs = qs.filter(board__id=board_pk)
         if self.action == "list":
             qs = qs.filter(
                 Q(board__access__id=self.request.user.id) | Q(board__public=True)
@@ -199,6 +472,7 @@ class TaskViewSet(BaseApiViewSet):
     serializer_action_classes = {
         "list": TaskSerializer,
     }
+    query_budgets = {"list": 5, "retrieve": 4}
     filterset_class = TaskFilters
 
     def get_queryset(self):
@@ -210,7 +484,7 @@ class TaskViewSet(BaseApiViewSet):
         if self.action == "list":
             qs = qs.filter(
                 Q(board__access__id=self.request.user.id) | Q(board__public=True)
-            )
+            ).prefetch_related("tags")
         elif self.action == "retrieve":
             qs = qs.prefetch_related(
                 "tags",
@@ -218,25 +492,163 @@ class TaskViewSet(BaseApiViewSet):
         return qs
 
 
-class HomeViewSet(GenericViewSet):
-    serializer_class = HomeDetailSerializer
+class TaskAttachmentViewSet(
+    QueryBudgetMixin,
+    NonAtomicReadsMixin,
+    DestroyModelMixin,
+    ListModelMixin,
+    RetrieveModelMixin,
+    GenericViewSet,
+):
+    """
+    Files attached to a task, added with `AttachmentUploadViewSet`.
+    """
+
+    queryset = TaskAttachment.objects.select_related("task__board")
+    serializer_class = TaskAttachmentSerializer
+    permission_classes = (BoardAccessPermission,)
+    non_atomic_actions = ("list", "retrieve", "download")
+    query_budgets = {"list": 2, "retrieve": 2, "download": 2}
 
-    @action(detail=False, methods=["get"])
-    def summary(self, request, *args, **kwargs):
-        tasks = (
-            Task.objects.filter(board__access__id=self.request.user.id)
-            .filter(stage__name__in=["To Do", "In Progress", "Done"])
-            .order_by("stage")
-            .values("stage__name")
-            .annotate(count=Count("stage__name"))
+    def get_queryset(self):
+        # the attachments of deleted tasks go with them
+        qs = (
+            super()
+            .get_queryset()
+            .filter(task=self.kwargs["task_pk"], task__deleted=False)
+        )
+        if self.action == "list":
+            qs = qs.filter(
+                Q(task__board__public=True)
+                | Q(
+                    task__board__in=BoardAccess.objects.filter(
+                        user_id=self.request.user.id
+                    ).values("board_id")
+                )
+            )
+        return qs
+
+    def perform_content_negotiation(self, request, force=False):
+        # downloads respond with the file, whatever the client accepts
+        return super().perform_content_negotiation(
+            request, force=force or self.action == "download"
+        )
+
+    @extend_schema(responses={(200, "application/octet-stream"): OpenApiTypes.BINARY})
+    @action(detail=True, methods=["get"])
+    def download(self, request, *args, **kwargs):
+        # the board access check happens here once, then the front-end server
+        # sends the file when ATTACHMENT_SENDFILE_HEADER is set
+        return serve_attachment(request, self.get_object())
+
+
+class AttachmentUploadViewSet(
+    QueryBudgetMixin,
+    NonAtomicReadsMixin,
+    CreateModelMixin,
+    RetrieveModelMixin,
+    DestroyModelMixin,
+    GenericViewSet,
+):
+    """
+    Resumable uploads of task attachments.
+
+    `POST` the name, size and content type of a file to start an upload,
+    then `PATCH` its bytes in one or more chunks, each with its position in
+    the file in an `Upload-Offset` header. After an interruption, `GET` the
+    upload for the offset to resume from. The chunk completing the upload
+    responds with the attachment, `DELETE` aborts an upload.
+    """
+
+    queryset = AttachmentUpload.objects.select_related("task__board")
+    serializer_class = AttachmentUploadSerializer
+    permission_classes = (BoardAccessPermission,)
+    # chunks are streamed to disk outside of a transaction
+    non_atomic_actions = ("retrieve", "partial_update")
+    query_budgets = {"retrieve": 2}
+
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .filter(
+                task=self.kwargs["task_pk"],
+                task__deleted=False,
+                uploaded_by=self.request.user.id,
+            )
+        )
+
+    def perform_create(self, serializer):
+        task = generics.get_object_or_404(
+            Task.objects.select_related("board"), pk=self.kwargs["task_pk"]
         )
-        done = list(filter(lambda x: x["stage__name"] == "Done", tasks))
-        in_progress = list(filter(lambda x: x["stage__name"] == "In Progress", tasks))
-        to_do = list(filter(lambda x: x["stage__name"] == "To Do", tasks))
+        self.check_object_permissions(self.request, task)
+        start_upload(serializer.save(task=task, uploaded_by=self.request.user))
+
+    def perform_destroy(self, instance):
+        abort_upload(instance)
+
+    @extend_schema(
+        request={"application/offset+octet-stream": OpenApiTypes.BINARY},
+        parameters=[
+            OpenApiParameter(
+                "Upload-Offset",
+                int,
+                OpenApiParameter.HEADER,
+                required=True,
+                description="Position of the chunk in the file.",
+            )
+        ],
+        responses={200: AttachmentUploadSerializer, 201: TaskAttachmentSerializer},
+    )
+    def partial_update(self, request, *args, **kwargs):
+        upload = self.get_object()
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            # Django only reads bodies of a known length
+            length = int(request.headers.get("Content-Length") or 0)
+        except (KeyError, ValueError):
+            raise ParseError("Invalid or missing Upload-Offset header")
+        if offset < 0 or length < 0:
+            raise ParseError("Invalid Upload-Offset or Content-Length")
+
+        attachment = receive_chunk(upload, offset, request.stream, length)
+        if attachment is None:
+            return Response(self.get_serializer(upload).data)
         return Response(
-            {
-                "done": done[0]["count"] if done else 0,
-                "in_progress": in_progress[0]["count"] if in_progress else 0,
-                "to_do": to_do[0]["count"] if to_do else 0,
-            }
+            TaskAttachmentSerializer(attachment).data, status=status.HTTP_201_CREATED
         )
+
+
+class ActivityViewSet(
+    QueryBudgetMixin, NonAtomicReadsMixin, ListModelMixin, GenericViewSet
+):
+    """
+    The activity log of a board, newest first, see taskman.activity.
+    """
+
+    queryset = ActivityEvent.objects.all()
+    serializer_class = ActivityEventSerializer
+    permission_classes = (BoardAccessPermission,)
+    pagination_class = CustomCursorPagination
+    # the pagination orders by the feed index
+    filter_backends = ()
+    query_budgets = {"list": 3}
+
+    def get_queryset(self):
+        return super().get_queryset().filter(board=self.kwargs["board_pk"])
+
+    def list(self, request, *args, **kwargs):
+        board = generics.get_object_or_404(Board, pk=self.kwargs["board_pk"])
+        self.check_object_permissions(request, board)
+        return super().list(request, *args, **kwargs)
+
+
+class HomeViewSet(QueryBudgetMixin, NonAtomicReadsMixin, GenericViewSet):
+    serializer_class = HomeDetailSerializer
+    non_atomic_actions = ("summary",)
+    query_budgets = {"summary": 1}
+
+    @action(detail=False, methods=["get"])
+    def summary(self, request, *args, **kwargs):
+        return Response(get_home_summary(self.request.user.id))
@@ -0,0 +1,13 @@
+from django.urls import path
+
+from .async_views import board_list, board_retrieve, home_summary, task_list
+
+app_name = "api-async"
+
+# served in place of the matching sync routes by the ASGI app, see core/asgi.py
+urlpatterns = [
+    path("boards", board_list, name="board-list"),
+    path("boards/<int:pk>", board_retrieve, name="board-detail"),
+    path("tasks", task_list, name="task-list"),
+    path("home/summary", home_summary, name="home-summary"),
+]
@@ -0,0 +1,134 @@
+"""
+Async versions of the hottest read-only endpoints, served by the ASGI app.
+
+Each view mirrors the queryset, filter backends and serializer of its
+viewset action, but independent queries (page and count, board and access
+level) are awaited together so they run concurrently instead of back to
+back. Writes and requests for the browsable API go to the viewset.
+"""
+import asyncio
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, PermissionDenied
+
+from utils.pagination import CustomLimitOffsetPagination
+from utils.views.asynchronous import async_api_view, concurrent_query
+
+from .api_views import BoardViewSet, HomeViewSet, TaskViewSet, get_home_summary
+from .models import AccessLevel, Board, BoardAccess, Task
+from .serializers import (
+    BoardSerializer,
+    FullBoardSerializer,
+    NormalizedBoardSerializer,
+    TaskSerializer,
+)
+from .stage_tasks import is_normalized, prefetch_board_tasks
+
+
+@concurrent_query
+def get_access_levels(user_id):
+    return dict(
+        BoardAccess.objects.filter(user_id=user_id).values_list("board_id", "level")
+    )
+
+
+@concurrent_query
+def get_access_level(board_id, user_id):
+    return (
+        BoardAccess.objects.filter(board_id=board_id, user_id=user_id)
+        .values_list("level", flat=True)
+        .first()
+    )
+
+
+@concurrent_query
+def filter_list(viewset_class, request, queryset):
+    """
+    Apply the filter backends of the list action of `viewset_class`, which
+    may query, e.g. to validate a stage filter.
+    """
+    view = viewset_class(
+        request=request, args=(), kwargs={}, format_kwarg=None, action="list"
+    )
+    return view.filter_queryset(queryset)
+
+
+@concurrent_query
+def get_count(queryset):
+    return queryset.count()
+
+
+@concurrent_query
+def get_list(queryset):
+    return list(queryset)
+
+
+async def paginate(request, queryset, serializer_class, **context):
+    """
+    Run the page and count queries concurrently and return the same body as
+    `CustomLimitOffsetPagination.get_paginated_response`.
+    """
+    paginator = CustomLimitOffsetPagination()
+    paginator.limit = paginator.get_limit(request)
+    paginator.offset = paginator.get_offset(request)
+    paginator.request = request
+    page = queryset[paginator.offset : paginator.offset + paginator.limit]
+    paginator.count, results = await asyncio.gather(get_count(queryset), get_list(page))
+    context["request"] = request
+    data = serializer_class(results, many=True, context=context).data
+    return paginator.get_paginated_response(data).data
+
+
+@async_api_view(BoardViewSet.as_view({"get": "list", "post": "create"}))
+async def board_list(request):
+    queryset = Board.objects.filter(Q(access__id=request.user.id) | Q(public=True))
+    queryset = await filter_list(BoardViewSet, request, queryset)
+    # the user's levels are read alongside the page, not once per board
+    page, access_levels = await asyncio.gather(
+        paginate(request, queryset, BoardSerializer, access_levels={}),
+        get_access_levels(request.user.id),
+    )
+    for board in page["results"]:
+        board["access_level"] = access_levels.get(board["id"], AccessLevel.NONE)
+    return page
+
+
+@async_api_view(
+    BoardViewSet.as_view(
+        {"get": "retrieve", "patch": "partial_update", "delete": "destroy"}
+    )
+)
+async def board_retrieve(request, pk):
+    normalized = is_normalized(request)
+    queryset = Board.objects.filter(pk=pk).prefetch_related("stages")
+    if normalized:
+        queryset = queryset.prefetch_related("tags")
+    boards, access = await asyncio.gather(
+        get_list(queryset), get_access_level(pk, request.user.id)
+    )
+    if not boards:
+        raise NotFound
+    board = boards[0]
+    if not board.public and (access is None or access > AccessLevel.READ_ONLY):
+        raise PermissionDenied
+    await concurrent_query(prefetch_board_tasks)(board, request)
+    context = {
+        "request": request,
+        "access_levels": {board.id: AccessLevel.NONE if access is None else access},
+    }
+    serializer_class = NormalizedBoardSerializer if normalized else FullBoardSerializer
+    return serializer_class(board, context=context).data
+
+
+@async_api_view(TaskViewSet.as_view({"get": "list", "post": "create"}))
+async def task_list(request):
+    queryset = Task.objects.filter(
+        Q(board__access__id=request.user.id) | Q(board__public=True)
+    ).prefetch_related("tags")
+    queryset = await filter_list(TaskViewSet, request, queryset)
+    return await paginate(request, queryset, TaskSerializer)
+
+
+@async_api_view(HomeViewSet.as_view({"get": "summary"}))
+async def home_summary(request):
+    return await concurrent_query(get_home_summary)(request.user.id)
@@ -0,0 +1,251 @@
+"""
+Storage of task attachments.
+
+Uploads are received in chunks into a part file under
+`ATTACHMENT_ROOT/uploads`, so a dropped connection only loses the chunk in
+flight and the client resumes from the last offset. Complete files are
+moved to `ATTACHMENT_ROOT/<sha256>`, sharded by hash prefix: identical
+files are stored once, however many attachments point to them.
+
+Downloads are checked against the board access of the attachment, then
+either handed off to the front-end server with `ATTACHMENT_SENDFILE_HEADER`
+or streamed from here, honoring single `Range` requests. With nginx:
+
+    location /internal/attachments/ {
+        internal;
+        alias /path/to/ATTACHMENT_ROOT/;
+    }
+"""
+import fcntl
+import hashlib
+import os
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import transaction
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+
+from .models import AttachmentUpload, TaskAttachment
+
+BLOCK_SIZE = 64 * 1024
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+UPLOAD_GONE = "The upload was completed or aborted."
+
+
+class UploadConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Upload-Offset does not match the upload."
+    default_code = "upload_conflict"
+
+
+def get_blob_path(sha256) -> Path:
+    return Path(settings.ATTACHMENT_ROOT) / sha256[:2] / sha256[2:4] / sha256
+
+
+def get_part_path(upload) -> Path:
+    return Path(settings.ATTACHMENT_ROOT) / "uploads" / f"{upload.external_id}.part"
+
+
+def start_upload(upload):
+    path = get_part_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+
+
+def abort_upload(upload):
+    get_part_path(upload).unlink(missing_ok=True)
+    AttachmentUpload.objects.filter(pk=upload.pk).delete()
+
+
+def receive_chunk(upload, offset, stream, length):
+    """
+    Append `length` bytes read from `stream` to the upload at `offset`.
+
+    The body is copied a block at a time, never held in memory. If the
+    client goes away mid-chunk, the bytes received so far are kept and the
+    upload resumes from there. Returns the attachment once the last byte is
+    in, None before. Chunks racing the one completing the upload, or its
+    abort, raise NotFound.
+    """
+    if offset + length > upload.size:
+        raise ValidationError("The chunk goes past the size of the upload.")
+
+    try:
+        part = open(get_part_path(upload), "r+b")
+    except FileNotFoundError:
+        raise NotFound(UPLOAD_GONE)
+    with part:
+        try:
+            # one writer per upload, across threads and processes of a host
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadConflict("Another chunk of this upload is being received.")
+        try:
+            upload.refresh_from_db(fields=["offset"])
+        except AttachmentUpload.DoesNotExist:
+            raise NotFound(UPLOAD_GONE)
+        if offset != upload.offset:
+            raise UploadConflict(
+                f"Upload-Offset is {offset}, the upload is at {upload.offset}."
+            )
+
+        part.seek(offset)
+        remaining = length
+        try:
+            while remaining and (block := stream.read(min(BLOCK_SIZE, remaining))):
+                part.write(block)
+                remaining -= len(block)
+        except OSError:
+            # the client disconnected, keep what was received
+            pass
+        # bytes past the offset left over by an interrupted chunk
+        part.truncate()
+        part.flush()
+        os.fsync(part.fileno())
+
+        upload.offset = offset + length - remaining
+        AttachmentUpload.objects.filter(pk=upload.pk).update(offset=upload.offset)
+        if upload.offset < upload.size:
+            return None
+        return complete_upload(upload)
+
+
+def complete_upload(upload):
+    """
+    Move the part file of a fully received upload to its content addressed
+    path, or drop it when that content is already stored, and replace the
+    upload with an attachment.
+    """
+    part_path = get_part_path(upload)
+    digest = hashlib.sha256()
+    with open(part_path, "rb") as part:
+        while block := part.read(BLOCK_SIZE * 16):
+            digest.update(block)
+    sha256 = digest.hexdigest()
+
+    with transaction.atomic():
+        attachment = TaskAttachment.objects.create(
+            name=upload.name,
+            content_type=upload.content_type,
+            size=upload.size,
+            sha256=sha256,
+            task_id=upload.task_id,
+            uploaded_by_id=upload.uploaded_by_id,
+        )
+        AttachmentUpload.objects.filter(pk=upload.pk).delete()
+        # last, so a failure rolls back the rows and the upload can be retried
+        blob_path = get_blob_path(sha256)
+        if blob_path.exists():
+            part_path.unlink()
+        else:
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(part_path, blob_path)
+    return attachment
+
+
+def content_disposition(name):
+    try:
+        name.encode("ascii")
+    except UnicodeEncodeError:
+        return f"attachment; filename*=utf-8''{quote(name)}"
+    escaped = name.replace("\\", "\\\\").replace('"', '\\"')
+    return f'attachment; filename="{escaped}"'
+
+
+def parse_range(header, size):
+    """
+    The `(start, end)` bytes, end included, requested by a `Range` header.
+    Returns None to send the whole file, which servers may do for ranges
+    they don't support, like multiple ranges, and raises ValueError when the
+    range can't be satisfied.
+    """
+    if not (match := RANGE_HEADER.match(header.strip())):
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # the last `end` bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end) if end else size - 1, size - 1)
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(path, start, end):
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining and (block := file.read(min(BLOCK_SIZE, remaining))):
+            remaining -= len(block)
+            yield block
+
+
+def serve_attachment(request, attachment):
+    """
+    Respond with the file of an attachment the user has been allowed to
+    read.
+    """
+    etag = f'"{attachment.sha256}"'
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    path = get_blob_path(attachment.sha256)
+    if header := settings.ATTACHMENT_SENDFILE_HEADER:
+        # the front-end server sends the file and answers range requests
+        response = HttpResponse(content_type=attachment.content_type)
+        if header.lower() == "x-accel-redirect":
+            relative = path.relative_to(settings.ATTACHMENT_ROOT).as_posix()
+            response[header] = settings.ATTACHMENT_ACCEL_PREFIX + relative
+        else:
+            response[header] = str(path)
+    else:
+        byte_range = None
+        range_header = request.headers.get("Range")
+        # a range of another version of the file is answered with all of it
+        if range_header and request.headers.get("If-Range", etag) == etag:
+            try:
+                byte_range = parse_range(range_header, attachment.size)
+            except ValueError:
+                response = HttpResponse(
+                    status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+                )
+                response["Content-Range"] = f"bytes */{attachment.size}"
+                return response
+
+        if byte_range is None:
+            response = FileResponse(
+                open(path, "rb"), content_type=attachment.content_type
+            )
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                read_range(path, start, end),
+                status=status.HTTP_206_PARTIAL_CONTENT,
+                content_type=attachment.content_type,
+            )
+            response["Content-Length"] = end - start + 1
+            response["Content-Range"] = f"bytes {start}-{end}/{attachment.size}"
+        response["Accept-Ranges"] = "bytes"
+
+    response["Content-Disposition"] = content_disposition(attachment.name)
+    response["ETag"] = etag
+    # the content behind an attachment never changes
+    response["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
@@ -0,0 +1,73 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .events import board_group_name, members_group_name
+from .models import AccessLevel, Board
+
+
+class BoardConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Stream committed stage, task, tag and access changes of a board.
+
+    Signed in users reading the board can subscribe, access changes only
+    reach its members. Access is checked when the socket connects and again
+    when the board is made private or deleted, or the user's access to it
+    changes, see `taskman.events.publish_access_change`. Otherwise the
+    consumer only relays channel layer messages and never touches the
+    database, so an idle board costs a connection and a group subscription.
+    """
+
+    @database_sync_to_async
+    def get_access(self):
+        """
+        Whether the user can read the board, and whether they are a member.
+        """
+        if not self.user.is_authenticated:
+            return False, False
+        try:
+            board = Board.objects.get(id=self.board_id)
+        except Board.DoesNotExist:
+            return False, False
+        access = board.get_access_level(self.user.id)
+        member = access is not None and access <= AccessLevel.READ_ONLY
+        return member or board.public, member
+
+    async def join_groups(self):
+        """
+        Join the groups the user may read, False when they can't read the
+        board any more.
+        """
+        readable, member = await self.get_access()
+        if not readable:
+            return False
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        members_group = members_group_name(self.board_id)
+        if member:
+            await self.channel_layer.group_add(members_group, self.channel_name)
+        else:
+            await self.channel_layer.group_discard(members_group, self.channel_name)
+        return True
+
+    async def connect(self):
+        self.user = self.scope["user"]
+        self.board_id = self.scope["url_route"]["kwargs"]["board_pk"]
+        self.group_name = board_group_name(self.board_id)
+        if not await self.join_groups():
+            await self.close()
+            return
+        await self.accept()
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        await self.channel_layer.group_discard(
+            members_group_name(self.board_id), self.channel_name
+        )
+
+    async def board_event(self, message):
+        await self.send_json(message["event"])
+
+    async def board_access_changed(self, message):
+        if message["user"] not in (None, self.user.id):
+            return
+        if not await self.join_groups():
+            await self.close()
@@ -0,0 +1,69 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from .models import BoardAccess
+from .sync import serialize_row
+
+logger = logging.getLogger(__name__)
+
+
+def board_group_name(board_id):
+    return f"board-{board_id}"
+
+
+def members_group_name(board_id):
+    # the subscribers who are members of the board, access rows are theirs
+    return f"board-{board_id}-members"
+
+
+def send_to_group(group_name, message):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(group_name, message)
+    except Exception:
+        # delivery is best effort, clients catch up through the changes endpoint
+        logger.exception("Failed to send %s to %s", message["type"], group_name)
+
+
+def publish_board_event(board_id, event, members_only=False):
+    group_name = (members_group_name if members_only else board_group_name)(board_id)
+    send_to_group(group_name, {"type": "board.event", "event": event})
+
+
+def publish_row_change(instance, action, data=None):
+    """
+    Publish a row change to the board's subscribers once the current
+    transaction commits, rolled back changes are never sent.
+    """
+
+    def publish():
+        publish_board_event(
+            instance.board_id,
+            {
+                "model": instance._meta.model_name,
+                "action": action,
+                "data": serialize_row(instance) if data is None else data,
+            },
+            # access rows name the members and their emails
+            members_only=isinstance(instance, BoardAccess),
+        )
+
+    transaction.on_commit(publish)
+
+
+def publish_access_change(board_id, user_id=None):
+    """
+    Have the subscribers of a board, or only those signed in as `user_id`,
+    check their access again once the current transaction commits.
+    """
+    transaction.on_commit(
+        lambda: send_to_group(
+            board_group_name(board_id),
+            {"type": "board.access_changed", "user": user_id},
+        )
+    )
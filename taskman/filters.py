@@ -1,8 +1,10 @@
 import django_filters
+from django.db.models import Q
 
 from utils.filters import BaseFilterSet
 
 from .models import Board, Stage, Tag, Task
+from .stage_tasks import TASK_ORDERING, decode_task_cursor
 
 
 class BoardFilterSet(BaseFilterSet):
@@ -16,7 +18,18 @@ class TaskFilters(BaseFilterSet):
         field_name="stage__name", lookup_expr="icontains"
     )
     public = django_filters.BooleanFilter(field_name="board__public")
+    after = django_filters.CharFilter(
+        method="filter_after",
+        help_text="Only the tasks after this cursor, the next cursor of a stage "
+        "or the <priority>.<id> of the last task received.",
+    )
 
     class Meta:
         model = Task
-        fields = ["archived", "public", "stage", "status"]
+        fields = ["archived", "public", "stage", "status", "after"]
+
+    def filter_after(self, queryset, name, value):
+        priority, task_id = decode_task_cursor(value)
+        return queryset.filter(
+            Q(priority__gt=priority) | Q(priority=priority, id__gt=task_id)
+        ).order_by(*TASK_ORDERING)
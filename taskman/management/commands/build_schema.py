@@ -0,0 +1,25 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from utils.schema import generate_schema, get_schema_cache_key, get_schema_path
+
+
+class Command(BaseCommand):
+    help = "Pre-generate the OpenAPI schema served on /api/schema."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cache",
+            action="store_true",
+            help="Also store the schema in the cache, for processes that don't "
+            "share the filesystem of this one, like a release phase.",
+        )
+
+    def handle(self, *args, **options):
+        for format, content in generate_schema().items():
+            path = get_schema_path(format)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content)
+            if options["cache"]:
+                cache.set(get_schema_cache_key(format), content, None)
+            self.stdout.write(f"wrote {path} ({len(content)} bytes)")
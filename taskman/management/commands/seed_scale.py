@@ -0,0 +1,239 @@
+import itertools
+import random
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from taskman.models import AccessLevel, Board, BoardAccess, Stage, Tag, Task, User
+
+STAGE_NAMES = ("To Do", "In Progress", "Done")
+# share of a board's tasks in each stage
+STAGE_WEIGHTS = (0.25, 0.15, 0.6)
+MEMBER_LEVELS = (AccessLevel.ADMIN, AccessLevel.READ_WRITE, AccessLevel.READ_ONLY)
+MEMBER_LEVEL_WEIGHTS = (0.1, 0.6, 0.3)
+TAG_COLORS = ("#ef4444", "#f59e0b", "#10b981", "#3b82f6", "#8b5cf6", "#ec4899")
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def zipf_sizes(count, total, skew):
+    """
+    Split `total` into `count` sizes following Zipf's law, the first sizes
+    are the largest: a few huge boards and a long tail of small ones.
+    """
+    weights = [1 / (rank**skew) for rank in range(1, count + 1)]
+    scale = total / sum(weights)
+    return [round(weight * scale) for weight in weights]
+
+
+class Command(BaseCommand):
+    help = "Generate a large synthetic dataset for load and scale testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--boards", type=int, default=1000)
+        parser.add_argument(
+            "--tasks-per-board",
+            type=int,
+            default=100,
+            help="Average number of tasks per board.",
+        )
+        parser.add_argument("--tags", type=int, default=8, help="Tags per board.")
+        parser.add_argument(
+            "--members-per-board",
+            type=int,
+            default=5,
+            help="Average number of users with access to a board.",
+        )
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.1,
+            help="Zipf exponent of board sizes, 0 makes every board the same size.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--password", default="password", help="Password of every created user."
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["boards"] < 1:
+            raise CommandError("--users and --boards must be at least 1")
+        self.rng = random.Random(options["seed"])
+        self.chunk_size = options["chunk_size"]
+        # keep generated usernames unique across runs
+        self.run = uuid.uuid4().hex[:8]
+
+        user_ids = self.timed("users", self.create_users, options)
+        board_ids = self.timed("boards", self.create_boards, options)
+        self.timed("board access", self.create_access, board_ids, user_ids, options)
+        stage_ids = self.timed("stages", self.create_stages, board_ids)
+        tag_ids = self.timed("tags", self.create_tags, board_ids, options)
+        self.timed("tasks", self.create_tasks, board_ids, stage_ids, tag_ids, options)
+
+    def timed(self, name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.stdout.write(f"{name}: {time.perf_counter() - start:.1f}s")
+        return result
+
+    def bulk_create(self, model, objs):
+        """
+        Insert `objs` in chunks of `--chunk-size` and return their ids.
+        """
+        ids = []
+        for chunk in chunked(objs, self.chunk_size):
+            with transaction.atomic():
+                ids += [obj.pk for obj in model.objects.bulk_create(chunk)]
+        return ids
+
+    def next_priority(self, model):
+        # continue after existing rows, like `SortableMixin.save` does
+        return (model.objects.aggregate(Max("priority"))["priority__max"] or 0) + 1
+
+    def create_users(self, options):
+        password = make_password(options["password"])
+        return self.bulk_create(
+            User,
+            (
+                User(
+                    username=f"seed-{self.run}-{i}",
+                    email=f"seed-{self.run}-{i}@example.com",
+                    password=password,
+                    avatar=(
+                        "https://avatars.dicebear.com/api/identicon/"
+                        f"seed-{self.run}-{i}@example.com.svg"
+                    ),
+                )
+                for i in range(options["users"])
+            ),
+        )
+
+    def create_boards(self, options):
+        return self.bulk_create(
+            Board,
+            (
+                Board(
+                    name=f"Board {self.run}-{i}",
+                    description="lorem ipsum " * self.rng.randint(0, 20),
+                    public=self.rng.random() < 0.05,
+                    archived=self.rng.random() < 0.05,
+                )
+                for i in range(options["boards"])
+            ),
+        )
+
+    def create_access(self, board_ids, user_ids, options):
+        # a few users own most boards, big boards have the most members
+        owner_weights = [1 / rank for rank in range(1, len(user_ids) + 1)]
+        owners = self.rng.choices(user_ids, weights=owner_weights, k=len(board_ids))
+        members = zipf_sizes(
+            len(board_ids),
+            len(board_ids) * options["members_per_board"],
+            options["skew"],
+        )
+
+        def rows():
+            for board_id, owner_id, count in zip(board_ids, owners, members):
+                yield BoardAccess(
+                    board_id=board_id, user_id=owner_id, level=AccessLevel.OWNER
+                )
+                count = min(count, len(user_ids) - 1)
+                for user_id in self.rng.sample(user_ids, count + 1):
+                    if user_id == owner_id or count == 0:
+                        continue
+                    count -= 1
+                    level = self.rng.choices(MEMBER_LEVELS, MEMBER_LEVEL_WEIGHTS)[0]
+                    yield BoardAccess(board_id=board_id, user_id=user_id, level=level)
+
+        self.bulk_create(BoardAccess, rows())
+
+    def create_stages(self, board_ids):
+        priority = itertools.count(self.next_priority(Stage))
+        ids = self.bulk_create(
+            Stage,
+            (
+                Stage(name=name, board_id=board_id, priority=next(priority))
+                for board_id in board_ids
+                for name in STAGE_NAMES
+            ),
+        )
+        return [
+            ids[i : i + len(STAGE_NAMES)] for i in range(0, len(ids), len(STAGE_NAMES))
+        ]
+
+    def create_tags(self, board_ids, options):
+        count = options["tags"]
+        if not count:
+            return [[] for _ in board_ids]
+        ids = self.bulk_create(
+            Tag,
+            (
+                Tag(
+                    name=f"tag {i}",
+                    color=TAG_COLORS[i % len(TAG_COLORS)],
+                    board_id=board_id,
+                )
+                for board_id in board_ids
+                for i in range(count)
+            ),
+        )
+        return [ids[i : i + count] for i in range(0, len(ids), count)]
+
+    def create_tasks(self, board_ids, stage_ids, tag_ids, options):
+        """
+        Create the tasks of every board and their tags, a chunk at a time.
+
+        Priorities increase in creation order, and the first tags of a board
+        are used the most.
+        """
+        sizes = zipf_sizes(
+            len(board_ids),
+            len(board_ids) * options["tasks_per_board"],
+            options["skew"],
+        )
+        priority = itertools.count(self.next_priority(Task))
+        tag_weights = [1 / rank for rank in range(1, options["tags"] + 1)]
+
+        def tasks():
+            for board_id, stages, tags, size in zip(
+                board_ids, stage_ids, tag_ids, sizes
+            ):
+                for i, stage_id in enumerate(
+                    self.rng.choices(stages, STAGE_WEIGHTS, k=size)
+                ):
+                    task = Task(
+                        name=f"Task {i}",
+                        description="lorem ipsum " * self.rng.randint(0, 8),
+                        archived=stage_id == stages[-1] and self.rng.random() < 0.2,
+                        priority=next(priority),
+                        board_id=board_id,
+                        stage_id=stage_id,
+                    )
+                    yield task, tags
+
+        TaskTag = Task.tags.through
+        total = 0
+        for chunk in chunked(tasks(), self.chunk_size):
+            with transaction.atomic():
+                Task.objects.bulk_create([task for task, _ in chunk])
+                TaskTag.objects.bulk_create(
+                    TaskTag(task_id=task.pk, tag_id=tag_id)
+                    for task, tags in chunk
+                    if tags
+                    for tag_id in set(
+                        self.rng.choices(tags, tag_weights, k=self.rng.randint(0, 3))
+                    )
+                )
+            total += len(chunk)
+            self.stdout.write(f"  {total} tasks", ending="\r")
+        self.stdout.write(f"  {total} tasks")
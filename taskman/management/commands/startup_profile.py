@@ -0,0 +1,203 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter, this one has already imported Django and the
+# settings. Prints the phase and app timings as JSON on the last line.
+PROBE = """
+import json, sys, time
+
+start = time.perf_counter()
+phases, apps = {}, {}
+
+def phase(name, since):
+    now = time.perf_counter()
+    phases[name] = (now - since) * 1000
+    return now
+
+from django.apps.config import AppConfig
+
+create = AppConfig.create.__func__
+
+def timed(app_config, name):
+    method = getattr(app_config, name)
+    def wrapper(*args, **kwargs):
+        t = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timings = apps.setdefault(app_config.name, {})
+            timings[name] = (time.perf_counter() - t) * 1000
+    setattr(app_config, name, wrapper)
+
+def timed_create(cls, entry):
+    t = time.perf_counter()
+    app_config = create(cls, entry)
+    apps.setdefault(app_config.name, {})["import"] = (time.perf_counter() - t) * 1000
+    timed(app_config, "import_models")
+    timed(app_config, "ready")
+    return app_config
+
+AppConfig.create = classmethod(timed_create)
+
+target = sys.argv[1]
+t = start
+if target == "celery":
+    from core.celery_app import app
+    t = phase("settings", t)
+    app.loader.import_default_modules()
+    t = phase("apps", t)
+else:
+    from django.conf import settings
+    settings.INSTALLED_APPS
+    t = phase("settings", t)
+    if target == "asgi":
+        import core.asgi
+        t = phase("apps", t)
+    else:
+        import django
+        django.setup(set_prefix=False)
+        t = phase("apps", t)
+        from django.core.handlers.wsgi import WSGIHandler
+        WSGIHandler()
+        t = phase("handler", t)
+    # what the first request pays on top
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+    t = phase("urlconf", t)
+phases["total"] = (t - start) * 1000
+print(json.dumps({"phases": phases, "apps": apps}))
+"""
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_import_times(stderr):
+    """
+    Parse the output of `python -X importtime` into `(module, self, cumulative,
+    depth)` tuples, in microseconds.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if match := IMPORT_TIME_LINE.match(line):
+            own, cumulative, indent, module = match.groups()
+            modules.append((module, int(own), int(cumulative), len(indent) // 2))
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        "Report where the startup time of a process goes: the import time of "
+        "every module, the time to set up each app and to load the URLconf."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            choices=("wsgi", "asgi", "celery"),
+            default="wsgi",
+            help="The kind of process to start, wsgi also covers gunicorn workers.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Start the process this many times and report the fastest run.",
+        )
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument(
+            "--env",
+            action="append",
+            default=[],
+            metavar="NAME=VALUE",
+            help="Set an environment variable in the profiled process, to "
+            "compare configurations, can be repeated.",
+        )
+        parser.add_argument("--json", action="store_true", help="Output JSON.")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1")
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+        for variable in options["env"]:
+            name, sep, value = variable.partition("=")
+            if not sep:
+                raise CommandError(f"--env expects NAME=VALUE, got {variable!r}")
+            env[name] = value
+
+        runs = [self.run(options["target"], env) for _ in range(options["repeat"])]
+        fastest = min(runs, key=lambda run: run[0]["phases"]["total"])
+        report, modules = fastest
+        report["packages"] = self.by_package(modules)
+        report["modules"] = [
+            {"module": module, "self_ms": own / 1000, "cumulative_ms": total / 1000}
+            for module, own, total, _ in sorted(modules, key=lambda m: -m[2])
+        ]
+        report["runs_ms"] = [run[0]["phases"]["total"] for run in runs]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.write_report(report, options["limit"])
+
+    def run(self, target, env):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE, target],
+            cwd=settings.ROOT_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode:
+            raise CommandError(f"the profiled process failed:\n{process.stderr}")
+        report = json.loads(process.stdout.splitlines()[-1])
+        return report, parse_import_times(process.stderr)
+
+    def by_package(self, modules):
+        """
+        Total import time of each top level package, including the modules
+        it imports from other packages.
+        """
+        totals = defaultdict(int)
+        for module, own, _, _ in modules:
+            totals[module.partition(".")[0]] += own
+        return {
+            package: total / 1000
+            for package, total in sorted(totals.items(), key=lambda item: -item[1])
+        }
+
+    def write_report(self, report, limit):
+        runs = ", ".join(f"{total:.0f}" for total in report["runs_ms"])
+        self.stdout.write(f"Startup of the fastest of {len(report['runs_ms'])} runs")
+        self.stdout.write(f"(all runs: {runs}ms, importtime adds some overhead)\n")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Phases"))
+        for name, duration in report["phases"].items():
+            self.stdout.write(f"  {name:<10}{duration:>9.1f}ms")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\nApps"))
+        self.stdout.write(f"  {'app':<35}{'import':>9}{'models':>9}{'ready':>9}")
+        for name, timings in report["apps"].items():
+            self.stdout.write(
+                f"  {name:<35}{timings.get('import', 0):>9.1f}"
+                f"{timings.get('import_models', 0):>9.1f}"
+                f"{timings.get('ready', 0):>9.1f}"
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\nImport time by package"))
+        for package, duration in list(report["packages"].items())[:limit]:
+            self.stdout.write(f"  {package:<35}{duration:>9.1f}ms")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\nSlowest modules"))
+        self.stdout.write(f"  {'module':<50}{'self':>9}{'cumul.':>9}")
+        for module in report["modules"][:limit]:
+            self.stdout.write(
+                f"  {module['module']:<50}{module['self_ms']:>9.1f}"
+                f"{module['cumulative_ms']:>9.1f}"
+            )
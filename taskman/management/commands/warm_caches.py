@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from taskman.warming import warm_caches
+
+
+class Command(BaseCommand):
+    help = (
+        "Warm the board snapshots, access maps, home summaries and board lists "
+        "of the most active boards and users, like a release phase would."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--budget",
+            type=float,
+            help="Seconds to spend at most, CACHE_WARM_BUDGET by default.",
+        )
+        parser.add_argument(
+            "--boards",
+            type=int,
+            help="Boards to warm, CACHE_WARM_BOARDS by default.",
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            help="Users to warm, CACHE_WARM_USERS by default.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            counts = warm_caches(options["budget"], options["boards"], options["users"])
+        except Exception as exc:
+            # a cold cache only slows the first reads, don't fail the release
+            self.stderr.write(f"could not warm the caches: {exc}")
+            return
+        self.stdout.write(
+            "warmed {snapshots} snapshots of {boards} boards and {users} users "
+            "in {seconds}s, {failures} failures".format(**counts)
+            + ("" if counts["complete"] else ", out of time")
+        )
@@ -0,0 +1,175 @@
+# Generated by Django 4.0.4 on 2026-10-19 14:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_transitions(apps, schema_editor):
+    """
+    Enter the tasks that exist in their current stage when they were created,
+    the next rollup builds the analytics from there.
+    """
+    Task = apps.get_model("taskman", "Task")
+    StageTransition = apps.get_model("taskman", "StageTransition")
+    tasks = Task.objects.filter(deleted=False).values_list(
+        "id", "board_id", "stage_id", "created_at"
+    )
+    StageTransition.objects.bulk_create(
+        (
+            StageTransition(
+                task_id=task_id,
+                board_id=board_id,
+                to_stage_id=stage_id,
+                created_at=created_at or django.utils.timezone.now(),
+            )
+            for task_id, board_id, stage_id, created_at in tasks.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("taskman", "0005_activityevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StageTransition",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("rolled_up", models.BooleanField(default=False)),
+                (
+                    "board",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="taskman.board",
+                    ),
+                ),
+                (
+                    "from_stage",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="taskman.stage",
+                    ),
+                ),
+                (
+                    "task",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transitions",
+                        to="taskman.task",
+                    ),
+                ),
+                (
+                    "to_stage",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="taskman.stage",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StageDailyStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("entered", models.PositiveIntegerField(default=0)),
+                ("exited", models.PositiveIntegerField(default=0)),
+                (
+                    "board",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="taskman.board",
+                    ),
+                ),
+                (
+                    "stage",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="taskman.stage",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="BoardDailyStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("completed", models.PositiveIntegerField(default=0)),
+                ("lead_times", models.JSONField(default=dict)),
+                ("cycle_times", models.JSONField(default=dict)),
+                (
+                    "board",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="taskman.board",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="stagetransition",
+            index=models.Index(
+                condition=models.Q(("rolled_up", False)),
+                fields=["id"],
+                name="transition_pending",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stagedailystats",
+            index=models.Index(fields=["board", "day"], name="stage_stats_board_day"),
+        ),
+        migrations.AddConstraint(
+            model_name="stagedailystats",
+            constraint=models.UniqueConstraint(
+                fields=("stage", "day"), name="unique_stage_day"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="boarddailystats",
+            constraint=models.UniqueConstraint(
+                fields=("board", "day"), name="unique_board_day"
+            ),
+        ),
+        migrations.RunPython(backfill_transitions, migrations.RunPython.noop),
+    ]
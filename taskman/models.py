@@ -1,9 +1,13 @@
+from uuid import uuid4
+
 from adminsortable.fields import SortableForeignKey
 from adminsortable.models import SortableMixin
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 from utils.models.base import BaseModel
+from utils.models.mixins import PreserveInitialFieldValueMixin
 
 from .validators import avatar_validator
 
@@ -27,7 +31,10 @@ class User(AbstractUser):
         super().save(*args, **kwargs)
 
 
-class Board(BaseModel):
+class Board(PreserveInitialFieldValueMixin, BaseModel):
+    # diffed into the activity log, see taskman.activity
+    _preserved_fields = ("name", "description", "archived", "public", "deleted")
+
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     archived = models.BooleanField(default=False, db_index=True)
@@ -54,7 +61,9 @@ class Board(BaseModel):
         return self
 
 
-class BoardAccess(models.Model):
+class BoardAccess(PreserveInitialFieldValueMixin, models.Model):
+    _preserved_fields = ("level",)
+
     board = models.ForeignKey(Board, on_delete=models.CASCADE, db_index=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
@@ -76,7 +85,9 @@ class BoardAccess(models.Model):
         return f"user:{self.user.id} - board:{self.board.id}:{self.level}"
 
 
-class Tag(BaseModel):
+class Tag(PreserveInitialFieldValueMixin, BaseModel):
+    _preserved_fields = ("name", "description", "color", "deleted")
+
     name = models.CharField(max_length=50)
     description = models.TextField(blank=True)
     color = models.CharField(max_length=8, blank=True)
@@ -108,7 +119,9 @@ class Tag(BaseModel):
         ]
 
 
-class Stage(SortableMixin, BaseModel):
+class Stage(PreserveInitialFieldValueMixin, SortableMixin, BaseModel):
+    _preserved_fields = ("name", "description", "archived", "priority", "deleted")
+
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     archived = models.BooleanField(default=False, db_index=True)
@@ -135,7 +148,17 @@ class Stage(SortableMixin, BaseModel):
         ordering = ["priority"]
 
 
-class Task(SortableMixin, BaseModel):
+class Task(PreserveInitialFieldValueMixin, SortableMixin, BaseModel):
+    _preserved_fields = (
+        "name",
+        "description",
+        "body",
+        "archived",
+        "priority",
+        "stage_id",
+        "deleted",
+    )
+
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     body = models.TextField(blank=True)
@@ -163,3 +186,181 @@ class Task(SortableMixin, BaseModel):
 
     class Meta:
         ordering = ["priority"]
+
+
+class TaskAttachment(BaseModel):
+    name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    # files are stored once per content, under their hash, see taskman.attachments
+    sha256 = models.CharField(max_length=64, db_index=True)
+
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="attachments")
+    uploaded_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+
+    def __str__(self) -> str:
+        return f"{self.id}:{self.name}"
+
+    def get_board(self):
+        return self.task.board
+
+
+class AttachmentUpload(models.Model):
+    """
+    An attachment being uploaded in chunks, `offset` bytes of `size` have
+    been received so far.
+    """
+
+    name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # names the part file the chunks are written to
+    external_id = models.UUIDField(default=uuid4, unique=True)
+
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="+")
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    modified_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.id}:{self.name} {self.offset}/{self.size}"
+
+    def get_board(self):
+        return self.task.board
+
+
+class ActivityAction(models.TextChoices):
+    CREATED = "created"
+    UPDATED = "updated"
+    MOVED = "moved"
+    DELETED = "deleted"
+
+
+class ActivityEvent(models.Model):
+    """
+    An append-only record of a change to a board or one of its rows,
+    written in batches after the change, see taskman.activity.
+    """
+
+    model = models.CharField(max_length=32)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=16, choices=ActivityAction.choices)
+    # {field: [old, new]}
+    changes = models.JSONField(default=dict)
+    # when the change happened, not when the event was written
+    created_at = models.DateTimeField()
+
+    # no constraints, events may be written after their board or user is gone
+    board = models.ForeignKey(
+        Board,
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False,
+        db_constraint=False,
+    )
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="+",
+        db_constraint=False,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["board", "-created_at", "-id"], name="activity_board_feed"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.model}:{self.object_id} {self.action}"
+
+    def get_board(self):
+        return self.board
+
+
+class StageTransition(models.Model):
+    """
+    A task entering or leaving a stage, `from_stage` is None when it was
+    created or restored and `to_stage` when it was deleted. Folded into the
+    daily stats by taskman.analytics.
+    """
+
+    created_at = models.DateTimeField(default=timezone.now)
+    rolled_up = models.BooleanField(default=False)
+
+    board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name="+")
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="transitions")
+    from_stage = models.ForeignKey(
+        Stage, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    to_stage = models.ForeignKey(
+        Stage, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+
+    class Meta:
+        indexes = [
+            # only the transitions waiting for the next rollup are indexed
+            models.Index(
+                fields=["id"],
+                name="transition_pending",
+                condition=models.Q(rolled_up=False),
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"task:{self.task_id} {self.from_stage_id} -> {self.to_stage_id}"
+
+
+class StageDailyStats(models.Model):
+    """
+    The tasks that entered and left a stage on a day.
+    """
+
+    day = models.DateField()
+    entered = models.PositiveIntegerField(default=0)
+    exited = models.PositiveIntegerField(default=0)
+
+    board = models.ForeignKey(
+        Board, on_delete=models.CASCADE, related_name="+", db_index=False
+    )
+    stage = models.ForeignKey(Stage, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["stage", "day"], name="unique_stage_day")
+        ]
+        indexes = [models.Index(fields=["board", "day"], name="stage_stats_board_day")]
+
+    def __str__(self) -> str:
+        return f"stage:{self.stage_id} {self.day} +{self.entered} -{self.exited}"
+
+
+class BoardDailyStats(models.Model):
+    """
+    The tasks of a board completed on a day and histograms of their lead
+    and cycle times, see taskman.analytics.get_bucket.
+    """
+
+    day = models.DateField()
+    completed = models.PositiveIntegerField(default=0)
+    # {bucket: count}
+    lead_times = models.JSONField(default=dict)
+    cycle_times = models.JSONField(default=dict)
+
+    board = models.ForeignKey(
+        Board, on_delete=models.CASCADE, related_name="+", db_index=False
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["board", "day"], name="unique_board_day")
+        ]
+
+    def __str__(self) -> str:
+        return f"board:{self.board_id} {self.day} {self.completed}"
@@ -0,0 +1,165 @@
+"""
+Scopes of the cached responses, see utils.views.mixins.CachedResponseMixin,
+and their invalidation.
+
+Four kinds of versions, see utils.cache.versions, are bumped once the
+writes they follow commit:
+
+- the access map of a user, their levels by board, when their access to a
+  board is granted, changed or revoked,
+- a board, on writes to the board or its stages, tasks, tags and access,
+- the public boards, when a board is made public or private, or a public
+  board is created or deleted,
+- the public content, on all of these and writes to the stages, tasks and
+  tags of public boards.
+
+Lists over every board a user can read are scoped by the user's access map,
+the versions of the boards they are a member of and the public content,
+one version however many boards are public. Lists nested in a
+board are scoped by the version of the board and whether the user is a
+member of it: members share their responses, and so do non-members, which
+is everyone reading a public board without access. Board retrieves, the
+board snapshots, are scoped by the version of the board and the level of
+the user, which they return. Home summaries are cached under the scope of
+the user.
+
+The same writes purge the responses of public boards cached by the CDN,
+see PublicBoardViewSet and utils.cdn.
+
+Saves through `bulk_create`, `bulk_update` and `QuerySet.update` send no
+signals and bump nothing, their lists are stale until they expire.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+
+from utils import cdn
+from utils.cache.versions import bump_versions, get_versions
+
+from .models import AccessLevel, Board, BoardAccess
+
+PUBLIC_BOARDS = "public-boards"
+PUBLIC_CONTENT = "public-content"
+# values cached under a version never go stale, they only expire to free
+# the cache
+VERSIONED_TTL = 24 * 60 * 60
+
+
+def get_access_map(user_id):
+    """
+    The access-map version of a user and their levels by board id.
+    """
+    name = f"access-map:{user_id}"
+    [version] = get_versions([name])
+    key = f"{name}:{version}"
+    if (access_map := cache.get(key)) is None:
+        access_map = dict(
+            BoardAccess.objects.filter(user_id=user_id).values_list("board_id", "level")
+        )
+        cache.set(key, access_map, VERSIONED_TTL)
+    return version, access_map
+
+
+def get_public_boards():
+    """
+    The version of the public boards and their ids.
+    """
+    [version] = get_versions([PUBLIC_BOARDS])
+    key = f"{PUBLIC_BOARDS}:{version}"
+    if (board_ids := cache.get(key)) is None:
+        board_ids = set(Board.objects.filter(public=True).values_list("id", flat=True))
+        cache.set(key, board_ids, VERSIONED_TTL)
+    return version, board_ids
+
+
+def get_user_scope(user_id):
+    """
+    The scope of lists over the boards a user can read.
+    """
+    access_version, access_map = get_access_map(user_id)
+    board_ids = sorted(access_map)
+    public_version, *board_versions = get_versions(
+        [PUBLIC_CONTENT] + [f"board:{board_id}" for board_id in board_ids]
+    )
+    versions = ",".join(
+        f"{board_id}.{version}" for board_id, version in zip(board_ids, board_versions)
+    )
+    return f"user:{user_id}:{access_version}:{public_version}:{versions}"
+
+
+def get_board_scope(user_id, board_id):
+    """
+    The scope of lists nested in a board.
+    """
+    _, access_map = get_access_map(user_id)
+    if board_id in access_map:
+        membership = "member"
+    else:
+        _, public_ids = get_public_boards()
+        membership = "public" if board_id in public_ids else "none"
+    [version] = get_versions([f"board:{board_id}"])
+    return f"board:{board_id}:{version}:{membership}"
+
+
+def get_snapshot_scope(user_id, board_id):
+    """
+    The scope of retrieves of a board, None when the user can't read it.
+    """
+    _, access_map = get_access_map(user_id)
+    if (level := access_map.get(board_id)) is None:
+        _, public_ids = get_public_boards()
+        if board_id not in public_ids:
+            # let the view deny it
+            return None
+        level = AccessLevel.NONE
+    [version] = get_versions([f"board:{board_id}"])
+    return f"board:{board_id}:{version}:{level}"
+
+
+def get_summary_key(user_id):
+    scope = get_user_scope(user_id)
+    return f"home-summary:{hashlib.sha256(scope.encode()).hexdigest()}"
+
+
+def get_list_scope(view):
+    try:
+        board_id = int(view.kwargs["board_pk"])
+    except KeyError:
+        return get_user_scope(view.request.user.id)
+    except ValueError:
+        return None
+    return get_board_scope(view.request.user.id, board_id)
+
+
+def get_surrogate_key(board_id):
+    return f"board-{board_id}"
+
+
+def record_write(instance):
+    """
+    Bump the versions a saved or deleted row invalidates and purge its board
+    from the CDN if public, once the current transaction commits.
+    """
+    if isinstance(instance, Board):
+        board_id = instance.id
+        names = [f"board:{board_id}"]
+        public = instance.public or "public" in instance.get_changed_fields()
+        if public:
+            names.append(PUBLIC_BOARDS)
+    else:
+        board_id = instance.board_id
+        names = [f"board:{board_id}"]
+        public = None
+        if isinstance(instance, BoardAccess):
+            names.append(f"access-map:{instance.user_id}")
+            # public boards don't show their access
+            public = False
+
+    def invalidate():
+        bump_versions(names)
+        if public or (public is None and board_id in get_public_boards()[1]):
+            bump_versions([PUBLIC_CONTENT])
+            cdn.purge([get_surrogate_key(board_id)])
+
+    transaction.on_commit(invalidate)
@@ -1,16 +1,34 @@
-from asyncore import read
+import os
+from datetime import timedelta
 
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from rest_framework.authtoken.serializers import AuthTokenSerializer
 
-from .models import AccessLevel, Board, BoardAccess, Stage, Tag, Task, User
+from utils.serializers.compiled import CompiledSerializerMixin
+
+from .models import (
+    AccessLevel,
+    ActivityEvent,
+    AttachmentUpload,
+    Board,
+    BoardAccess,
+    Stage,
+    Tag,
+    Task,
+    TaskAttachment,
+    User,
+)
 
 
 class AuthSerializer(AuthTokenSerializer):
     token = None
 
 
-class UserDetailSerializer(serializers.ModelSerializer):
+class UserDetailSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = (
@@ -50,7 +68,7 @@ class UserSerializer(UserDetailSerializer):
         )
 
 
-class TagDetailSerializer(serializers.ModelSerializer):
+class TagDetailSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = (
@@ -73,7 +91,7 @@ class TagSerializer(TagDetailSerializer):
         )
 
 
-class TaskDetailSerializer(serializers.ModelSerializer):
+class TaskDetailSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
 
     tags = TagSerializer(many=True, read_only=True)
 
@@ -106,7 +124,7 @@ class TaskSerializer(TaskDetailSerializer):
         )
 
 
-class StageDetailSerializer(serializers.ModelSerializer):
+class StageDetailSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Stage
         fields = (
@@ -135,7 +153,7 @@ class StageSerializer(StageDetailSerializer):
         )
 
 
-class BoardDetailAccessSerializer(serializers.ModelSerializer):
+class BoardDetailAccessSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer()
 
     class Meta:
@@ -150,11 +168,14 @@ class BoardDetailAccessSerializer(serializers.ModelSerializer):
         )
 
 
-class BoardDetailSerializer(serializers.ModelSerializer):
+class BoardDetailSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
 
     access_level = serializers.SerializerMethodField()
 
     def get_access_level(self, obj) -> int:
+        # views serializing many boards can pass the user's levels up front
+        if (access_levels := self.context.get("access_levels")) is not None:
+            return access_levels.get(obj.id, AccessLevel.NONE)
         try:
             return BoardAccess.objects.get(
                 user=self.context["request"].user, board=obj
@@ -162,6 +183,7 @@ class BoardDetailSerializer(serializers.ModelSerializer):
         except BoardAccess.DoesNotExist:
             return AccessLevel.NONE
 
+    @transaction.atomic
     def create(self, validated_data):
         board = super().create(validated_data)
         # create owner level access for the user
@@ -193,12 +215,37 @@ class BoardDetailSerializer(serializers.ModelSerializer):
         )
 
 
+class BoardStageSerializer(StageSerializer):
+    """
+    A stage with its first tasks, loaded by taskman.stage_tasks.
+    """
+
+    tasks = TaskSerializer(source="first_tasks", many=True, read_only=True)
+    next = serializers.CharField(
+        source="next_tasks",
+        read_only=True,
+        allow_null=True,
+        help_text="Cursor of the following tasks, null when there are none.",
+    )
+
+    class Meta:
+        model = Stage
+        fields = (
+            "id",
+            "name",
+            "priority",
+            "tasks",
+            "next",
+        )
+
+
 class FullBoardSerializer(BoardDetailSerializer):
     stages = serializers.SerializerMethodField()
 
     # TODO: fix schema
     def get_stages(self, board):
-        return {stage.id: StageSerializer(stage).data for stage in board.stages.all()}
+        stages = BoardStageSerializer(board.stages.all(), many=True).data
+        return {stage["id"]: stage for stage in stages}
 
     class Meta:
         model = Board
@@ -214,6 +261,98 @@ class FullBoardSerializer(BoardDetailSerializer):
         )
 
 
+class NormalizedTaskSerializer(TaskSerializer):
+    tags = serializers.ListField(
+        source="tag_ids", child=serializers.IntegerField(), read_only=True
+    )
+
+
+class NormalizedStageSerializer(BoardStageSerializer):
+    tasks = serializers.SerializerMethodField()
+
+    def get_tasks(self, stage) -> list[int]:
+        return [task.id for task in stage.first_tasks]
+
+
+class NormalizedBoardSerializer(BoardDetailSerializer):
+    """
+    A board with its stages, tasks and tags as maps by id, see
+    taskman.stage_tasks.
+    """
+
+    stages = serializers.SerializerMethodField()
+    tasks = serializers.SerializerMethodField()
+    tags = serializers.SerializerMethodField()
+
+    # one serializer per map, instantiating one per row costs more than the row
+    @extend_schema_field(serializers.DictField(child=NormalizedStageSerializer()))
+    def get_stages(self, board):
+        stages = NormalizedStageSerializer(board.stages.all(), many=True).data
+        return {stage["id"]: stage for stage in stages}
+
+    @extend_schema_field(serializers.DictField(child=NormalizedTaskSerializer()))
+    def get_tasks(self, board):
+        tasks = NormalizedTaskSerializer(
+            [task for stage in board.stages.all() for task in stage.first_tasks],
+            many=True,
+        ).data
+        return {task["id"]: task for task in tasks}
+
+    @extend_schema_field(serializers.DictField(child=TagSerializer()))
+    def get_tags(self, board):
+        tags = TagSerializer(board.tags.all(), many=True).data
+        return {tag["id"]: tag for tag in tags}
+
+    class Meta:
+        model = Board
+        fields = (
+            "id",
+            "name",
+            "description",
+            "archived",
+            "modified_at",
+            "created_at",
+            "access_level",
+            "stages",
+            "tasks",
+            "tags",
+        )
+
+
+class PublicBoardSerializer(FullBoardSerializer):
+    """
+    A public board as anyone reads it, without the reader's access level.
+    """
+
+    class Meta:
+        model = Board
+        fields = (
+            "id",
+            "name",
+            "description",
+            "archived",
+            "modified_at",
+            "created_at",
+            "stages",
+        )
+
+
+class NormalizedPublicBoardSerializer(NormalizedBoardSerializer):
+    class Meta:
+        model = Board
+        fields = (
+            "id",
+            "name",
+            "description",
+            "archived",
+            "modified_at",
+            "created_at",
+            "stages",
+            "tasks",
+            "tags",
+        )
+
+
 class BoardSerializer(BoardDetailSerializer):
     class Meta:
         model = Board
@@ -228,6 +367,94 @@ class BoardSerializer(BoardDetailSerializer):
         )
 
 
+class TaskAttachmentSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = TaskAttachment
+        fields = (
+            "id",
+            "name",
+            "content_type",
+            "size",
+            "sha256",
+            "task",
+            "uploaded_by",
+            "created_at",
+        )
+
+
+class AttachmentUploadSerializer(serializers.ModelSerializer):
+    content_type = serializers.CharField(
+        max_length=255, default="application/octet-stream"
+    )
+
+    def validate_name(self, name):
+        # keep the file name only, it ends up in Content-Disposition headers
+        name = os.path.basename(name.replace("\\", "/"))
+        if not name or not name.isprintable():
+            raise serializers.ValidationError("Invalid file name.")
+        return name
+
+    def validate_content_type(self, content_type):
+        if not content_type.isprintable() or "/" not in content_type:
+            raise serializers.ValidationError("Invalid content type.")
+        return content_type
+
+    def validate_size(self, size):
+        if size > settings.ATTACHMENT_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Attachments are limited to {settings.ATTACHMENT_MAX_SIZE} bytes."
+            )
+        return size
+
+    class Meta:
+        model = AttachmentUpload
+        fields = (
+            "id",
+            "name",
+            "content_type",
+            "size",
+            "offset",
+            "task",
+            "created_at",
+        )
+        read_only_fields = ("offset", "task")
+
+
+class ActivityEventSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ActivityEvent
+        fields = (
+            "id",
+            "model",
+            "object_id",
+            "action",
+            "changes",
+            "actor",
+            "created_at",
+        )
+
+
+class BoardAnalyticsQuerySerializer(serializers.Serializer):
+    since = serializers.DateField(
+        required=False, help_text="First day, defaults to 30 days before until."
+    )
+    until = serializers.DateField(
+        required=False, help_text="Last day, defaults to today."
+    )
+
+    def validate(self, data):
+        data.setdefault("until", timezone.localdate())
+        data.setdefault("since", data["until"] - timedelta(days=29))
+        days = (data["until"] - data["since"]).days + 1
+        if days < 1:
+            raise serializers.ValidationError("since must not be after until.")
+        if days > settings.ANALYTICS_MAX_DAYS:
+            raise serializers.ValidationError(
+                f"At most {settings.ANALYTICS_MAX_DAYS} days can be requested."
+            )
+        return data
+
+
 class HomeDetailSerializer(serializers.Serializer):
     done = serializers.IntegerField()
     in_progress = serializers.IntegerField()
@@ -0,0 +1,121 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import activity, analytics, response_cache, sync
+from .events import publish_access_change, publish_row_change
+from .models import ActivityAction, Board, BoardAccess, Stage, Tag, Task
+
+
+@receiver(post_save, sender=Stage)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=BoardAccess)
+def publish_saved_row(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if getattr(instance, "deleted", False):
+        action = "deleted"
+    else:
+        action = "created" if created else "updated"
+    publish_row_change(instance, action)
+
+
+@receiver(post_delete, sender=BoardAccess)
+def publish_deleted_access(sender, instance, **kwargs):
+    # access rows are hard deleted, send a tombstone naming the revoked user
+    publish_row_change(
+        instance,
+        "deleted",
+        {"id": instance.id, "deleted": True, "user": instance.user_id},
+    )
+    publish_access_change(instance.board_id, instance.user_id)
+
+
+# connected before log_saved_row, which makes the saved values the initial ones
+@receiver(post_save, sender=Board)
+@receiver(post_save, sender=BoardAccess)
+def publish_access_changes(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    changed = instance.get_changed_fields()
+    if isinstance(instance, Board):
+        if not created and ("public" in changed or "deleted" in changed):
+            publish_access_change(instance.id)
+    elif created or "level" in changed:
+        publish_access_change(instance.board_id, instance.user_id)
+
+
+# connected before log_saved_row, which makes the saved values the initial ones
+@receiver(post_save, sender=Task)
+def record_stage_transition(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        analytics.record_transition(instance, created)
+
+
+# connected before log_saved_row too, boards bump the public ones when their
+# public flag changes
+@receiver(post_save, sender=Board)
+@receiver(post_save, sender=Stage)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=BoardAccess)
+@receiver(post_delete, sender=Board)
+@receiver(post_delete, sender=Stage)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=BoardAccess)
+def invalidate_cached_lists(sender, instance, raw=False, **kwargs):
+    if not raw:
+        response_cache.record_write(instance)
+
+
+@receiver(m2m_changed, sender=Task.tags.through)
+def invalidate_cached_task_lists(sender, instance, action, **kwargs):
+    # the task or, when set from the tag side, the tag, both on the board
+    if action in ("post_add", "post_remove", "post_clear"):
+        response_cache.record_write(instance)
+
+
+@receiver(m2m_changed, sender=Task.tags.through)
+def touch_tagged_tasks(sender, instance, action, reverse, pk_set, **kwargs):
+    # the task or, when set from the tag side, the tasks of the tag
+    if action == "pre_clear" and reverse:
+        instance._cleared_task_ids = list(
+            sender.objects.filter(tag=instance).values_list("task_id", flat=True)
+        )
+    elif action == "post_clear":
+        if reverse:
+            sync.touch_tagged_tasks(instance.__dict__.pop("_cleared_task_ids", []))
+        else:
+            sync.touch_tagged_tasks([instance.id])
+    elif action in ("post_add", "post_remove") and pk_set:
+        sync.touch_tagged_tasks(pk_set if reverse else [instance.id])
+
+
+@receiver(post_save, sender=Board)
+@receiver(post_save, sender=Stage)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=BoardAccess)
+def log_saved_row(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        activity.record_save(instance, created)
+
+
+@receiver(post_delete, sender=Board)
+@receiver(post_delete, sender=Stage)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=BoardAccess)
+def log_deleted_row(sender, instance, **kwargs):
+    activity.record(instance, ActivityAction.DELETED)
+
+
+@receiver(m2m_changed, sender=Task.tags.through)
+def log_task_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse or action not in ("post_add", "post_remove") or not pk_set:
+        return
+    change = "added" if action == "post_add" else "removed"
+    activity.record(
+        instance, ActivityAction.UPDATED, {"tags": {change: sorted(pk_set)}}
+    )
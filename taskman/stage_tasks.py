@@ -0,0 +1,108 @@
+"""
+Loading the tasks of a board a stage at a time.
+
+Board retrieves return the first `BOARD_TASKS_PER_STAGE` tasks of each
+stage, fetched with one window query however many tasks the board has, and
+a `next` cursor for the stages with more. The following tasks of a stage
+are listed with `GET /api/boards/<board>/stages/<stage>/tasks?after=<next>`,
+a cursor being the `<priority>.<id>` of the last task received.
+
+With `?layout=normalized`, stages, tasks and tags are returned as maps by
+id, tasks listing the ids of their tags: each tag is loaded and serialized
+once per board rather than once per task carrying it.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+
+from utils.models.queries import first_per_group
+
+from .models import Task
+
+TASK_ORDERING = ("priority", "id")
+LAYOUTS = ("nested", "normalized")
+
+
+def encode_task_cursor(task):
+    return f"{task.priority}.{task.id}"
+
+
+def decode_task_cursor(cursor):
+    try:
+        priority, task_id = cursor.split(".")
+        return int(priority), int(task_id)
+    except (AttributeError, ValueError):
+        raise ParseError("Invalid cursor")
+
+
+def get_tasks_per_stage(request):
+    try:
+        tasks = int(request.query_params.get("tasks", settings.BOARD_TASKS_PER_STAGE))
+    except ValueError:
+        raise ParseError("tasks must be an integer")
+    return min(max(tasks, 1), settings.BOARD_MAX_TASKS_PER_STAGE)
+
+
+def is_normalized(request):
+    layout = request.query_params.get("layout", "nested")
+    if layout not in LAYOUTS:
+        raise ParseError(f"layout must be one of {', '.join(LAYOUTS)}")
+    return layout == "normalized"
+
+
+def prefetch_first_tasks(stages, limit, tags=True):
+    """
+    Load the first `limit` tasks of each stage, and their tags unless
+    `tags` is False, in two queries. Sets `first_tasks` on the stages, and
+    `next_tasks` to the cursor of the tasks after them, or None when there
+    are none.
+    """
+    stages = list(stages)
+    tasks = defaultdict(list)
+    if stages:
+        # one more task tells whether a stage has more
+        queryset = first_per_group(
+            Task.objects.filter(stage__in=stages), "stage", TASK_ORDERING, limit + 1
+        )
+        if tags:
+            queryset = queryset.prefetch_related("tags")
+        for task in queryset:
+            tasks[task.stage_id].append(task)
+    for stage in stages:
+        stage.first_tasks = tasks[stage.id][:limit]
+        stage.next_tasks = None
+        if len(tasks[stage.id]) > limit:
+            stage.next_tasks = encode_task_cursor(stage.first_tasks[-1])
+
+
+def prefetch_tag_ids(tasks, tags):
+    """
+    Set `tag_ids` on the tasks, the ids of their tags found in `tags`. One
+    query on the tags of the tasks, without joining the tags table.
+    """
+    tag_ids = defaultdict(list)
+    known = {tag.id for tag in tags}
+    links = Task.tags.through.objects.filter(task__in=tasks).order_by("id")
+    for task_id, tag_id in links.values_list("task_id", "tag_id"):
+        # tags deleted since they were added
+        if tag_id in known:
+            tag_ids[task_id].append(tag_id)
+    for task in tasks:
+        task.tag_ids = tag_ids[task.id]
+
+
+def prefetch_board_tasks(board, request):
+    """
+    Load the tasks a retrieve of `board` returns, the board's stages, and
+    its tags when normalized, having been prefetched.
+    """
+    limit = get_tasks_per_stage(request)
+    if not is_normalized(request):
+        prefetch_first_tasks(board.stages.all(), limit)
+        return
+    prefetch_first_tasks(board.stages.all(), limit, tags=False)
+    prefetch_tag_ids(
+        [task for stage in board.stages.all() for task in stage.first_tasks],
+        board.tags.all(),
+    )
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.utils import timezone as dj_timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+
+from .models import BoardAccess, Stage, Tag, Task
+from .serializers import (
+    BoardDetailAccessSerializer,
+    StageDetailSerializer,
+    TagDetailSerializer,
+    TaskDetailSerializer,
+)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+ROW_SERIALIZERS = {
+    Stage: StageDetailSerializer,
+    Task: TaskDetailSerializer,
+    Tag: TagDetailSerializer,
+    BoardAccess: BoardDetailAccessSerializer,
+}
+
+
+def encode_cursor(value: datetime) -> str:
+    """
+    Encode a timestamp as an opaque cursor (microseconds since epoch).
+    """
+    return str((value - EPOCH) // timedelta(microseconds=1))
+
+
+def decode_cursor(cursor: str) -> datetime:
+    try:
+        return EPOCH + timedelta(microseconds=int(cursor))
+    except (TypeError, ValueError, OverflowError):
+        raise ParseError("Invalid cursor")
+
+
+def next_cursor(since):
+    """
+    Compute the cursor a client should send on its next sync.
+
+    The cursor trails the current time by `BOARD_SYNC_OVERLAP`, so rows that
+    share a timestamp with the cursor, or that were saved by a transaction
+    which had not committed yet when we read, are sent again on the next
+    sync instead of being skipped. Clients apply rows as upserts, so the
+    overlap only costs a few duplicates. The cursor never moves backwards.
+    """
+    cursor = dj_timezone.now() - settings.BOARD_SYNC_OVERLAP
+    if since is not None and since > cursor:
+        cursor = since
+    return cursor
+
+
+def tombstone(obj):
+    return {
+        "id": obj.id,
+        "deleted": True,
+        "modified_at": serializers.DateTimeField().to_representation(obj.modified_at),
+    }
+
+
+def serialize_row(row, context=None):
+    if getattr(row, "deleted", False):
+        return tombstone(row)
+    return ROW_SERIALIZERS[type(row)](row, context=context).data
+
+
+def serialize_rows(rows, context=None):
+    # one serializer per model, instantiating one per row costs more than the row
+    row_serializers = {}
+    data = []
+    for row in rows:
+        if getattr(row, "deleted", False):
+            data.append(tombstone(row))
+            continue
+        if (serializer := row_serializers.get(type(row))) is None:
+            serializer = row_serializers[type(row)] = ROW_SERIALIZERS[type(row)](
+                context=context
+            )
+        data.append(serializer.to_representation(row))
+    return data
+
+
+def get_board_changes(board, since=None, context=None, member=True):
+    """
+    Collect the rows of a board modified at or after `since`.
+
+    Without `since` every live row is returned, so a client can bootstrap
+    from the same endpoint. With `since`, soft deleted stages, tasks and tags
+    are returned as tombstones. Tag assignments touch the task's
+    `modified_at`, see `touch_tagged_tasks`, so the task is sent again.
+
+    Access rows, which name the members, are only returned to members. They
+    are hard deleted and produce no tombstones.
+    """
+
+    def changed(model, manager=None):
+        if since is None:
+            return model.objects.filter(board=board)
+        manager = manager or model._base_manager
+        return manager.filter(board=board, modified_at__gte=since)
+
+    stages = changed(Stage)
+    tasks = changed(Task).prefetch_related("tags")
+    tags = changed(Tag)
+    if member:
+        access = changed(BoardAccess, BoardAccess.objects).select_related("user")
+    else:
+        access = BoardAccess.objects.none()
+
+    return {
+        "stages": serialize_rows(stages, context),
+        "tasks": serialize_rows(tasks, context),
+        "tags": serialize_rows(tags, context),
+        "access": serialize_rows(access, context),
+    }
+
+
+def touch_tagged_tasks(task_ids):
+    """
+    Bump the `modified_at` of tasks whose tags changed, the next sync sends
+    them with their tags. No signal is sent.
+    """
+    if task_ids:
+        Task._base_manager.filter(id__in=task_ids).update(modified_at=dj_timezone.now())
@@ -1,3 +1,918 @@
-from django.test import TestCase
+import io
+import json
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (
+    AsyncClient,
+    RequestFactory,
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from prometheus_client import REGISTRY
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import NotFound
+from rest_framework.test import APIClient
+
+from core.celery_app import write_activity_events
+from utils import cdn
+from utils.cache.tiered import TieredCache
+from utils.db.pool import ConnectionPool, get_pool
+from utils.instrumentation import QueryBudgetExceeded
+from utils.metrics import metrics_view, observe_pools
+from utils.middlewares import ReplicaRoutingMiddleware
+from utils.profiling import Sampler
+from utils.routers import ReplicaRouter, read_from_replica
+from utils.serializers.compiled import CompiledSerializerMixin
+
+from . import activity
+from .analytics import rollup_transitions
+from .api_views import BoardViewSet, TaskViewSet
+from .attachments import receive_chunk, start_upload
+from .models import (
+    AccessLevel,
+    ActivityAction,
+    ActivityEvent,
+    AttachmentUpload,
+    Board,
+    BoardAccess,
+    BoardDailyStats,
+    Stage,
+    Tag,
+    Task,
+    User,
+)
+from .response_cache import get_summary_key, get_user_scope
+from .serializers import (
+    FullBoardSerializer,
+    StageDetailSerializer,
+    StageSerializer,
+    TagSerializer,
+    TaskSerializer,
+)
+from .stage_tasks import prefetch_first_tasks
+from .warming import rank
+from .ws_router import websocket_urlpatterns
+
+
+def create_board(owner, name="Board", **fields):
+    board = Board.objects.create(name=name, **fields)
+    BoardAccess.objects.create(board=board, user=owner, level=AccessLevel.OWNER)
+    return board
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ApiTestCase(TransactionTestCase):
+    def setUp(self):
+        # versions and cached responses outlive the rows of a test
+        cache.clear()
+        self.owner = User.objects.create_user("owner", "owner@example.com", "pass")
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+class BoardConsumerTests(TransactionTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", "owner@example.com", "pass")
+        self.member = User.objects.create_user("member", "member@example.com", "pass")
+        self.reader = User.objects.create_user("reader", "reader@example.com", "pass")
+        self.board = create_board(self.owner, public=True)
+        BoardAccess.objects.create(
+            board=self.board, user=self.member, level=AccessLevel.READ_ONLY
+        )
+
+    async def subscribe(self, user):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f"/ws/boards/{self.board.id}"
+        )
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def test_anonymous_sockets_are_refused(self):
+        communicator, connected = await self.subscribe(AnonymousUser())
+        self.assertFalse(connected)
+
+    async def test_private_boards_refuse_non_members(self):
+        await database_sync_to_async(Board.objects.filter(id=self.board.id).update)(
+            public=False
+        )
+        communicator, connected = await self.subscribe(self.reader)
+        self.assertFalse(connected)
+
+    async def test_access_rows_only_reach_members(self):
+        member, _ = await self.subscribe(self.member)
+        reader, connected = await self.subscribe(self.reader)
+        self.assertTrue(connected)
+
+        await database_sync_to_async(Stage.objects.create)(
+            board=self.board, name="To Do", priority=0
+        )
+        self.assertEqual((await member.receive_json_from())["model"], "stage")
+        self.assertEqual((await reader.receive_json_from())["model"], "stage")
+
+        user = await database_sync_to_async(User.objects.create_user)(
+            "new", "new@example.com", "pass"
+        )
+        await database_sync_to_async(BoardAccess.objects.create)(
+            board=self.board, user=user, level=AccessLevel.READ_WRITE
+        )
+        event = await member.receive_json_from()
+        self.assertEqual(event["model"], "boardaccess")
+        self.assertEqual(event["data"]["user"]["email"], "new@example.com")
+        self.assertTrue(await reader.receive_nothing())
+        await member.disconnect()
+        await reader.disconnect()
+
+    async def test_making_the_board_private_closes_non_members(self):
+        member, _ = await self.subscribe(self.member)
+        reader, _ = await self.subscribe(self.reader)
+
+        def make_private():
+            self.board.public = False
+            self.board.save()
+
+        await database_sync_to_async(make_private)()
+        self.assertEqual((await reader.receive_output())["type"], "websocket.close")
+        self.assertTrue(await member.receive_nothing())
+        await member.disconnect()
+
+    async def test_revoked_members_stop_receiving_access_rows(self):
+        member, _ = await self.subscribe(self.member)
+        access = await database_sync_to_async(BoardAccess.objects.get)(
+            board=self.board, user=self.member
+        )
+        await database_sync_to_async(access.delete)()
+        # the tombstone, then the member reads the public board as anyone
+        self.assertEqual((await member.receive_json_from())["action"], "deleted")
+        self.assertTrue(await member.receive_nothing())
+
+        await database_sync_to_async(BoardAccess.objects.create)(
+            board=self.board, user=self.reader, level=AccessLevel.READ_ONLY
+        )
+        self.assertTrue(await member.receive_nothing())
+        await member.disconnect()
+
+
+@override_settings(BOARD_SYNC_OVERLAP=timedelta(0))
+class BoardChangesTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.board = create_board(self.owner, public=True)
+        self.stage = Stage.objects.create(board=self.board, name="To Do")
+        self.task = Task.objects.create(board=self.board, stage=self.stage, name="A")
+        self.tag = Tag.objects.create(board=self.board, name="bug")
+        self.client = self.client_for(self.owner)
+
+    def sync(self, cursor=None, client=None):
+        params = {"since": cursor} if cursor else {}
+        response = (client or self.client).get(
+            f"/api/boards/{self.board.id}/changes", params
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_bootstrap_then_only_changed_rows(self):
+        changes = self.sync()
+        self.assertEqual([task["id"] for task in changes["tasks"]], [self.task.id])
+        self.assertEqual(len(changes["stages"]), 1)
+
+        self.task.name = "B"
+        self.task.save()
+        changes = self.sync(changes["cursor"])
+        self.assertEqual([task["name"] for task in changes["tasks"]], ["B"])
+        self.assertEqual(changes["stages"], [])
+        self.assertEqual(changes["tags"], [])
+
+    def test_deleted_rows_are_tombstones(self):
+        cursor = self.sync()["cursor"]
+        self.task.delete()
+        [task] = self.sync(cursor)["tasks"]
+        self.assertEqual((task["id"], task["deleted"]), (self.task.id, True))
+
+    def test_tag_assignments_are_synced(self):
+        cursor = self.sync()["cursor"]
+        self.task.tags.add(self.tag)
+        changes = self.sync(cursor)
+        self.assertEqual(changes["tasks"][0]["tags"][0]["id"], self.tag.id)
+
+        cursor = changes["cursor"]
+        self.tag.tasks.clear()
+        self.assertEqual(self.sync(cursor)["tasks"][0]["tags"], [])
+
+    def test_cursor_never_moves_backwards(self):
+        cursor = str(int(self.sync()["cursor"]) + 10**9)
+        self.assertEqual(self.sync(cursor)["cursor"], cursor)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            f"/api/boards/{self.board.id}/changes", {"since": "x"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_access_rows_only_go_to_members(self):
+        self.assertEqual(len(self.sync()["access"]), 1)
+        reader = User.objects.create_user("reader", "reader@example.com", "pass")
+        changes = self.sync(client=self.client_for(reader))
+        self.assertEqual(changes["access"], [])
+        self.assertEqual(len(changes["tasks"]), 1)
+
+
+@override_settings(READ_REPLICAS=["replica_0"], REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_credentials_are_read_from_the_primary(self):
+        router = ReplicaRouter()
+        with read_from_replica():
+            self.assertEqual(router.db_for_read(Token), "default")
+            self.assertEqual(router.db_for_read(Task), "replica_0")
+
+    def test_sign_in_pins_the_new_session(self):
+        def sign_in(request):
+            response = HttpResponse()
+            response.set_cookie("sessionid", "new-session")
+            return response
+
+        middleware = ReplicaRoutingMiddleware(sign_in)
+        middleware(RequestFactory().post("/api-auth/login/"))
+        self.assertTrue(cache.get(middleware.get_pin_key("new-session")))
+
+
+class PublicBoardTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.board = create_board(self.owner, public=True)
+        self.stage = Stage.objects.create(board=self.board, name="To Do")
+        cdn.LocalPurger.purged_keys.clear()
+
+    def test_served_anonymously_for_caches(self):
+        response = APIClient().get(f"/api/public/boards/{self.board.id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("access_level", response.json())
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("s-maxage", response["Cache-Control"])
+        self.assertEqual(response["Surrogate-Key"], f"board-{self.board.id}")
+        self.assertFalse(response.cookies)
+        self.assertNotIn("Cookie", response.get("Vary", ""))
+
+    def test_private_boards_are_not_found(self):
+        board = create_board(self.owner)
+        response = APIClient().get(f"/api/public/boards/{board.id}")
+        self.assertEqual(response.status_code, 404)
+
+    def test_writes_purge_public_boards(self):
+        Task.objects.create(board=self.board, stage=self.stage, name="A")
+        self.assertEqual(list(cdn.LocalPurger.purged_keys), [f"board-{self.board.id}"])
+
+    def test_writes_to_private_boards_purge_nothing(self):
+        board = create_board(self.owner)
+        cdn.LocalPurger.purged_keys.clear()
+        Stage.objects.create(board=board, name="To Do")
+        self.assertEqual(list(cdn.LocalPurger.purged_keys), [])
+
+    def test_making_a_board_private_purges_it(self):
+        self.board.public = False
+        self.board.save()
+        self.assertIn(f"board-{self.board.id}", cdn.LocalPurger.purged_keys)
+
+    def test_local_purger_keeps_the_last_keys(self):
+        keys = [f"board-{index}" for index in range(cdn.LOCAL_PURGER_MAX_KEYS + 1)]
+        cdn.LocalPurger().purge(keys)
+        self.assertEqual(list(cdn.LocalPurger.purged_keys), keys[1:])
+
+    @override_settings(SURROGATE_PURGER=None)
+    def test_unset_purger_is_reported(self):
+        with self.assertLogs("utils.cdn", "ERROR"):
+            cdn.purge(["board-1"])
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches["remote"].clear()
+        self.first, self.second = (
+            TieredCache("", {"NAME": name, "OPTIONS": {"REMOTE": "remote"}})
+            for name in ("first", "second")
+        )
+        for tiered in (self.first, self.second):
+            # share a channel, as two processes would
+            tiered.channel = "tests"
+            tiered.tier.clear()
+
+    def test_writes_invalidate_the_other_tiers(self):
+        self.first.set("key", "old")
+        self.assertEqual(self.second.get("key"), "old")
+        self.first.set("key", "new")
+        self.assertEqual(self.second.get("key"), "new")
+        self.first.delete("key")
+        self.assertIsNone(self.second.get("key"))
+
+    def test_values_are_copies(self):
+        self.first.set("key", {"tasks": []})
+        self.first.get("key")["tasks"].append(1)
+        self.assertEqual(self.first.get("key"), {"tasks": []})
+
+    def test_values_expire_with_the_shared_cache(self):
+        caches["remote"].set("key", "value", 2)
+        self.assertEqual(self.first.get("key"), "value")
+        local_key = self.first.make_key("key")
+        _, expires_at = self.first.tier.entries[local_key]
+        self.assertLessEqual(expires_at - time.monotonic(), 2)
+
+    def test_reads_racing_an_invalidation_are_not_kept(self):
+        caches["remote"].set("key", "old")
+        tier = self.first.tier
+        epoch = tier.epoch
+        # a write lands between the read from the shared cache and its keep
+        tier.invalidate(self.first.make_key("key"))
+        self.first.keep(self.first.make_key("key"), "old", None, epoch)
+        self.assertIsNone(tier.get(self.first.make_key("key")))
+        self.assertEqual(tier.stats()["invalidations"], 1)
+
+    def test_size_is_bounded(self):
+        tier = self.first.tier
+        self.addCleanup(setattr, tier, "max_size", tier.max_size)
+        tier.max_size = 4096
+        for index in range(100):
+            self.first.set(f"key-{index}", "x" * 100)
+        self.assertLessEqual(tier.size, 4096)
+        self.assertGreater(tier.stats()["evictions"], 0)
+        self.assertEqual(self.first.get("key-0"), "x" * 100)
+
+
+class ResponseCacheTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.board = create_board(self.owner)
+        self.stage = Stage.objects.create(board=self.board, name="To Do")
+        self.client = self.client_for(self.owner)
+
+    def list_names(self, client, path):
+        response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return [row["name"] for row in response.json()["results"]]
+
+    def test_lists_are_served_from_the_cache(self):
+        self.list_names(self.client, "/api/boards")
+        with self.assertNumQueries(0):
+            self.list_names(self.client, "/api/boards")
+
+    def test_writes_bump_the_cached_lists(self):
+        path = f"/api/boards/{self.board.id}/stages"
+        self.assertEqual(self.list_names(self.client, path), ["To Do"])
+        self.stage.name = "Doing"
+        self.stage.save()
+        self.assertEqual(self.list_names(self.client, path), ["Doing"])
+        Stage.objects.create(board=self.board, name="Done", priority=1)
+        self.assertEqual(self.list_names(self.client, path), ["Doing", "Done"])
+
+    def test_access_changes_bump_the_lists_of_the_user(self):
+        reader = User.objects.create_user("reader", "reader@example.com", "pass")
+        client = self.client_for(reader)
+        self.assertEqual(self.list_names(client, "/api/boards"), [])
+        BoardAccess.objects.create(
+            board=self.board, user=reader, level=AccessLevel.READ_ONLY
+        )
+        self.assertEqual(self.list_names(client, "/api/boards"), ["Board"])
+
+    def test_public_boards_share_one_version(self):
+        reader = User.objects.create_user("reader", "reader@example.com", "pass")
+        scope = get_user_scope(reader.id)
+        public = create_board(self.owner, public=True)
+        self.assertNotEqual(get_user_scope(reader.id), scope)
+        for _ in range(3):
+            create_board(self.owner, public=True)
+        # the scope doesn't grow with the public boards
+        self.assertEqual(len(get_user_scope(reader.id)), len(scope))
+
+        client = self.client_for(reader)
+        self.assertEqual(len(self.list_names(client, "/api/tasks")), 0)
+        stage = Stage.objects.create(board=public, name="To Do")
+        Task.objects.create(board=public, stage=stage, name="Public")
+        self.assertEqual(self.list_names(client, "/api/tasks"), ["Public"])
+
+
+class SamplerTests(SimpleTestCase):
+    def test_overlapping_samplers_restore_the_switch_interval(self):
+        original = sys.getswitchinterval()
+        first = Sampler(interval=0.001).start()
+        second = Sampler(interval=0.002).start()
+        self.assertEqual(sys.getswitchinterval(), 0.001)
+        # stopped in the order they started, not the reverse
+        first.stop()
+        self.assertEqual(sys.getswitchinterval(), 0.002)
+        second.stop()
+        self.assertEqual(sys.getswitchinterval(), original)
+
+
+class MetricsTests(SimpleTestCase):
+    def scrape(self, **headers):
+        return metrics_view(RequestFactory().get("/metrics", **headers))
+
+    @override_settings(DEBUG=False, METRICS_TOKEN=None)
+    def test_metrics_require_a_token_outside_debug(self):
+        self.assertEqual(self.scrape().status_code, 403)
+
+    @override_settings(DEBUG=False, METRICS_TOKEN="secret")
+    def test_metrics_are_served_with_the_token(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        response = self.scrape(HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+
+class AnalyticsTests(TransactionTestCase):
+    def test_completions_add_up_across_rollups(self):
+        owner = User.objects.create_user("owner", "owner@example.com", "pass")
+        board = create_board(owner)
+        todo = Stage.objects.create(board=board, name="To Do", priority=0)
+        done = Stage.objects.create(board=board, name="Done", priority=1)
+        for name in ("First", "Second"):
+            task = Task.objects.create(board=board, stage=todo, name=name)
+            task.stage = done
+            task.save()
+            rollup_transitions()
+
+        stats = BoardDailyStats.objects.get(board=board)
+        self.assertEqual(stats.completed, 2)
+        self.assertEqual(sum(stats.lead_times.values()), 2)
+        self.assertEqual(sum(stats.cycle_times.values()), 2)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_first_checkout_opens_min_size_connections(self):
+        pool = ConnectionPool(connect=object, check=lambda connection: None, min_size=3)
+        connection = pool.getconn()
+        stats = pool.get_stats()
+        self.assertEqual((stats["size"], stats["idle"]), (3, 2))
+        pool.putconn(connection)
+        pool.getconn()
+        self.assertEqual(pool.get_stats()["connections_opened"], 3)
+
+    def test_pool_stats_are_exported(self):
+        pool = get_pool("tests", connect=object, check=None, name="tests")
+        pool.getconn()
+        observe_pools()
+        sample = REGISTRY.get_sample_value(
+            "taskman_db_pool", {"pool": "tests", "stat": "in_use"}
+        )
+        self.assertEqual(sample, 1)
+
+
+class AttachmentTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        root_setting = override_settings(ATTACHMENT_ROOT=root.name)
+        root_setting.enable()
+        self.addCleanup(root_setting.disable)
+        board = create_board(self.owner)
+        stage = Stage.objects.create(board=board, name="To Do")
+        self.task = Task.objects.create(board=board, stage=stage, name="Task")
+        self.client = self.client_for(self.owner)
+
+    def start(self, size):
+        response = self.client.post(
+            f"/api/tasks/{self.task.id}/uploads", {"name": "file.txt", "size": size}
+        )
+        self.assertEqual(response.status_code, 201)
+        return f"/api/tasks/{self.task.id}/uploads/{response.data['id']}"
+
+    def send(self, url, offset, chunk):
+        return self.client.generic(
+            "PATCH",
+            url,
+            chunk,
+            content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_upload_resumes_from_its_offset(self):
+        url = self.start(10)
+        self.assertEqual(self.send(url, 0, b"0123").data["offset"], 4)
+        self.assertEqual(self.client.get(url).data["offset"], 4)
+        self.assertEqual(self.send(url, 0, b"0123").status_code, 409)
+
+        response = self.send(url, 4, b"456789")
+        self.assertEqual(response.status_code, 201)
+        download = self.client.get(
+            f"/api/tasks/{self.task.id}/attachments/{response.data['id']}/download"
+        )
+        self.assertEqual(b"".join(download.streaming_content), b"0123456789")
+
+    def test_chunks_racing_the_completion_are_not_found(self):
+        url = self.start(4)
+        upload = AttachmentUpload.objects.get()
+        self.assertEqual(self.send(url, 0, b"0123").status_code, 201)
+        # the part file is gone
+        with self.assertRaises(NotFound):
+            receive_chunk(upload, 0, io.BytesIO(), 0)
+        # the part file was opened before it went, the upload row is gone
+        start_upload(upload)
+        with self.assertRaises(NotFound):
+            receive_chunk(upload, 0, io.BytesIO(), 0)
+
+    def test_ranges_are_served(self):
+        url = self.start(10)
+        attachment_id = self.send(url, 0, b"0123456789").data["id"]
+        url = f"/api/tasks/{self.task.id}/attachments/{attachment_id}/download"
+
+        response = self.client.get(url, HTTP_RANGE="bytes=-4")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 6-9/10")
+        self.assertEqual(b"".join(response.streaming_content), b"6789")
+
+        response = self.client.get(url, HTTP_RANGE="bytes=10-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_uploads_to_unknown_tasks_are_not_found(self):
+        response = self.client.post(
+            "/api/tasks/first/uploads", {"name": "file.txt", "size": 4}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_attachments_of_deleted_tasks_are_not_found(self):
+        url = self.start(4)
+        attachment_id = self.send(url, 0, b"0123").data["id"]
+        self.task.delete()
+        download = self.client.get(
+            f"/api/tasks/{self.task.id}/attachments/{attachment_id}/download"
+        )
+        self.assertEqual(download.status_code, 404)
+
+
+@override_settings(ROOT_URLCONF="core.asgi_urls")
+class AsyncViewTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.owner)
+        for name in ("B", "A", "C"):
+            create_board(self.owner, name=name)
+
+    async def request(self, method, path, data=None, **headers):
+        # the async client sends extra arguments as headers, as they are named
+        return await getattr(AsyncClient(), method)(
+            path, data, authorization=f"Token {self.token.key}", **headers
+        )
+
+    async def test_invalid_task_filters_are_rejected(self):
+        response = await self.request("get", "/api/tasks", {"stage": "first"})
+        self.assertEqual(response.status_code, 400)
+        # the same body as the sync view
+        self.assertEqual(list(response.json()), ["stage"])
+        response = await self.request("get", "/api/tasks", {"archived": "false"})
+        self.assertEqual(response.status_code, 200)
+
+    async def test_lists_are_ordered_like_the_sync_views(self):
+        response = await self.request("get", "/api/boards", {"ordering": "-name"})
+        names = [board["name"] for board in response.json()["results"]]
+        self.assertEqual(names, ["C", "B", "A"])
+
+    async def test_msgpack_is_negotiated(self):
+        response = await self.request(
+            "get", "/api/boards", accept="application/msgpack"
+        )
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.content)["count"], 3)
+
+    async def test_other_requests_go_to_the_sync_views(self):
+        response = await self.request("get", "/api/boards", accept="text/html")
+        self.assertTrue(response["Content-Type"].startswith("text/html"))
+        response = await self.request(
+            "post", "/api/boards", {"name": "D"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["name"], "D")
+
+
+@override_settings(BOARD_TASKS_PER_STAGE=2)
+class StageTasksTests(ApiTestCase):
+    def test_following_tasks_are_listed_after_the_cursor(self):
+        board = create_board(self.owner)
+        stage = Stage.objects.create(board=board, name="To Do")
+        for name in "ABCDE":
+            Task.objects.create(board=board, stage=stage, name=name)
+        client = self.client_for(self.owner)
+
+        first = client.get(f"/api/boards/{board.id}").data["stages"][stage.id]
+        self.assertEqual([task["name"] for task in first["tasks"]], ["A", "B"])
+        url = f"/api/boards/{board.id}/stages/{stage.id}/tasks"
+        response = client.get(url, {"after": first["next"]})
+        names = [task["name"] for task in response.data["results"]]
+        self.assertEqual(names, ["C", "D", "E"])
+        self.assertEqual(client.get(url, {"after": "first"}).status_code, 400)
+
+
+class QueryBudgetTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        budgets = mock.patch.object(TaskViewSet, "query_budgets", {"list": 0})
+        budgets.start()
+        self.addCleanup(budgets.stop)
+        self.client = self.client_for(self.owner)
+
+    def test_requests_over_budget_raise(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get("/api/tasks")
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_requests_over_budget_are_logged_outside_tests(self):
+        with self.assertLogs("utils.middlewares", "WARNING") as logs:
+            self.assertEqual(self.client.get("/api/tasks").status_code, 200)
+        self.assertIn("TaskViewSet.list ran", logs.output[0])
+
+
+class ActivityTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.board = create_board(self.owner)
+        self.todo = Stage.objects.create(board=self.board, name="To Do")
+        self.done = Stage.objects.create(board=self.board, name="Done")
+        self.addCleanup(activity.buffer.flush)
+
+    def get_actions(self, task):
+        events = ActivityEvent.objects.filter(model="task", object_id=task.id)
+        return list(events.order_by("id").values_list("action", flat=True))
+
+    def test_task_changes_are_classified(self):
+        task = Task.objects.create(board=self.board, stage=self.todo, name="Task")
+        task.name = "Renamed"
+        task.save()
+        task.stage = self.done
+        task.save()
+        # saving unchanged fields logs nothing
+        task.save()
+        task.delete()
+        self.assertEqual(
+            self.get_actions(task),
+            [
+                ActivityAction.CREATED,
+                ActivityAction.UPDATED,
+                ActivityAction.MOVED,
+                ActivityAction.DELETED,
+            ],
+        )
+        moved = ActivityEvent.objects.get(action=ActivityAction.MOVED)
+        self.assertEqual(moved.changes, {"stage_id": [self.todo.id, self.done.id]})
+
+    @override_settings(ACTIVITY_LOG_BATCH_SIZE=3, ACTIVITY_LOG_FLUSH_INTERVAL=3600)
+    def test_events_are_written_in_batches(self):
+        logged = ActivityEvent.objects.count()
+        task = Task.objects.create(board=self.board, stage=self.todo, name="Task")
+        task.name = "Renamed"
+        task.save()
+        self.assertEqual(ActivityEvent.objects.count(), logged)
+        task.stage = self.done
+        task.save()
+        self.assertEqual(ActivityEvent.objects.count(), logged + 3)
+        task.delete()
+        activity.buffer.flush()
+        self.assertEqual(ActivityEvent.objects.count(), logged + 4)
+
+    @override_settings(ACTIVITY_LOG_ASYNC=True)
+    def test_events_are_queued_to_celery(self):
+        with mock.patch.object(write_activity_events, "apply_async") as apply_async:
+            task = Task.objects.create(board=self.board, stage=self.todo, name="Task")
+        # apply_async((events,), retry=False)
+        (events,) = apply_async.call_args.args[0]
+        self.assertEqual([event["object_id"] for event in events], [task.id])
+        self.assertEqual(self.get_actions(task), [])
+
+    @override_settings(ACTIVITY_LOG_ASYNC=True)
+    def test_events_are_written_here_without_a_broker(self):
+        down = mock.patch.object(
+            write_activity_events, "apply_async", side_effect=OSError("down")
+        )
+        with down, self.assertLogs("taskman.activity", "WARNING"):
+            task = Task.objects.create(board=self.board, stage=self.todo, name="Task")
+        self.assertEqual(self.get_actions(task), [ActivityAction.CREATED])
+
+    def test_feed_is_paged_newest_first(self):
+        for name in ("A", "B", "C"):
+            Task.objects.create(board=self.board, stage=self.todo, name=name)
+        client = self.client_for(self.owner)
+        url = f"/api/boards/{self.board.id}/activity"
+        ids = list(
+            ActivityEvent.objects.filter(board=self.board)
+            .order_by("-created_at", "-id")
+            .values_list("id", flat=True)
+        )
+
+        received, response = [], client.get(url, {"limit": 2})
+        while True:
+            self.assertLessEqual(len(response.data["results"]), 2)
+            received += [event["id"] for event in response.data["results"]]
+            if not response.data["next"]:
+                break
+            response = client.get(response.data["next"])
+        self.assertEqual(received, ids)
+
+    def test_feed_is_checked_against_the_board(self):
+        stranger = User.objects.create_user("stranger", "stranger@example.com", "pass")
+        client = self.client_for(stranger)
+        response = client.get(f"/api/boards/{self.board.id}/activity")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(client.get("/api/boards/first/activity").status_code, 404)
+
+
+class CompiledSerializerTests(TransactionTestCase):
+    def setUp(self):
+        owner = User.objects.create_user("owner", "owner@example.com", "pass")
+        self.board = create_board(owner)
+        self.stage = Stage.objects.create(board=self.board, name="To Do")
+        tags = [
+            Tag.objects.create(board=self.board, name=name, color="#fff")
+            for name in ("bug", "feature")
+        ]
+        for name in ("A", "B"):
+            task = Task.objects.create(board=self.board, stage=self.stage, name=name)
+            task.tags.set(tags)
+        Task.objects.create(board=self.board, stage=self.stage, name="C")
+
+    def assertRepresentedLikeDRF(self, serializer_class, instance, expected=None):
+        # the levels of boards, which would be read with the request otherwise
+        context = {"access_levels": {}}
+        represented = serializer_class(context=context).to_representation(instance)
+        if expected is None:
+            expected = instance
+        # every compiled serializer, nested ones included, represents as DRF
+        with mock.patch.object(
+            CompiledSerializerMixin,
+            "to_representation",
+            serializers.Serializer.to_representation,
+        ):
+            drf = serializer_class(context=context).to_representation(expected)
+        self.assertEqual(
+            json.loads(json.dumps(represented)), json.loads(json.dumps(drf))
+        )
+        self.assertEqual(list(represented), list(drf))
+
+    def test_instances(self):
+        self.assertRepresentedLikeDRF(TagSerializer, Tag.objects.first())
+        for task in Task.objects.all():
+            self.assertRepresentedLikeDRF(TaskSerializer, task)
+        self.assertRepresentedLikeDRF(StageSerializer, self.stage)
+
+    def test_prefetched_relations(self):
+        for task in Task.objects.prefetch_related("tags"):
+            self.assertRepresentedLikeDRF(TaskSerializer, task)
+        stage = Stage.objects.prefetch_related("tasks__tags").get()
+        self.assertRepresentedLikeDRF(StageSerializer, stage)
+
+        board = Board.objects.prefetch_related("stages").get()
+        prefetch_first_tasks(board.stages.all(), 2)
+        self.assertRepresentedLikeDRF(FullBoardSerializer, board)
+
+    def test_values_rows(self):
+        for row in Tag.objects.values("id", "name", "color"):
+            self.assertRepresentedLikeDRF(TagSerializer, row)
+        # DRF can't read a foreign key from a row, the id it holds is the
+        # same as DRF's for the instance
+        row = Stage.objects.values(*StageDetailSerializer.Meta.fields).get()
+        self.assertRepresentedLikeDRF(StageDetailSerializer, row, self.stage)
+
+
+class TransactionTests(ApiTestCase):
+    def record_atomic(self, *actions):
+        """
+        Whether each call to the `actions` of BoardViewSet ran in a
+        transaction.
+        """
+        atomic = []
+        for action in actions:
+            original = getattr(BoardViewSet, action)
+
+            def recorded(view, request, *args, original=original, **kwargs):
+                atomic.append(connection.in_atomic_block)
+                return original(view, request, *args, **kwargs)
+
+            patcher = mock.patch.object(BoardViewSet, action, recorded)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return atomic
+
+    def test_reads_run_in_autocommit(self):
+        board = create_board(self.owner)
+        atomic = self.record_atomic("list", "retrieve")
+        client = self.client_for(self.owner)
+        self.assertEqual(client.get("/api/boards").status_code, 200)
+        self.assertEqual(client.get(f"/api/boards/{board.id}").status_code, 200)
+        self.assertEqual(atomic, [False, False])
+
+    def test_failed_writes_roll_back(self):
+        atomic = self.record_atomic("create")
+        failing = mock.patch.object(
+            BoardAccess.objects, "create", side_effect=RuntimeError("failed")
+        )
+        with failing, self.assertRaises(RuntimeError):
+            # after the board row is inserted
+            self.client_for(self.owner).post("/api/boards", {"name": "Failed"})
+        self.assertEqual(atomic, [True])
+        self.assertFalse(Board.objects.filter(name="Failed").exists())
+
+
+class CacheWarmingTests(ApiTestCase):
+    def test_rank_fills_the_limit_past_duplicates(self):
+        self.assertEqual(rank([1], [1, 2, 3], limit=2), [1, 2])
+
+    def test_warmed_entries_are_the_ones_reads_look_up(self):
+        board = create_board(self.owner)
+        member = User.objects.create_user("member", "member@example.com", "pass")
+        BoardAccess.objects.create(
+            board=board, user=member, level=AccessLevel.READ_ONLY
+        )
+        cache.clear()
+        out = io.StringIO()
+        call_command("warm_caches", stdout=out)
+        self.assertIn("warmed 2 snapshots of 1 boards and 2 users", out.getvalue())
+
+        with mock.patch("utils.views.mixins.observe_cache") as observe_cache:
+            for user in (self.owner, member):
+                client = self.client_for(user)
+                self.assertEqual(client.get(f"/api/boards/{board.id}").status_code, 200)
+                self.assertEqual(client.get("/api/boards").status_code, 200)
+        hits = [call.args[1] for call in observe_cache.call_args_list]
+        self.assertEqual(hits, [1, 1, 1, 1])
+        self.assertIsNotNone(cache.get(get_summary_key(member.id)))
+
+
+class NormalizedBoardTests(ApiTestCase):
+    def test_rows_are_keyed_by_id(self):
+        board = create_board(self.owner)
+        stage = Stage.objects.create(board=board, name="To Do")
+        live = Tag.objects.create(board=board, name="live")
+        deleted = Tag.objects.create(board=board, name="deleted")
+        task = Task.objects.create(board=board, stage=stage, name="Task")
+        task.tags.set([live, deleted])
+        deleted.delete()
+
+        client = self.client_for(self.owner)
+        url = f"/api/boards/{board.id}"
+        data = client.get(url, {"layout": "normalized"}).data
+        self.assertEqual(list(data["stages"]), [stage.id])
+        self.assertEqual(data["stages"][stage.id]["tasks"], [task.id])
+        self.assertEqual(list(data["tasks"]), [task.id])
+        # the tags deleted since they were added are left out
+        self.assertEqual(data["tasks"][task.id]["tags"], [live.id])
+        self.assertEqual(list(data["tags"]), [live.id])
+        self.assertEqual(data["tags"][live.id]["name"], "live")
+
+        self.assertEqual(client.get(url, {"layout": "bogus"}).status_code, 400)
+
+
+class RenderingTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.owner)
+
+    def post(self, body, content_type):
+        return self.client.generic("POST", "/api/boards", body, content_type)
+
+    def test_msgpack_is_negotiated(self):
+        create_board(self.owner)
+        response = self.client.get("/api/boards", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(
+            msgpack.unpackb(response.content)["results"][0]["name"], "Board"
+        )
+
+    def test_msgpack_bodies_are_parsed(self):
+        response = self.post(msgpack.packb({"name": "Packed"}), "application/msgpack")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["name"], "Packed")
+        self.assertEqual(self.post(b"\xc1", "application/msgpack").status_code, 400)
+        # maps keyed by anything else than strings
+        response = self.post(msgpack.packb({1: "Packed"}), "application/msgpack")
+        self.assertEqual(response.status_code, 400)
+
+    def test_json_bodies_are_parsed_strictly(self):
+        response = self.post(b'{"name": "Parsed"}', "application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.post(b'{"name": ', "application/json").status_code, 400)
+        response = self.post(b'{"name": "Parsed", "x": NaN}', "application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_json_escapes_line_separators(self):
+        create_board(self.owner, name="a\u2028b\u2029c")
+        response = self.client.get("/api/boards", HTTP_ACCEPT="application/json")
+        self.assertIn(b"a\\u2028b\\u2029c", response.content)
+        self.assertEqual(response.json()["results"][0]["name"], "a\u2028b\u2029c")
@@ -0,0 +1,198 @@
+"""
+Warm the caches of the most active boards and users, so the first reads
+after a deploy or a cache flush don't all take the slow path.
+
+Boards are ranked by their latest activity event, see taskman.activity,
+then by `modified_at`, and users by their latest activity, then as members
+of these boards. In that order, within `CACHE_WARM_BUDGET` seconds:
+
+- the public boards and the versions of the boards, see
+  taskman.response_cache,
+- the snapshot of each board, its retrieve, once per access level of its
+  members, which also warms the access maps of the members reading it,
+- the access map, home summary and board list of each user.
+
+Snapshots and lists are rendered through their views, so they are cached
+under the keys reads look up, with the default query parameters.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from utils.cache.versions import get_versions
+
+from .api_views import BoardViewSet, HomeViewSet
+from .models import ActivityEvent, Board, BoardAccess, User
+from .response_cache import get_access_map, get_public_boards
+
+logger = logging.getLogger(__name__)
+
+
+def rank(*querysets, limit):
+    """
+    The ids the `querysets` return, in their order, without duplicates.
+    """
+    ids = {}
+    for queryset in querysets:
+        if len(ids) >= limit:
+            break
+        # ids ranked already may come again, at most `limit` are needed
+        for id in queryset[:limit]:
+            ids.setdefault(id, None)
+            if len(ids) >= limit:
+                break
+    return list(ids)
+
+
+def get_active_board_ids(limit, since):
+    recent = (
+        ActivityEvent.objects.filter(created_at__gte=since)
+        .values("board_id")
+        .annotate(last=Max("created_at"))
+        .order_by("-last")
+        .values_list("board_id", flat=True)
+    )
+    modified = Board.objects.order_by("-modified_at").values_list("id", flat=True)
+    board_ids = rank(recent, modified, limit=limit)
+    # events outlive their boards
+    existing = set(Board.objects.filter(id__in=board_ids).values_list("id", flat=True))
+    return [board_id for board_id in board_ids if board_id in existing]
+
+
+def get_active_user_ids(limit, since, board_ids):
+    recent = (
+        ActivityEvent.objects.filter(created_at__gte=since, actor__isnull=False)
+        .values("actor_id")
+        .annotate(last=Max("created_at"))
+        .order_by("-last")
+        .values_list("actor_id", flat=True)
+    )
+    members = (
+        BoardAccess.objects.filter(board_id__in=board_ids)
+        .order_by("-modified_at")
+        .values_list("user_id", flat=True)
+    )
+    user_ids = rank(recent, members, limit=limit)
+    existing = set(User.objects.filter(id__in=user_ids).values_list("id", flat=True))
+    return [user_id for user_id in user_ids if user_id in existing]
+
+
+def get_snapshot_readers(board_ids):
+    """
+    A member of each board per access level, by board id.
+    """
+    readers = {}
+    accesses = BoardAccess.objects.filter(board_id__in=board_ids).order_by("id")
+    for board_id, level, user_id in accesses.values_list(
+        "board_id", "level", "user_id"
+    ):
+        readers.setdefault(board_id, {}).setdefault(level, user_id)
+    return readers
+
+
+class Warmer:
+    def __init__(self, budget):
+        self.deadline = time.monotonic() + budget
+        self.factory = APIRequestFactory()
+        self.users = {}
+        self.counts = {"snapshots": 0, "users": 0, "failures": 0}
+        self.board_retrieve = BoardViewSet.as_view({"get": "retrieve"})
+        self.board_list = BoardViewSet.as_view({"get": "list"})
+        self.home_summary = HomeViewSet.as_view({"get": "summary"})
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.deadline
+
+    def get(self, view, path, user, **kwargs):
+        request = self.factory.get(path)
+        force_authenticate(request, user=user)
+        response = view(request, **kwargs)
+        if response.status_code != 200:
+            raise ValueError(f"{path} responded {response.status_code}")
+
+    def run(self, name, warm, *args, **kwargs):
+        try:
+            warm(*args, **kwargs)
+            return True
+        except Exception:
+            # a cold entry is only slower to read
+            logger.exception("Could not warm %s", name)
+            self.counts["failures"] += 1
+            return False
+
+    def warm_board(self, board_id, reader_ids):
+        for user_id in reader_ids:
+            if self.expired:
+                return False
+            if self.run(
+                f"the snapshot of board {board_id}",
+                self.get,
+                self.board_retrieve,
+                f"/api/boards/{board_id}",
+                self.users[user_id],
+                pk=str(board_id),
+            ):
+                self.counts["snapshots"] += 1
+        return True
+
+    def warm_user(self, user_id):
+        user = self.users[user_id]
+        if self.run(f"the access map of user {user_id}", get_access_map, user_id):
+            self.run(
+                f"the home summary of user {user_id}",
+                self.get,
+                self.home_summary,
+                "/api/home/summary",
+                user,
+            )
+            self.run(
+                f"the board list of user {user_id}",
+                self.get,
+                self.board_list,
+                "/api/boards",
+                user,
+            )
+            self.counts["users"] += 1
+
+
+def warm_caches(budget=None, boards=None, users=None):
+    """
+    Warm the caches of the `boards` and `users` most active, within `budget`
+    seconds, and return the counts of entries warmed.
+    """
+    budget = settings.CACHE_WARM_BUDGET if budget is None else budget
+    boards = settings.CACHE_WARM_BOARDS if boards is None else boards
+    users = settings.CACHE_WARM_USERS if users is None else users
+    since = timezone.now() - settings.CACHE_WARM_ACTIVITY_WINDOW
+
+    started = time.monotonic()
+    warmer = Warmer(budget)
+    board_ids = get_active_board_ids(boards, since)
+    user_ids = get_active_user_ids(users, since, board_ids)
+    readers = get_snapshot_readers(board_ids)
+    reader_ids = {user_id for levels in readers.values() for user_id in levels.values()}
+    warmer.users = User.objects.in_bulk(reader_ids | set(user_ids))
+
+    get_public_boards()
+    get_versions([f"board:{board_id}" for board_id in board_ids])
+    complete = all(
+        warmer.warm_board(board_id, readers.get(board_id, {}).values())
+        for board_id in board_ids
+    )
+    for user_id in user_ids:
+        if not complete or warmer.expired:
+            complete = False
+            break
+        warmer.warm_user(user_id)
+
+    return {
+        "boards": len(board_ids),
+        **warmer.counts,
+        "complete": complete,
+        "seconds": round(time.monotonic() - started, 3),
+    }
@@ -0,0 +1,33 @@
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user
+from rest_framework import exceptions
+from rest_framework.authentication import get_authorization_header
+from rest_framework.authtoken.models import Token
+
+
+@database_sync_to_async
+def get_token_user(key):
+    try:
+        return Token.objects.select_related("user").get(key=key).user
+    except Token.DoesNotExist:
+        return None
+
+
+async def authenticate(request):
+    """
+    Async counterpart of DRF's token and session authentication for plain
+    async views, returns the authenticated user or raises `NotAuthenticated`.
+    """
+    auth = get_authorization_header(request).split()
+    if auth and auth[0].lower() == b"token":
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        user = await get_token_user(auth[1].decode())
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed("Invalid token.")
+        return user
+
+    user = await database_sync_to_async(get_user)(request)
+    if not user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    return user
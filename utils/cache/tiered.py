@@ -0,0 +1,374 @@
+"""
+A two-tier cache: a bounded in-process LRU in front of a shared cache,
+Redis in production.
+
+Reads are served from the process when they can, then from the shared
+cache, whose values the process keeps for `LOCAL_TIMEOUT` seconds at most,
+and never past their expiry in the shared cache: it must be one of
+utils.cache.backends, which return the time values have left.
+Values are held pickled: the memory they take is known and bounded by
+`MAX_SIZE` bytes, and callers mutating a value they read don't change the
+cached one. Values larger than `MAX_ITEM_SIZE` skip the process tier.
+
+Writes go to the shared cache, then are published on the Redis `CHANNEL`,
+and the other processes drop the key from their tier. Until a process gets
+the message it may serve the previous value. A process whose subscription
+drops clears its tier once subscribed again, the messages sent meanwhile
+are lost. With a shared cache other than Redis, like locmem in tests, the
+messages go to the other tiers of the process, tiers being named after
+the cache's `NAME`.
+
+    CACHES = {
+        "default": {
+            "BACKEND": "utils.cache.tiered.TieredCache",
+            "OPTIONS": {"REMOTE": "redis", "MAX_SIZE": 64 * 1024 * 1024},
+        },
+        "redis": {
+            "BACKEND": "utils.cache.backends.RedisCache",
+            "LOCATION": "redis://localhost:6379/1",
+            "NAME": "redis",
+        },
+    }
+
+Hits and misses of the process tier are counted in `utils.metrics` as
+`<NAME>.local`, the shared cache counts its own. `stats()` returns the
+counters of both tiers in the current process.
+"""
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict, defaultdict
+
+from django.core.cache import caches
+from django.core.cache.backends import redis
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.functional import cached_property
+
+from ..metrics import observe_cache
+
+logger = logging.getLogger(__name__)
+
+_missing = object()
+# bytes counted for an entry on top of its key and value
+ENTRY_OVERHEAD = 128
+# the key of messages clearing every tier
+CLEAR = "*"
+
+
+class LocalTier:
+    """
+    The in-process LRU of a cache, shared by the threads of the process.
+    """
+
+    def __init__(self, max_size, max_item_size):
+        self.max_size = max_size
+        self.max_item_size = max_item_size
+        self.entries = OrderedDict()
+        self.size = 0
+        # bumped by invalidations, values read from the shared cache before
+        # one are not kept
+        self.epoch = 0
+        self.lock = threading.Lock()
+        self.origin = uuid.uuid4().hex
+        self.counters = {
+            "local_hits": 0,
+            "local_misses": 0,
+            "remote_hits": 0,
+            "remote_misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, key):
+        with self.lock:
+            if (entry := self.entries.get(key)) is None:
+                return None
+            data, expires_at = entry
+            if expires_at <= time.monotonic():
+                self.pop(key)
+                return None
+            self.entries.move_to_end(key)
+            return data
+
+    def set(self, key, data, timeout, epoch=None):
+        """
+        Keep a value written by this process or, with the `epoch` it was
+        read at, read from the shared cache.
+        """
+        size = len(key) + len(data) + ENTRY_OVERHEAD
+        with self.lock:
+            self.pop(key)
+            if epoch is None:
+                # reads in flight could hold an older value
+                self.epoch += 1
+            elif epoch != self.epoch:
+                return
+            if size > self.max_item_size:
+                return
+            self.entries[key] = (data, time.monotonic() + timeout)
+            self.size += size
+            while self.size > self.max_size:
+                evicted, (evicted_data, _) = self.entries.popitem(last=False)
+                self.size -= len(evicted) + len(evicted_data) + ENTRY_OVERHEAD
+                self.counters["evictions"] += 1
+
+    def pop(self, key):
+        # call with the lock held
+        if (entry := self.entries.pop(key, None)) is not None:
+            self.size -= len(key) + len(entry[0]) + ENTRY_OVERHEAD
+
+    def delete(self, key):
+        with self.lock:
+            self.epoch += 1
+            self.pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def invalidate(self, key):
+        with self.lock:
+            self.epoch += 1
+            self.counters["invalidations"] += 1
+            if key == CLEAR:
+                self.entries.clear()
+                self.size = 0
+            else:
+                self.pop(key)
+
+    def count(self, counter, n=1):
+        if n:
+            with self.lock:
+                self.counters[counter] += n
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "items": len(self.entries), "size": self.size}
+
+
+class RedisInvalidations:
+    """
+    Publish the keys a process writes and drop the keys others write from
+    its tier, from a thread subscribed to the channel.
+    """
+
+    def __init__(self, client, channel, tier):
+        self.client = client
+        self.channel = channel
+        self.tier = tier
+        self.thread = threading.Thread(
+            target=self.listen, name=f"cache-invalidations:{channel}", daemon=True
+        )
+        self.thread.start()
+
+    def publish(self, key):
+        self.client.publish(self.channel, f"{self.tier.origin} {key}")
+
+    def listen(self):
+        delay = 1
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # keys written while unsubscribed may be stale
+                self.tier.invalidate(CLEAR)
+                delay = 1
+                for message in pubsub.listen():
+                    origin, key = message["data"].decode().split(" ", 1)
+                    if origin != self.tier.origin:
+                        self.tier.invalidate(key)
+            except Exception as exc:
+                logger.warning(
+                    "Lost the cache invalidations of %s, retrying in %ds: %s",
+                    self.channel,
+                    delay,
+                    exc,
+                )
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+class LocalInvalidations:
+    """
+    Deliver the keys a tier writes to the other tiers of the process on the
+    same channel, when the shared cache isn't Redis.
+    """
+
+    channels = defaultdict(weakref.WeakSet)
+
+    def __init__(self, channel, tier):
+        self.channel = channel
+        self.tier = tier
+        self.channels[channel].add(tier)
+
+    def publish(self, key):
+        for tier in list(self.channels[self.channel]):
+            if tier is not self.tier:
+                tier.invalidate(key)
+
+
+# the tier and invalidations of each cache in the process, cache backends
+# are instantiated per thread
+process_states = {}
+lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.name = params.get("NAME", "default")
+        self.remote_alias = options["REMOTE"]
+        self.local_timeout = options.get("LOCAL_TIMEOUT", 60)
+        self.channel = options.get("CHANNEL", f"cache-invalidations:{self.name}")
+        self.max_size = options.get("MAX_SIZE", 64 * 1024 * 1024)
+        self.max_item_size = options.get("MAX_ITEM_SIZE", 1024 * 1024)
+
+    @cached_property
+    def remote(self):
+        return caches[self.remote_alias]
+
+    @property
+    def tier(self):
+        return self.get_process_state()[0]
+
+    def get_process_state(self):
+        """
+        The tier and invalidations of the current process, forked processes
+        start over.
+        """
+        key = (self.name, os.getpid())
+        if (state := process_states.get(key)) is not None:
+            return state
+        with lock:
+            if (state := process_states.get(key)) is None:
+                tier = LocalTier(self.max_size, self.max_item_size)
+                if isinstance(self.remote, redis.RedisCache):
+                    client = self.remote._cache.get_client(write=True)
+                    channel = RedisInvalidations(client, self.channel, tier)
+                else:
+                    channel = LocalInvalidations(self.channel, tier)
+                state = process_states[key] = (tier, channel)
+        return state
+
+    def get_local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def keep(self, key, value, timeout, epoch=None):
+        tier = self.tier
+        if (timeout := self.get_local_timeout(timeout)) <= 0:
+            tier.delete(key)
+            return
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        tier.set(key, data, timeout, epoch)
+
+    def publish(self, key):
+        _, channel = self.get_process_state()
+        try:
+            channel.publish(key)
+        except Exception as exc:
+            # the other processes keep the previous value up to LOCAL_TIMEOUT
+            logger.warning("Could not publish the invalidation of %s: %s", key, exc)
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        tier = self.tier
+        values, remote_keys = {}, {}
+        for key in keys:
+            local_key = self.make_and_validate_key(key, version)
+            if (data := tier.get(local_key)) is not None:
+                values[key] = pickle.loads(data)
+            else:
+                remote_keys[key] = local_key
+        tier.count("local_hits", len(values))
+        tier.count("local_misses", len(remote_keys))
+        observe_cache(f"{self.name}.local", len(values), len(remote_keys))
+        if remote_keys:
+            epoch = tier.epoch
+            found = self.remote.get_many_with_ttl(remote_keys, version)
+            tier.count("remote_hits", len(found))
+            tier.count("remote_misses", len(remote_keys) - len(found))
+            for key, (value, ttl) in found.items():
+                # kept no longer than the shared cache keeps it
+                self.keep(remote_keys[key], value, ttl, epoch)
+                values[key] = value
+        return values
+
+    def has_key(self, key, version=None):
+        local_key = self.make_and_validate_key(key, version)
+        return self.tier.get(local_key) is not None or self.remote.has_key(key, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version)
+        self.remote.set(key, value, timeout, version)
+        self.keep(local_key, value, timeout)
+        self.publish(local_key)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version)
+        if not self.remote.add(key, value, timeout, version):
+            return False
+        self.keep(local_key, value, timeout)
+        self.publish(local_key)
+        return True
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.remote.set_many(data, timeout, version)
+        for key, value in data.items():
+            local_key = self.make_and_validate_key(key, version)
+            if key not in failed:
+                self.keep(local_key, value, timeout)
+            self.publish(local_key)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        # the process tier keeps values LOCAL_TIMEOUT seconds at most anyway
+        return self.remote.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        local_key = self.make_and_validate_key(key, version)
+        deleted = self.remote.delete(key, version)
+        self.tier.delete(local_key)
+        self.publish(local_key)
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self.remote.delete_many(keys, version)
+        for key in keys:
+            local_key = self.make_and_validate_key(key, version)
+            self.tier.delete(local_key)
+            self.publish(local_key)
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self.make_and_validate_key(key, version)
+        value = self.remote.incr(key, delta, version)
+        # read again with the time it has left
+        self.tier.delete(local_key)
+        self.publish(local_key)
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version)
+
+    def clear(self):
+        self.remote.clear()
+        self.tier.clear()
+        self.publish(CLEAR)
+
+    def stats(self):
+        """
+        The hits, misses, evictions and invalidations of the tiers in the
+        current process, with the items and bytes held by the process tier.
+        """
+        return self.tier.stats()
@@ -0,0 +1,39 @@
+"""
+Version counters of cached data, kept in the default cache.
+
+Cache keys built from the versions of everything the cached value depends
+on change as soon as one of them is bumped, so invalidating never scans or
+deletes keys: the stale entries are no longer read and expire. A version
+missing from the cache, never set or evicted, starts over from the current
+time in nanoseconds, which never goes back to a value a key was built with.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def get_version_key(name):
+    return f"version:{name}"
+
+
+def get_versions(names):
+    """
+    The current versions of `names`, in the same order.
+    """
+    keys = [get_version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # another process may be setting it at the same time
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(names):
+    for name in names:
+        key = get_version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
@@ -0,0 +1,125 @@
+"""
+Responses cached by a CDN in front of the app, purged by surrogate key.
+
+Views mark the responses anyone may be served with `cache_publicly`: it
+sets `Cache-Control` and the `Surrogate-Key` header CDNs index cached
+responses by, and has CookieFreeMiddleware drop cookies and `Vary: Cookie`
+from them. Writes invalidating cached responses call `purge` with their
+keys, the class named by `SURROGATE_PURGER` does the purging:
+
+- LocalPurger keeps the last purged keys in memory, for development and
+  tests.
+- NullPurger purges nothing, for deployments without a CDN.
+- FastlyPurger calls the Fastly API with `FASTLY_SERVICE_ID` and
+  `FASTLY_API_TOKEN`.
+
+Production settings require `SURROGATE_PURGER`, elsewhere purges are
+skipped with an error logged when it isn't set.
+
+Purges are sent from a Celery task when `SURROGATE_PURGE_ASYNC` is on,
+from the process itself otherwise or when the broker can't be reached.
+"""
+import logging
+import urllib.request
+from collections import deque
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# the most keys Fastly purges per request
+FASTLY_MAX_KEYS = 256
+# purged keys LocalPurger remembers
+LOCAL_PURGER_MAX_KEYS = 1000
+
+
+class LocalPurger:
+    """
+    Record the last purged keys, there is no CDN to purge.
+    """
+
+    purged_keys = deque(maxlen=LOCAL_PURGER_MAX_KEYS)
+
+    def purge(self, keys):
+        self.purged_keys.extend(keys)
+
+
+class NullPurger:
+    """
+    Purge nothing, no CDN caches the responses.
+    """
+
+    def purge(self, keys):
+        pass
+
+
+class FastlyPurger:
+    """
+    Purge keys through the Fastly API, softly: the purged responses are
+    marked stale and revalidated instead of dropped.
+    """
+
+    url = "https://api.fastly.com/service/{service_id}/purge"
+
+    def purge(self, keys):
+        for start in range(0, len(keys), FASTLY_MAX_KEYS):
+            request = urllib.request.Request(
+                self.url.format(service_id=settings.FASTLY_SERVICE_ID),
+                method="POST",
+                headers={
+                    "Fastly-Key": settings.FASTLY_API_TOKEN,
+                    "Fastly-Soft-Purge": "1",
+                    "Surrogate-Key": " ".join(keys[start : start + FASTLY_MAX_KEYS]),
+                    "Accept": "application/json",
+                },
+            )
+            with urllib.request.urlopen(request, timeout=10):
+                pass
+
+
+def get_purger():
+    return import_string(settings.SURROGATE_PURGER)()
+
+
+def purge_keys(keys):
+    get_purger().purge(keys)
+
+
+def purge(keys):
+    """
+    Purge the responses cached under any of `keys`.
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    if not settings.SURROGATE_PURGER:
+        logger.error("SURROGATE_PURGER is not set, %s stay cached by the CDN", keys)
+        return
+    if settings.SURROGATE_PURGE_ASYNC:
+        from core.celery_app import purge_surrogate_keys
+
+        try:
+            purge_surrogate_keys.apply_async((keys,), retry=False)
+            return
+        except Exception as exc:
+            logger.warning(
+                "Could not queue the purge of %s, purging here: %s", keys, exc
+            )
+    try:
+        purge_keys(keys)
+    except Exception:
+        # the responses stay cached until they expire
+        logger.exception("Could not purge %s", keys)
+
+
+def cache_publicly(response, keys, max_age, cdn_max_age):
+    """
+    Let browsers cache `response` for `max_age` seconds and CDNs for
+    `cdn_max_age`, under the surrogate `keys`.
+    """
+    patch_cache_control(response, public=True, max_age=max_age, s_maxage=cdn_max_age)
+    response["Surrogate-Key"] = " ".join(keys)
+    response.cookie_free = True
+    return response
@@ -0,0 +1,70 @@
+"""
+PostgreSQL backend handing out connections from a per-process pool.
+
+Configure it with the pool options in ``OPTIONS["pool"]`` and
+``CONN_MAX_AGE = 0``, Django then "closes" the connection at the end of each
+request or Celery task, which returns it to the pool instead of dropping it::
+
+    DATABASES["default"]["ENGINE"] = "utils.db.backends.postgresql"
+    DATABASES["default"]["OPTIONS"]["pool"] = {"min_size": 2, "max_size": 8}
+"""
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from ...pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop("pool", None)
+        return conn_params
+
+    def get_pool(self, conn_params):
+        key = (self.alias, tuple(sorted(conn_params.items())))
+        return get_pool(
+            key,
+            connect=lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params
+            ),
+            check=self.check_connection,
+            name=self.alias,
+            **self.settings_dict["OPTIONS"].get("pool", {}),
+        )
+
+    @staticmethod
+    def check_connection(connection):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        connection.rollback()
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        return self.pool.getconn()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            # a connection closed inside an atomic block stays referenced by
+            # this wrapper until the block exits, it can't be shared
+            reusable = not self.in_atomic_block and self.reset_connection()
+            self.pool.putconn(self.connection, reusable)
+
+    def reset_connection(self):
+        """
+        Bring the connection back to a clean idle state before returning it
+        to the pool, returns False if that isn't possible.
+        """
+        connection = self.connection
+        if connection.closed:
+            return False
+        status = connection.get_transaction_status()
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except base.Database.Error:
+                return False
+        return True
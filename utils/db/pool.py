@@ -0,0 +1,236 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    A thread safe pool of DB-API connections shared by every thread of a
+    process.
+
+    Connections are created by `connect`, checked with `check` before being
+    handed out when they sat idle for longer than `check_interval` seconds,
+    and replaced once they are older than `max_lifetime`. The first checkout
+    opens `min_size` connections, idle connections above `min_size` are
+    closed after `max_idle` seconds. Checkouts wait up
+    to `timeout` seconds for a free connection once `max_size` are in use.
+    """
+
+    def __init__(
+        self,
+        connect,
+        check,
+        min_size=1,
+        max_size=10,
+        timeout=10.0,
+        max_idle=300.0,
+        max_lifetime=3600.0,
+        check_interval=30.0,
+        name="default",
+    ):
+        if not 0 <= min_size <= max_size:
+            raise ValueError("expected 0 <= min_size <= max_size")
+        self.connect = connect
+        self.check = check
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+        self.name = name
+
+        self._lock = threading.Condition()
+        # idle connections as (connection, returned_at), most recently
+        # returned last so the hottest connections are reused first
+        self._idle = deque()
+        self._created_at = {}
+        self._size = 0
+        self._warmed = False
+        self._stats = dict.fromkeys(
+            (
+                "connections_opened",
+                "connections_closed",
+                "checkouts",
+                "checkouts_waited",
+                "checkout_timeouts",
+                "health_checks_failed",
+            ),
+            0,
+        )
+        self._wait_time = 0.0
+
+    def _open(self):
+        connection = self.connect()
+        with self._lock:
+            self._created_at[id(connection)] = time.monotonic()
+            self._stats["connections_opened"] += 1
+        return connection
+
+    def _discard(self, connection):
+        with self._lock:
+            self._size -= 1
+            self._created_at.pop(id(connection), None)
+            self._stats["connections_closed"] += 1
+            self._lock.notify()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _expired(self, connection, now):
+        created_at = self._created_at.get(id(connection), now)
+        return now - created_at >= self.max_lifetime
+
+    def _prune(self, now):
+        """
+        Pop the idle connections to close, caller must hold the lock.
+        """
+        stale = []
+        while len(self._idle) > self.min_size:
+            connection, returned_at = self._idle[0]
+            if now - returned_at < self.max_idle:
+                break
+            self._idle.popleft()
+            stale.append(connection)
+        return stale
+
+    def _warm(self):
+        with self._lock:
+            if self._warmed:
+                return
+            self._warmed = True
+            count = max(self.min_size - self._size, 0)
+            self._size += count
+        for opened in range(count):
+            try:
+                connection = self._open()
+            except Exception:
+                # checkouts open their own connections
+                logger.exception("Could not warm pool %r", self.name)
+                with self._lock:
+                    self._size -= count - opened
+                    self._lock.notify_all()
+                return
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+                self._lock.notify()
+
+    def getconn(self):
+        if not self._warmed:
+            self._warm()
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                stale = self._prune(now)
+                if self._idle:
+                    connection, returned_at = self._idle.pop()
+                elif self._size < self.max_size:
+                    connection, returned_at = None, None
+                    self._size += 1
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats["checkout_timeouts"] += 1
+                        raise PoolTimeout(
+                            f"no connection available in pool {self.name!r} "
+                            f"after {self.timeout}s ({self.max_size} in use)"
+                        )
+                    if not waited:
+                        waited = True
+                        self._stats["checkouts_waited"] += 1
+                    self._lock.wait(remaining)
+                    self._wait_time += time.monotonic() - now
+                    continue
+            for idle in stale:
+                self._discard(idle)
+
+            if connection is None:
+                try:
+                    connection = self._open()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._lock.notify()
+                    raise
+            elif self._expired(connection, now) or (
+                now - returned_at >= self.check_interval
+                and not self._healthy(connection)
+            ):
+                self._discard(connection)
+                continue
+
+            with self._lock:
+                self._stats["checkouts"] += 1
+            return connection
+
+    def _healthy(self, connection):
+        try:
+            self.check(connection)
+        except Exception:
+            logger.warning("Dropping broken connection from pool %r", self.name)
+            with self._lock:
+                self._stats["health_checks_failed"] += 1
+            return False
+        return True
+
+    def putconn(self, connection, reusable=True):
+        if not reusable or self._expired(connection, time.monotonic()):
+            self._discard(connection)
+            return
+        with self._lock:
+            self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "wait_seconds": self._wait_time,
+            }
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, **kwargs):
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(**kwargs)
+        return _pools[key]
+
+
+def get_pool_stats():
+    with _pools_lock:
+        return {pool.name: pool.get_stats() for pool in _pools.values()}
+
+
+def _forget_pools():
+    # connections inherited from a parent process must not be shared with it
+    global _pools, _pools_lock
+    _pools, _pools_lock = {}, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_pools)
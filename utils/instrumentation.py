@@ -0,0 +1,100 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# metrics of the request being served, unset outside of requests
+current_metrics = ContextVar("current_metrics", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    """
+    SQL and serializer timings collected while serving one request.
+
+    `key` names the endpoint as `<ViewSet>.<action>` once a DRF view has
+    been resolved, `budget` is the query budget of that action if any and
+    counts the queries run after `budget_start`.
+    """
+
+    def __init__(self, capture_queries=False):
+        self.key = None
+        self.budget = None
+        self.budget_start = 0
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.started_at = time.perf_counter()
+        # (sql, params, duration) of every query, for profiling
+        self.query_log = [] if capture_queries else None
+
+    @property
+    def duration(self):
+        return time.perf_counter() - self.started_at
+
+    @property
+    def budgeted_queries(self):
+        return self.queries - self.budget_start
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.budgeted_queries > self.budget
+
+    def record_query(self, sql, params, duration):
+        self.queries += 1
+        self.db_time += duration
+        if self.query_log is not None:
+            self.query_log.append((sql, params, duration))
+
+
+@contextmanager
+def collect_metrics(capture_queries=False):
+    metrics = RequestMetrics(capture_queries)
+    token = current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        current_metrics.reset(token)
+
+
+def query_timer(execute, sql, params, many, context):
+    """
+    Database execute wrapper adding every query to the current metrics, it
+    is installed on each connection and is a no-op outside of requests.
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, params, time.perf_counter() - start)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+def timed_serializer(serializer):
+    """
+    Add the time `serializer` spends building its data to the current
+    metrics, nested serializers are part of their parent's time.
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return serializer
+    to_representation = serializer.to_representation
+
+    def timed_to_representation(instance):
+        start = time.perf_counter()
+        try:
+            return to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - start
+
+    serializer.to_representation = timed_to_representation
+    return serializer
@@ -0,0 +1,206 @@
+"""
+Prometheus metrics of the web and Celery processes.
+
+Every process records into its own registry. When `PROMETHEUS_MULTIPROC_DIR`
+is set, which it must be before `prometheus_client` is first imported,
+processes write their samples to files in that directory instead and any of
+them can serve the aggregate, see `gunicorn.conf.py`. The directory must be
+emptied whenever the process group restarts.
+"""
+import hmac
+import logging
+import os
+import time
+
+from celery import current_app, signals
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from utils.db.pool import get_pool_stats
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = Histogram(
+    "taskman_http_request_duration_seconds",
+    "Time spent serving HTTP requests.",
+    ["route", "method"],
+)
+REQUESTS = Counter(
+    "taskman_http_requests_total",
+    "HTTP responses sent.",
+    ["route", "method", "status"],
+)
+DB_QUERIES = Histogram(
+    "taskman_db_queries_per_request",
+    "SQL queries run to serve a request.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+DB_TIME = Histogram(
+    "taskman_db_duration_seconds",
+    "Time spent in SQL queries to serve a request.",
+    ["route"],
+)
+CACHE_REQUESTS = Counter(
+    "taskman_cache_requests_total",
+    "Cache lookups, by result.",
+    ["cache", "result"],
+)
+TASK_DURATION = Histogram(
+    "taskman_celery_task_duration_seconds",
+    "Time spent running Celery tasks.",
+    ["task", "state"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300),
+)
+
+# the counters of a pool are gauges too, a pool starts over in every process
+DB_POOL = Gauge(
+    "taskman_db_pool",
+    "Connections and checkouts of the DB connection pools, see utils.db.pool.",
+    ["pool", "stat"],
+    multiprocess_mode="livesum",
+)
+
+
+def multiprocess_mode():
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+def get_route(request):
+    """
+    Label requests by URL name, like `api:board-detail`, rather than by path
+    so every board shares one series.
+    """
+    if match := getattr(request, "resolver_match", None):
+        return match.view_name
+    return "unmatched"
+
+
+def observe_request(request, response, metrics):
+    route = get_route(request)
+    REQUEST_LATENCY.labels(route, request.method).observe(metrics.duration)
+    REQUESTS.labels(route, request.method, response.status_code).inc()
+    DB_QUERIES.labels(route).observe(metrics.queries)
+    DB_TIME.labels(route).observe(metrics.db_time)
+    observe_pools()
+
+
+def observe_pools():
+    for pool, stats in get_pool_stats().items():
+        for stat, value in stats.items():
+            DB_POOL.labels(pool, stat).set(value)
+
+
+def observe_cache(name, hits, misses):
+    if hits:
+        CACHE_REQUESTS.labels(name, "hit").inc(hits)
+    if misses:
+        CACHE_REQUESTS.labels(name, "miss").inc(misses)
+
+
+class QueueDepthCollector:
+    """
+    Report the number of messages waiting in each Celery queue, read from
+    the broker on every scrape.
+    """
+
+    def collect(self):
+        depth = GaugeMetricFamily(
+            "taskman_celery_queue_depth",
+            "Messages waiting in a Celery queue.",
+            labels=["queue"],
+        )
+        try:
+            with current_app.connection_for_read() as connection:
+                # fail fast, a scrape must not hang on the broker
+                connection.ensure_connection(max_retries=0)
+                channel = connection.default_channel
+                for queue in current_app.amqp.queues:
+                    size = channel.queue_declare(queue, passive=True).message_count
+                    depth.add_metric([queue], size)
+        except Exception as exc:
+            logger.warning("Could not read Celery queue depths: %s", exc)
+        yield depth
+
+
+def get_registry():
+    if not multiprocess_mode():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """
+    Expose the metrics of every process in the Prometheus text format.
+
+    Scrapers must send `METRICS_TOKEN` as a bearer token. Without a token
+    the metrics are only served in DEBUG.
+    """
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    else:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+            return HttpResponseForbidden()
+
+    registry = CollectorRegistry()
+    registry.register(QueueDepthCollector())
+    output = generate_latest(get_registry()) + generate_latest(registry)
+    return HttpResponse(output, content_type=CONTENT_TYPE_LATEST)
+
+
+# Celery
+# ------------------------------------------------------------------------------
+_task_started_at = {}
+
+
+@signals.task_prerun.connect
+def on_task_prerun(task_id, **kwargs):
+    _task_started_at[task_id] = time.perf_counter()
+
+
+@signals.task_postrun.connect
+def on_task_postrun(task_id, task, state=None, **kwargs):
+    started_at = _task_started_at.pop(task_id, None)
+    if started_at is not None:
+        TASK_DURATION.labels(task.name, state or "UNKNOWN").observe(
+            time.perf_counter() - started_at
+        )
+
+
+@signals.worker_init.connect
+def on_worker_init(**kwargs):
+    # pool processes are forked after this, clear the files of a previous run
+    if multiprocess_mode():
+        path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            os.remove(os.path.join(path, name))
+
+
+@signals.worker_ready.connect
+def on_worker_ready(**kwargs):
+    # workers serve their own metrics as they don't run next to the web process
+    if port := os.environ.get("CELERY_METRICS_PORT"):
+        start_http_server(int(port), registry=get_registry())
+
+
+@signals.worker_process_shutdown.connect
+def on_worker_process_shutdown(pid=None, **kwargs):
+    if multiprocess_mode():
+        multiprocess.mark_process_dead(pid or os.getpid())
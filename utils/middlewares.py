@@ -1,6 +1,34 @@
+import hashlib
+import logging
 import zoneinfo
+from contextvars import ContextVar
+from importlib import import_module
+from types import SimpleNamespace
 
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
 from django.utils import timezone
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from .instrumentation import (
+    QueryBudgetExceeded,
+    collect_metrics,
+    current_metrics,
+    install_query_timer,
+)
+from .metrics import observe_request
+from .profiling import Sampler, save_profile
+from .routers import read_from_replica
+
+logger = logging.getLogger(__name__)
+
+# the request being served, see CurrentRequestMiddleware
+current_request = ContextVar("current_request", default=None)
 
 
 class TimezoneMiddleware:
@@ -13,3 +41,212 @@ class TimezoneMiddleware:
         except AttributeError:
             pass
         return self.get_response(request)
+
+
+class CurrentRequestMiddleware:
+    """
+    Expose the request being served to code that isn't handed it, like
+    signal handlers recording who made a change. Read `request.user` at the
+    time it's needed: API views authenticate after this middleware runs.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+
+class CookieFreeMiddleware:
+    """
+    Strip cookies and the `Vary` headers on cookies and language from
+    responses marked by `utils.cdn.cache_publicly`, so CDNs cache one copy
+    for everyone. Runs before the session, locale and CSRF middlewares to
+    see their headers on the way out.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if getattr(response, "cookie_free", False):
+            response.cookies.clear()
+            if response.has_header("Vary"):
+                vary = [
+                    header.strip()
+                    for header in response["Vary"].split(",")
+                    if header.strip().lower() not in ("cookie", "accept-language")
+                ]
+                if vary:
+                    response["Vary"] = ", ".join(vary)
+                else:
+                    del response["Vary"]
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serve GET and HEAD requests from a read replica.
+
+    After a client sends a write its reads stay on the primary for
+    `REPLICA_PIN_SECONDS`, so it always reads its own writes even when the
+    replicas lag behind. Clients are told apart by their auth token or
+    session cookie, authentication itself runs later in the view. A write
+    signing a client in pins the session it sets, tokens and sessions are
+    always read from the primary, see `utils.routers.ReplicaRouter`.
+    """
+
+    safe_methods = ("GET", "HEAD")
+
+    def __init__(self, get_response):
+        if not settings.READ_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def get_pin_key(self, credentials):
+        if not credentials:
+            return None
+        return "replica-pin:" + hashlib.sha256(credentials.encode()).hexdigest()
+
+    def pin(self, pin_key):
+        if pin_key:
+            cache.set(pin_key, True, settings.REPLICA_PIN_SECONDS)
+
+    def __call__(self, request):
+        pin_key = self.get_pin_key(
+            request.headers.get("Authorization")
+            or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        )
+
+        if request.method not in self.safe_methods:
+            self.pin(pin_key)
+            response = self.get_response(request)
+            if session := response.cookies.get(settings.SESSION_COOKIE_NAME):
+                # the client's next reads carry the new session
+                self.pin(self.get_pin_key(session.value))
+            return response
+
+        if pin_key and cache.get(pin_key):
+            return self.get_response(request)
+
+        with read_from_replica():
+            return self.get_response(request)
+
+
+class QueryMetricsMiddleware:
+    """
+    Record the SQL query count, DB time and serializer time of every request.
+
+    They are exported to Prometheus along with the request latency, see
+    `utils.metrics`. In DEBUG they are also reported through the
+    `X-Query-Count` and `Server-Timing` response headers, otherwise logged
+    as one logfmt line per request. A request running more queries than its
+    action's budget (see `QueryBudgetMixin`) raises `QueryBudgetExceeded`
+    when `QUERY_BUDGET_RAISE` is set, as in tests, and logs a warning
+    otherwise.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        connection_created.connect(install_query_timer)
+        for connection in connections.all():
+            install_query_timer(None, connection)
+
+    def get_key(self, request, metrics):
+        if metrics.key:
+            return metrics.key
+        if match := getattr(request, "resolver_match", None):
+            return match.view_name
+        return request.path
+
+    def __call__(self, request):
+        with collect_metrics() as metrics:
+            response = self.get_response(request)
+
+        observe_request(request, response, metrics)
+        key = self.get_key(request, metrics)
+        if settings.DEBUG:
+            response["X-Query-Count"] = metrics.queries
+            response["Server-Timing"] = (
+                f"db;dur={metrics.db_time * 1000:.1f}, "
+                f"serializer;dur={metrics.serializer_time * 1000:.1f}, "
+                f"total;dur={metrics.duration * 1000:.1f}"
+            )
+        else:
+            logger.info(
+                "view=%s method=%s status=%s queries=%d db_ms=%.1f "
+                "serializer_ms=%.1f total_ms=%.1f",
+                key,
+                request.method,
+                response.status_code,
+                metrics.queries,
+                metrics.db_time * 1000,
+                metrics.serializer_time * 1000,
+                metrics.duration * 1000,
+            )
+
+        if metrics.over_budget:
+            message = (
+                f"{key} ran {metrics.budgeted_queries} queries, "
+                f"over its budget of {metrics.budget}"
+            )
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile a request of a staff user that asks for it with an `X-Profile`
+    header or a `_profile` query parameter.
+
+    The thread serving the request is sampled from the middleware below
+    `QueryMetricsMiddleware` down to the view and its serializers, and its
+    SQL queries are logged. The profile is kept in the cache, its id is sent
+    back in the `X-Profile-Id` header and it can be read from the admin, see
+    `utils.views.profiling`. Other requests only pay for the flag lookup.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILE_REQUESTS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.session_engine = import_module(settings.SESSION_ENGINE)
+
+    def get_user(self, request):
+        # this runs before the session and auth middlewares, authenticate
+        # the way the API does
+        try:
+            if result := TokenAuthentication().authenticate(request):
+                return result[0]
+        except AuthenticationFailed:
+            return None
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        session = self.session_engine.SessionStore(session_key)
+        return get_user(SimpleNamespace(session=session))
+
+    def __call__(self, request):
+        if "HTTP_X_PROFILE" not in request.META and "_profile" not in request.GET:
+            return self.get_response(request)
+
+        user = self.get_user(request)
+        metrics = current_metrics.get()
+        if not (user and user.is_staff) or metrics is None:
+            return self.get_response(request)
+
+        metrics.query_log = []
+        sampler = Sampler(interval=settings.PROFILE_INTERVAL).start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        response["X-Profile-Id"] = save_profile(
+            request, user, response, sampler, metrics
+        )
+        return response
@@ -1,3 +1,6 @@
+from django.db.models import DEFERRED
+
+
 class ObjectOwnerMixin:
     """
     Restrict access to the endpoint to the owner of the object.
@@ -20,7 +23,8 @@ class PreserveInitialFieldValueMixin:
     Mixin to save initial values of fields before save.
 
     preserved filed should be specified in _preserved_fields attribute.
-    fields can be accessed as self._initial_field_name
+    fields can be accessed as self._initial_field_name, deferred fields are
+    not preserved so they don't cost a query.
     """
 
     _preserved_fields = ()
@@ -28,8 +32,27 @@ class PreserveInitialFieldValueMixin:
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._preserved_fields = self.get_preserved_fields()
-        for field in self._preserved_fields:
-            setattr(self, f"_initial_{field}", getattr(self, field))
+        self.preserve_field_values()
 
     def get_preserved_fields(self):
         return self._preserved_fields
+
+    def preserve_field_values(self):
+        """
+        Make the current values the initial ones, e.g. once they are saved.
+        """
+        for field in self._preserved_fields:
+            if field in self.__dict__:
+                setattr(self, f"_initial_{field}", self.__dict__[field])
+
+    def get_changed_fields(self):
+        """
+        Map the preserved fields whose value changed to `(initial, current)`.
+        """
+        changed = {}
+        for field in self._preserved_fields:
+            initial = self.__dict__.get(f"_initial_{field}", DEFERRED)
+            current = self.__dict__.get(field, DEFERRED)
+            if DEFERRED not in (initial, current) and initial != current:
+                changed[field] = (initial, current)
+        return changed
@@ -0,0 +1,38 @@
+from django.db import connections
+from django.db.models import F, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+
+
+def first_per_group(queryset, group_by, ordering, limit):
+    """
+    Filter `queryset` down to the first `limit` rows of each value of the
+    `group_by` field, ordered by the `ordering` field names, with a single
+    query.
+
+    Django can't filter on window functions before 4.2, so the row numbers
+    are computed by the compiled queryset, wrapped in a raw subquery that
+    filters on them. The result is still a queryset, ordered by group.
+    """
+    order_by = [
+        F(field[1:]).desc() if field.startswith("-") else F(field).asc()
+        for field in ordering
+    ]
+    ranked = (
+        queryset.annotate(
+            row_number=Window(RowNumber(), partition_by=F(group_by), order_by=order_by)
+        )
+        .order_by()
+        .values("pk", "row_number")
+    )
+    connection = connections[queryset.db]
+    sql, params = ranked.query.get_compiler(connection=connection).as_sql()
+    quote = connection.ops.quote_name
+    pk = quote(queryset.model._meta.pk.column)
+    return queryset.filter(
+        pk__in=RawSQL(
+            f"SELECT {pk} FROM ({sql}) {quote('ranked')} "
+            f"WHERE {quote('row_number')} <= %s",
+            (*params, limit),
+        )
+    ).order_by(queryset.model._meta.get_field(group_by).attname, *ordering)
@@ -1,4 +1,4 @@
-from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
 from rest_framework.response import Response
 
 
@@ -15,3 +15,15 @@ class CustomLimitOffsetPagination(LimitOffsetPagination):
                 "results": data,
             }
         )
+
+
+class CustomCursorPagination(CursorPagination):
+    """
+    Paginate feeds by position instead of offset, so deep pages cost as
+    little as the first and don't shift as new rows come in.
+    """
+
+    page_size = 30
+    max_page_size = 100
+    page_size_query_param = "limit"
+    ordering = ("-created_at", "-id")
@@ -0,0 +1,151 @@
+import sys
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+PROFILE_INDEX_KEY = "profiles"
+PROFILE_INDEX_SIZE = 50
+
+# the switch interval is global to the process, it is lowered while any
+# sampler runs and restored when the last one stops
+switch_lock = threading.Lock()
+active_intervals = Counter()
+original_switch_interval = None
+
+
+def lower_switch_interval(interval):
+    global original_switch_interval
+    with switch_lock:
+        if not active_intervals:
+            original_switch_interval = sys.getswitchinterval()
+        active_intervals[interval] += 1
+        sys.setswitchinterval(min([original_switch_interval, *active_intervals]))
+
+
+def restore_switch_interval(interval):
+    with switch_lock:
+        active_intervals[interval] -= 1
+        if not active_intervals[interval]:
+            del active_intervals[interval]
+        sys.setswitchinterval(min([original_switch_interval, *active_intervals]))
+
+
+class Sampler:
+    """
+    A sampling CPU profiler of one thread.
+
+    A daemon thread records the stack of the profiled thread every `interval`
+    seconds, the profiled thread runs untouched. Samples are taken whenever
+    the sampler gets the GIL, so the interpreter's switch interval is lowered
+    to `interval` while sampling, or CPU bound code would only be sampled
+    every 5ms. The interval is global: while any request is profiled the
+    other threads of the process switch as often.
+    """
+
+    def __init__(self, thread_id=None, interval=0.001):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        # folded stacks, root first, to their sample count
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or self._stopped.is_set():
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        lower_switch_interval(self.interval)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        restore_switch_interval(self.interval)
+
+    def folded(self):
+        """
+        The samples in the folded format of flamegraph.pl and speedscope.
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.items())
+
+    def top_frames(self, limit=30):
+        """
+        The frames most samples were taken in, with their share of samples.
+        """
+        total = sum(self.stacks.values()) or 1
+        own = Counter()
+        for stack, count in self.stacks.items():
+            own[stack.rsplit(";", 1)[-1]] += count
+        return [(frame, count / total) for frame, count in own.most_common(limit)]
+
+
+def save_profile(request, user, response, sampler, metrics):
+    """
+    Store the profile of a request in the cache for `PROFILE_TTL` seconds and
+    return its id.
+    """
+    profile_id = uuid.uuid4().hex
+    profile = {
+        "id": profile_id,
+        "created_at": timezone.now(),
+        "method": request.method,
+        "path": request.get_full_path(),
+        "user": str(user),
+        "status": response.status_code,
+        "duration": metrics.duration,
+        "db_time": metrics.db_time,
+        "serializer_time": metrics.serializer_time,
+        "samples": sum(sampler.stacks.values()),
+        "top_frames": sampler.top_frames(),
+        "folded": sampler.folded(),
+        "queries": metrics.query_log,
+    }
+    cache.set(f"profile:{profile_id}", profile, settings.PROFILE_TTL)
+    index = cache.get(PROFILE_INDEX_KEY, [])
+    index = [profile_id] + index[: PROFILE_INDEX_SIZE - 1]
+    cache.set(PROFILE_INDEX_KEY, index, settings.PROFILE_TTL)
+    return profile_id
+
+
+def get_profile(profile_id):
+    return cache.get(f"profile:{profile_id}")
+
+
+def get_profiles():
+    profiles = cache.get_many(
+        [f"profile:{profile_id}" for profile_id in cache.get(PROFILE_INDEX_KEY, [])]
+    )
+    return sorted(profiles.values(), key=lambda p: p["created_at"], reverse=True)
+
+
+def format_profile(profile):
+    lines = [
+        f"{profile['method']} {profile['path']} -> {profile['status']}",
+        f"user: {profile['user']}, at {profile['created_at']:%Y-%m-%d %H:%M:%S %Z}",
+        f"total: {profile['duration'] * 1000:.1f}ms, "
+        f"db: {profile['db_time'] * 1000:.1f}ms in {len(profile['queries'])} queries, "
+        f"serializers: {profile['serializer_time'] * 1000:.1f}ms, "
+        f"{profile['samples']} samples",
+        "",
+        "Top frames",
+        "----------",
+    ]
+    lines += [f"{share:6.1%}  {frame}" for frame, share in profile["top_frames"]]
+    lines += ["", "SQL queries", "-----------"]
+    for sql, params, duration in profile["queries"]:
+        lines.append(f"{duration * 1000:7.2f}ms  {sql}  {params!r}")
+    return "\n".join(lines)
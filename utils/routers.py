@@ -0,0 +1,47 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# database alias the current request reads from, unset means the primary
+read_alias = ContextVar("read_alias", default=None)
+# credentials are read from the primary, a token or session just issued may
+# not have reached the replicas yet, one just revoked may still be there
+PRIMARY_READ_MODELS = {"authtoken.Token", "sessions.Session"}
+
+
+@contextmanager
+def read_from_replica():
+    """
+    Route ORM reads in this block to one of `READ_REPLICAS`, the same
+    replica is used for the whole block so reads see a consistent state.
+    """
+    token = read_alias.set(random.choice(settings.READ_REPLICAS))
+    try:
+        yield
+    finally:
+        read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send reads to the replica picked for the current request, if any, and
+    everything else to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label in PRIMARY_READ_MODELS:
+            return DEFAULT_DB_ALIAS
+        return read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # never write back to the replica an instance was read from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -1,8 +1,61 @@
+import hashlib
+import logging
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
 from drf_spectacular.openapi import AutoSchema as SpectacularAutoSchema
 
+logger = logging.getLogger(__name__)
+
 
 class AutoSchema(SpectacularAutoSchema):
     def get_tags(self):
         tokenized_path = self._tokenize_path()
         # use last non-parameter path part as tag
         return [tokenized_path[-1]]
+
+
+def get_schema_path(format):
+    return Path(settings.SCHEMA_DIR) / f"openapi.{format}"
+
+
+def get_schema_cache_key(format):
+    return f"openapi-schema:{format}"
+
+
+def generate_schema():
+    """
+    Generate the OpenAPI schema the way `SpectacularAPIView` does and return
+    it rendered in each format it serves, as `{format: bytes}`.
+    """
+    from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+    from drf_spectacular.settings import spectacular_settings
+
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(
+        request=None, public=spectacular_settings.SERVE_PUBLIC
+    )
+    return {
+        renderer.format: renderer().render(schema, renderer_context={})
+        for renderer in (OpenApiYamlRenderer, OpenApiJsonRenderer)
+    }
+
+
+@lru_cache
+def load_schema(format):
+    """
+    Return the pre-generated schema in `format` and its ETag, read once per
+    process from `SCHEMA_DIR` or the cache, see the `build_schema` command.
+
+    Without an artifact the schema is generated here once, so a missing
+    build step costs a slow first request rather than a broken endpoint.
+    """
+    path = get_schema_path(format)
+    if path.exists():
+        content = path.read_bytes()
+    elif (content := cache.get(get_schema_cache_key(format))) is None:
+        logger.warning("No pre-generated OpenAPI schema, run manage.py build_schema")
+        content = generate_schema()[format]
+    return content, f'"{hashlib.sha256(content).hexdigest()}"'
@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
 
 
 class DynamicModelSerializer(serializers.ModelSerializer):
@@ -20,3 +22,34 @@ class DynamicModelSerializer(serializers.ModelSerializer):
             existing = set(self.fields)
             for field_name in existing - allowed:
                 self.fields.pop(field_name)
+
+
+class FastRepresentationMixin:
+    """
+    Represent instances as plain dicts rather than OrderedDicts, listing the
+    readable fields once per serializer instead of once per instance. Dicts
+    keep their insertion order, so the rendered output doesn't change.
+    """
+
+    def to_representation(self, instance):
+        try:
+            fields = self._representation_fields
+        except AttributeError:
+            fields = self._representation_fields = list(self._readable_fields)
+        ret = {}
+        for field in fields:
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+            # as in Serializer.to_representation, related fields may hold a
+            # PKOnlyObject standing for a null relation
+            if isinstance(attribute, PKOnlyObject):
+                check_for_none = attribute.pk
+            else:
+                check_for_none = attribute
+            if check_for_none is None:
+                ret[field.field_name] = None
+            else:
+                ret[field.field_name] = field.to_representation(attribute)
+        return ret
@@ -0,0 +1,193 @@
+"""
+Serializers whose `to_representation` is compiled into a flat function.
+
+DRF represents an instance by looping over the serializer's fields, calling
+`get_attribute` then `to_representation` on each. For the fields whose
+behaviour is known, a model field read into a str, int, bool or float, or a
+foreign key read as its id, the compiled function reads the attribute and
+converts it inline, and prefetched relations are read without building
+their manager. Other fields are called the way DRF calls them, nested
+serializers through their own compiled function. The output is the same
+as DRF's, except for foreign keys of `values()` rows: DRF fails on them,
+they are represented as the id held by the row.
+
+Functions are generated once per serializer class and set of fields, for
+model instances and for `values()` rows, then cached.
+"""
+import inspect
+from collections.abc import Mapping
+from types import FunctionType
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import fields as drf_fields
+from rest_framework import relations, serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+
+from .base import FastRepresentationMixin
+
+# fields whose to_representation only converts the type of the value
+CONVERTERS = {
+    drf_fields.CharField: "str",
+    drf_fields.IntegerField: "int",
+    drf_fields.BooleanField: "bool",
+    drf_fields.FloatField: "float",
+}
+
+compiled_functions = {}
+
+
+def get_plain_attr(serializer, field, rows):
+    """
+    The name to read the value of `field` from, with `obj[name]` from rows
+    or `obj.name` from instances, or None when DRF's `get_attribute` is
+    needed: dotted or `*` sources, fields reading their attribute their own
+    way, and attributes that may be missing or methods.
+    """
+    if len(field.source_attrs) != 1:
+        return None
+    attr = field.source_attrs[0]
+    is_pk = type(field) is relations.PrimaryKeyRelatedField and field.pk_field is None
+    if not is_pk and type(field).get_attribute is not drf_fields.Field.get_attribute:
+        return None
+    if rows:
+        return attr
+    model = getattr(getattr(serializer, "Meta", None), "model", None)
+    if model is None or not attr.isidentifier():
+        return None
+    if is_pk:
+        try:
+            return model._meta.get_field(attr).attname
+        except FieldDoesNotExist:
+            return None
+    # fields and relations are descriptors on the model class, DRF calls
+    # methods and skips missing attributes
+    descriptor = inspect.getattr_static(model, attr, None)
+    if descriptor is None or isinstance(
+        descriptor, (FunctionType, classmethod, staticmethod)
+    ):
+        return None
+    return attr
+
+
+def get_prefetch_cache_name(serializer, attr):
+    """
+    The key of the objects of the to-many relation `attr` prefetched on
+    instances, as read by the relation's manager, or None.
+    """
+    model = serializer.Meta.model
+    try:
+        field = model._meta.get_field(attr)
+    except FieldDoesNotExist:
+        return None
+    if isinstance(field, models.ManyToManyField):
+        return field.name
+    if isinstance(field, models.ManyToManyRel):
+        return field.field.related_query_name()
+    if isinstance(field, models.ManyToOneRel) and field.get_accessor_name() == attr:
+        return field.get_cache_name()
+    return None
+
+
+def generate(serializer, fields, rows):
+    """
+    The source of a function representing an object with the readable
+    `fields` of `serializer`, executed.
+    """
+    lines = ["def represent(obj, fields, serializer, nested):", "    ret = {}"]
+    for index, field in enumerate(fields):
+        key = repr(field.field_name)
+        attr = get_plain_attr(serializer, field, rows)
+        if isinstance(field, serializers.SerializerMethodField):
+            lines.append(f"    ret[{key}] = serializer.{field.method_name}(obj)")
+            continue
+        if attr is None:
+            lines += [
+                "    try:",
+                f"        v = fields[{index}].get_attribute(obj)",
+                "    except SkipField:",
+                "        pass",
+                "    else:",
+                "        c = v.pk if isinstance(v, PKOnlyObject) else v",
+                f"        ret[{key}] = None if c is None else "
+                f"fields[{index}].to_representation(v)",
+            ]
+            continue
+
+        cache_name = None
+        if isinstance(field, serializers.ListSerializer) and not rows:
+            cache_name = get_prefetch_cache_name(serializer, attr)
+        if cache_name is not None:
+            # skip building the relation's manager, which then returns the
+            # same prefetched queryset
+            lines += [
+                "    try:",
+                f"        v = obj._prefetched_objects_cache[{cache_name!r}]",
+                "    except (AttributeError, KeyError):",
+                f"        v = obj.{attr}",
+            ]
+        else:
+            lines.append(f"    v = obj[{attr!r}]" if rows else f"    v = obj.{attr}")
+        if type(field) is relations.PrimaryKeyRelatedField:
+            # the id, read from the foreign key column or the row
+            value = "v"
+        elif (converter := CONVERTERS.get(type(field))) is not None:
+            value = f"{converter}(v)"
+        elif isinstance(field, serializers.ListSerializer) and not rows:
+            value = (
+                f"[nested[{index}](item) for item in "
+                "(v.all() if isinstance(v, Manager) else v)]"
+            )
+        elif isinstance(field, serializers.BaseSerializer) and not rows:
+            value = f"nested[{index}](v)"
+        else:
+            value = f"fields[{index}].to_representation(v)"
+        lines.append(f"    ret[{key}] = None if v is None else {value}")
+    lines.append("    return ret")
+
+    namespace = {
+        "SkipField": SkipField,
+        "PKOnlyObject": PKOnlyObject,
+        "Manager": models.Manager,
+    }
+    exec("\n".join(lines), namespace)
+    return namespace["represent"]
+
+
+def get_compiled(serializer, rows=False):
+    """
+    The function compiled for the class and readable fields of `serializer`,
+    with its readable fields and the `to_representation` of its nested
+    serializers, which the function is called with.
+    """
+    fields = tuple(serializer._readable_fields)
+    key = (type(serializer), tuple(field.field_name for field in fields), rows)
+    if (represent := compiled_functions.get(key)) is None:
+        represent = compiled_functions[key] = generate(serializer, fields, rows)
+
+    nested = {}
+    if not rows:
+        for index, field in enumerate(fields):
+            if isinstance(field, serializers.ListSerializer):
+                nested[index] = field.child.to_representation
+            elif isinstance(field, serializers.BaseSerializer):
+                nested[index] = field.to_representation
+    return represent, fields, nested
+
+
+class CompiledSerializerMixin(FastRepresentationMixin):
+    """
+    Represent objects with a compiled function, see utils.serializers.compiled.
+    """
+
+    def to_representation(self, instance):
+        rows = isinstance(instance, Mapping)
+        try:
+            represent, fields, nested = self._compiled[rows]
+        except AttributeError:
+            self._compiled = {}
+            represent, fields, nested = self._compiled[rows] = get_compiled(self, rows)
+        except KeyError:
+            represent, fields, nested = self._compiled[rows] = get_compiled(self, rows)
+        return represent(instance, fields, self, nested)
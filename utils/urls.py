@@ -0,0 +1,31 @@
+from functools import cache
+
+from django.utils.module_loading import import_string
+
+
+def lazy_include(urlconf):
+    """
+    Like `include`, but the `urlconf` module is only imported when a request
+    path first matches the route, or a URL is first reversed.
+
+    Keeps the views of rarely used routes, and whatever they import, out of
+    the startup of every worker.
+    """
+    return (urlconf, None, None)
+
+
+def lazy_view(view_class, **initkwargs):
+    """
+    A view calling `view_class.as_view(**initkwargs)`, imported on the first
+    request. Only for read-only views: middleware sees the wrapper, so the
+    view's `csrf_exempt` is lost.
+    """
+
+    @cache
+    def get_view():
+        return import_string(view_class).as_view(**initkwargs)
+
+    def view(request, *args, **kwargs):
+        return get_view()(request, *args, **kwargs)
+
+    return view
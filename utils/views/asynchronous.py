@@ -0,0 +1,99 @@
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework import exceptions
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from ..authentication import authenticate
+from ..renderers import MessagePackRenderer, ORJSONRenderer
+
+# Run an ORM call in the thread pool without pinning it to the request thread,
+# queries awaited together with `asyncio.gather` run concurrently, each on the
+# connection of its worker thread.
+concurrent_query = partial(database_sync_to_async, thread_sensitive=False)
+
+# the renderers async views respond with, others are left to the sync views
+ASYNC_RENDERERS = (ORJSONRenderer, MessagePackRenderer)
+
+
+def render_response(request, renderer, media_type, data, status=200):
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f"{content_type}; charset={renderer.charset}"
+    response = HttpResponse(
+        renderer.render(data, media_type, {"request": request}),
+        status=status,
+        content_type=content_type,
+    )
+    # like the sync views, which pick among several renderers too
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
+def negotiate(request):
+    """
+    The renderer and media type the sync view would respond with, or None
+    when it isn't one of `ASYNC_RENDERERS`.
+    """
+    renderers = [renderer() for renderer in api_settings.DEFAULT_RENDERER_CLASSES]
+    try:
+        renderer, media_type = DefaultContentNegotiation().select_renderer(
+            request, renderers
+        )
+    except (exceptions.NotAcceptable, exceptions.NotFound):
+        return None
+    if not isinstance(renderer, ASYNC_RENDERERS):
+        return None
+    return renderer, media_type
+
+
+def async_api_view(fallback):
+    """
+    Wrap an async view serving the reads of an API endpoint. The sync
+    `fallback` view of the same route answers the other requests: writes and
+    those for another renderer, like the browsable API.
+
+    The wrapped view receives a DRF `Request` (for `query_params`) whose user
+    is already authenticated, returns data to be rendered as JSON or
+    MessagePack and may raise DRF's `APIException`s, answered by DRF's
+    exception handler. Async views can't run inside the per-request
+    transaction, so they are excluded from `ATOMIC_REQUESTS`.
+    """
+
+    def decorator(view):
+        @transaction.non_atomic_requests
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            negotiated = request.method in ("GET", "HEAD") and negotiate(
+                Request(request)
+            )
+            if not negotiated:
+                return await sync_to_async(fallback)(request, *args, **kwargs)
+            renderer, media_type = negotiated
+            try:
+                user = await authenticate(request)
+                request = Request(request)
+                request.user = user
+                data = await view(request, *args, **kwargs)
+                return render_response(request, renderer, media_type, data)
+            except exceptions.APIException as exc:
+                handled = exception_handler(exc, {"request": request})
+                response = render_response(
+                    request, renderer, media_type, handled.data, handled.status_code
+                )
+                if "Retry-After" in handled:
+                    response["Retry-After"] = handled["Retry-After"]
+                if response.status_code == 401:
+                    response["WWW-Authenticate"] = "Token"
+                return response
+
+        return wrapped
+
+    return decorator
@@ -6,11 +6,22 @@ from rest_framework.mixins import (
 )
 from rest_framework.viewsets import GenericViewSet
 
-from .mixins import GetSerializerClassMixin, PartialUpdateModelMixin
+from .mixins import (
+    CachedResponseMixin,
+    GetSerializerClassMixin,
+    NonAtomicReadsMixin,
+    PartialUpdateModelMixin,
+    PlainReadsMixin,
+    QueryBudgetMixin,
+)
 
 
 class BaseModelViewSet(
+    QueryBudgetMixin,
+    NonAtomicReadsMixin,
     GetSerializerClassMixin,
+    CachedResponseMixin,
+    PlainReadsMixin,
     CreateModelMixin,
     DestroyModelMixin,
     ListModelMixin,
@@ -1,5 +1,17 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 
+from ..instrumentation import current_metrics, timed_serializer
+from ..metrics import observe_cache
+
+_missing = object()
+
 
 class PartialUpdateModelMixin:
     def perform_update(self, serializer):
@@ -19,6 +31,86 @@ class PartialUpdateModelMixin:
         return Response(serializer.data)
 
 
+class PlainReadsMixin:
+    """
+    Respond to list and retrieve with the data `to_representation` returns,
+    skipping the ReturnDict and ReturnList copies of `serializer.data`, which
+    only the forms of the browsable API use.
+    """
+
+    def get_read_data(self, serializer):
+        if isinstance(self.request.accepted_renderer, BrowsableAPIRenderer):
+            return serializer.data
+        return serializer.to_representation(serializer.instance)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(self.get_read_data(serializer))
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(self.get_read_data(serializer))
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_object())
+        return Response(self.get_read_data(serializer))
+
+
+class CachedResponseMixin:
+    """
+    Cache the data of list responses, and of the other `cached_actions`, for
+    `RESPONSE_CACHE_TTL` seconds.
+
+    Responses are keyed by the scope `get_response_cache_scope` returns, the
+    viewset, action, URL kwargs and query parameters. Scopes are built from
+    the versions of the data a response depends on, see
+    utils.cache.versions, so writes invalidate responses by bumping a
+    version. A None scope skips the cache. Hits and misses are counted per
+    action in `utils.metrics`.
+    """
+
+    cached_actions = ("list",)
+
+    def get_response_cache_scope(self):
+        return None
+
+    def get_response_cache_key(self):
+        # the browsable API renders forms from the serializer of the data
+        if (
+            not settings.RESPONSE_CACHE_TTL
+            or self.action not in self.cached_actions
+            or isinstance(self.request.accepted_renderer, BrowsableAPIRenderer)
+        ):
+            return None
+        if (scope := self.get_response_cache_scope()) is None:
+            return None
+        params = urlencode(sorted(self.request.query_params.lists()), doseq=True)
+        kwargs = urlencode(sorted(self.kwargs.items()))
+        name = f"{self.__class__.__name__}.{self.action}"
+        digest = hashlib.sha256(f"{scope}|{kwargs}|{params}".encode()).hexdigest()
+        return f"response:{name}:{digest}"
+
+    def get_cached_response(self, respond, request, *args, **kwargs):
+        if (key := self.get_response_cache_key()) is None:
+            return respond(request, *args, **kwargs)
+        name = f"responses.{self.__class__.__name__}.{self.action}"
+        if (data := cache.get(key, _missing)) is not _missing:
+            observe_cache(name, 1, 0)
+            return Response(data)
+        observe_cache(name, 0, 1)
+        response = respond(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TTL)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args, **kwargs)
+
+
 class GetSerializerClassMixin:
     def get_serializer_class(self):
         """
@@ -47,3 +139,51 @@ class GetSerializerClassMixin:
             return self.serializer_action_classes[self.action]
         except (KeyError, AttributeError):
             return super().get_serializer_class()
+
+
+class NonAtomicReadsMixin:
+    """
+    Run read-only actions outside of the `ATOMIC_REQUESTS` transaction.
+
+    The view is excluded from the per-request transaction and instead every
+    action not listed in `non_atomic_actions` is wrapped in its own atomic
+    block, so reads run in autocommit mode while writes keep rolling back
+    as a whole on errors.
+    """
+
+    non_atomic_actions = ("list", "retrieve")
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        return transaction.non_atomic_requests(super().as_view(actions, **initkwargs))
+
+    def dispatch(self, request, *args, **kwargs):
+        action = self.action_map.get(request.method.lower())
+        if action in self.non_atomic_actions:
+            return super().dispatch(request, *args, **kwargs)
+        with transaction.atomic():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class QueryBudgetMixin:
+    """
+    Name the request metrics after the viewset action and time serializers.
+
+    `query_budgets` maps action names to the most SQL queries a request to
+    that action may run once authenticated, so budgets don't depend on the
+    authentication scheme, see `QueryMetricsMiddleware`.
+    """
+
+    query_budgets = {}
+
+    def initial(self, request, *args, **kwargs):
+        if metrics := current_metrics.get():
+            metrics.key = f"{self.__class__.__name__}.{self.action}"
+            metrics.budget = self.query_budgets.get(self.action)
+            # authenticate before counting, DRF would do it first thing anyway
+            request.user
+            metrics.budget_start = metrics.queries
+        super().initial(request, *args, **kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        return timed_serializer(super().get_serializer(*args, **kwargs))
@@ -0,0 +1,30 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse
+
+from ..profiling import format_profile, get_profile, get_profiles
+
+
+@staff_member_required
+def profile_list(request):
+    lines = [
+        f"{profile['created_at']:%Y-%m-%d %H:%M:%S}  {profile['id']}  "
+        f"{profile['duration'] * 1000:7.1f}ms  {profile['method']} {profile['path']}"
+        for profile in get_profiles()
+    ]
+    return HttpResponse("\n".join(lines), content_type="text/plain")
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    """
+    Show a profile as text, or download its samples in the folded stack
+    format with `?format=folded` to load them in speedscope.
+    """
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise Http404("Profile expired or not found")
+    if request.GET.get("format") == "folded":
+        response = HttpResponse(profile["folded"], content_type="text/plain")
+        response["Content-Disposition"] = f'attachment; filename="{profile_id}.folded"'
+        return response
+    return HttpResponse(format_profile(profile), content_type="text/plain")
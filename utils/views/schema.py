@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from drf_spectacular.views import SpectacularAPIView
+
+from ..schema import load_schema
+
+
+class SchemaView(SpectacularAPIView):
+    """
+    Serve the OpenAPI schema generated at build or release time with a
+    strong ETag, instead of walking every viewset on each request. The
+    schema is only regenerated per request in DEBUG.
+    """
+
+    def _get_schema_response(self, request):
+        if settings.DEBUG:
+            return super()._get_schema_response(request)
+
+        content, etag = load_schema(request.accepted_renderer.format)
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=request.accepted_media_type)
+        response["ETag"] = etag
+        # clients revalidate, a release changes the schema
+        response["Cache-Control"] = "no-cache"
+        return response
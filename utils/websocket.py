@@ -0,0 +1,21 @@
+from urllib.parse import parse_qs
+
+from channels.middleware import BaseMiddleware
+
+from .authentication import get_token_user
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """
+    Authenticate websocket connections with a DRF token passed as the
+    `token` query parameter, browsers can't set headers on websockets.
+
+    Falls back to whatever user the inner session middleware resolved.
+    """
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get("query_string", b"").decode())
+        if key := query.get("token", [None])[0]:
+            if user := await get_token_user(key):
+                scope = dict(scope, user=user)
+        return await super().__call__(scope, receive, send)